@@ -1,13 +1,25 @@
-import pandas as pd
+# pandas, joblib, sklearn, geopy and requests are imported where first
+# needed so the server can start answering health checks before they load
 import numpy as np
 import random
-import requests
-import joblib
-from datetime import datetime
-from geopy.geocoders import Nominatim
-from sklearn.preprocessing import LabelEncoder
-from sklearn.ensemble import RandomForestRegressor
+import os
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
 from math import radians, sin, cos, sqrt, asin
+from itertools import islice
+from geocode_cache import GeocodeCache, normalize_name
+from weather_cache import WeatherCache, make_session
+from weather_prefetch import WeatherPrefetcher
+from forest_export import CompactForest, load_compact_forest
+from feature_encoding import FeatureEncoder
+from region_index import RegionCatalog
+from model_store import ModelStore, encoder_classes
+from risk_grid import RiskGrid
+from risk_scoring import AnalyticScorer
+from model_registry import ModelRegistry, RoutedModel
+from instrumentation import metrics
+from circuit_breaker import CircuitBreaker, upstream_timeout, time_left
 
 # List of countries with approximate centroids (from your original data)
 countries_coords = {
@@ -49,20 +61,25 @@ country_climates = {
     "Colombia": "highland", "Peru": "highland", "Venezuela": "highland", "Nepal": "highland"
 }
 
-# Historical infestation baseline per country with all climate zones included
-historical_baseline = {}
-for country in countries_coords.keys():
-    climate = country_climates.get(country, "temperate")
-    if climate == "tropical":
-        historical_baseline[country] = random.uniform(0.4, 0.8)
-    elif climate == "arid":
-        historical_baseline[country] = random.uniform(0.1, 0.4)
-    elif climate == "continental":
-        historical_baseline[country] = random.uniform(0.3, 0.6)
-    elif climate == "highland":
-        historical_baseline[country] = random.uniform(0.2, 0.5)
-    else:  # temperate
-        historical_baseline[country] = random.uniform(0.2, 0.6)
+# Historical infestation per encoded country, computed from the training
+# dataset by train.py and published next to the model
+HISTORICAL_BASELINE_PATH = os.environ.get('AGRINOVA_HISTORICAL_BASELINE', 'historical_baseline.npy')
+
+# Expected value of the per-country baseline gends.py draws for each climate,
+# used only when no published baseline table exists
+climate_baseline_defaults = {"tropical": 0.6, "arid": 0.25}
+
+def load_historical_baseline(country_classes):
+    """Load the historical infestation table as a float32 array indexed by encoded country"""
+    if os.path.exists(HISTORICAL_BASELINE_PATH):
+        baseline = np.load(HISTORICAL_BASELINE_PATH).astype(np.float32)
+        if len(baseline) != len(country_classes):
+            raise ValueError(f"Historical baseline has {len(baseline)} entries for {len(country_classes)} countries")
+        return baseline
+    return np.array(
+        [climate_baseline_defaults.get(country_climates.get(c, "temperate"), 0.4) for c in country_classes],
+        dtype=np.float32
+    )
 
 # List of crop types with susceptibility factors
 crops_susceptibility = {
@@ -70,6 +87,12 @@ crops_susceptibility = {
     "Cotton": 0.5, "Potato": 0.4, "Barley": 0.7, "Sugarcane": 0.3
 }
 
+# Model input columns, in training order
+FEATURE_COLUMNS = [
+    'temperature', 'humidity', 'rainfall', 'wind_speed', 'month',
+    'historical_infestation', 'country_encoded', 'climate_encoded', 'crop_encoded'
+]
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Calculate Haversine distance between two points"""
     lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
@@ -79,111 +102,468 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     c = 2 * asin(sqrt(a))
     return c * 6371  # Earth radius in km
 
+_country_catalog = None
+
+def get_country_catalog():
+    """Spatial index over the country centroids, built on first use"""
+    global _country_catalog
+    if _country_catalog is None:
+        _country_catalog = RegionCatalog.from_coords(countries_coords, climate_zone=country_climates)
+    return _country_catalog
+
 def find_nearest_countries(target_lat, target_lon, k=5):
     """Find k nearest countries to target coordinates"""
-    distances = []
-    for country, (lat, lon) in countries_coords.items():
-        distance = haversine_distance(target_lat, target_lon, lat, lon)
-        distances.append((country, distance, lat, lon))
-    
-    distances.sort(key=lambda x: x[1])
-    return distances[:k]
+    return get_country_catalog().nearest(target_lat, target_lon, k)
+
+# Persistent geocoding cache, cold-started from the built-in centroid table
+GEOCODE_CACHE_PATH = os.environ.get('AGRINOVA_GEOCODE_CACHE', 'geocode_cache.sqlite3')
+geocode_cache = GeocodeCache(GEOCODE_CACHE_PATH, seed=countries_coords)
+_canonical_names = {normalize_name(name): name for name in countries_coords}
+
+def canonical_country_name(country_name):
+    """Map a user-typed name to its built-in spelling ("india " -> "India"); other names are only trimmed"""
+    return _canonical_names.get(normalize_name(country_name), country_name.strip())
+
+# Upstream calls made while handling a request share this many seconds; 0 disables the budget
+REQUEST_BUDGET = float(os.environ.get('AGRINOVA_REQUEST_BUDGET', 3.0))
+# Each provider is skipped for BREAKER_RESET seconds after BREAKER_FAILURES consecutive
+# failures, where calls slower than BREAKER_SLOW_CALL seconds also count as failures
+BREAKER_FAILURES = int(os.environ.get('AGRINOVA_BREAKER_FAILURES', 5))
+BREAKER_RESET = float(os.environ.get('AGRINOVA_BREAKER_RESET', 30.0))
+BREAKER_SLOW_CALL = float(os.environ.get('AGRINOVA_BREAKER_SLOW_CALL', 2.5))
+
+def make_breaker(name):
+    breaker = CircuitBreaker(name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET,
+                             slow_call=BREAKER_SLOW_CALL)
+    metrics.register_gauges(f'breaker_{name}', breaker.stats)
+    return breaker
+
+NOMINATIM_URL = os.environ.get('AGRINOVA_NOMINATIM_URL', "https://nominatim.openstreetmap.org")
+GEOCODE_USER_AGENT = "aphid_risk_predictor"
+GEOCODE_TIMEOUT = float(os.environ.get('AGRINOVA_GEOCODE_TIMEOUT', 5.0))
+nominatim_breaker = make_breaker('nominatim')
+_geolocator = None
 
 def get_country_coordinates(country_name):
-    """Get coordinates for a country using geocoding API"""
-    try:
-        geolocator = Nominatim(user_agent="aphid_risk_predictor")
-        location = geolocator.geocode(country_name)
-        if location:
-            return location.latitude, location.longitude
-        else:
+    """Get coordinates for a country using the geocoding cache, then the geocoding API"""
+    global _geolocator
+    with metrics.stage('geocode'):
+        found, coords = geocode_cache.get(country_name)
+        if found:
+            return coords
+        timeout = upstream_timeout(GEOCODE_TIMEOUT)
+        if timeout is None or not nominatim_breaker.allow():
+            metrics.inc('geocode_skipped')
             return None
-    except:
-        return None
+        start = time.monotonic()
+        try:
+            if _geolocator is None:
+                from functools import partial
+                from geopy.adapters import RequestsAdapter
+                from geopy.geocoders import Nominatim
+                url = urlsplit(NOMINATIM_URL)
+                # No adapter retries: one attempt keeps the call within its timeout, the breaker handles outages
+                _geolocator = Nominatim(user_agent=GEOCODE_USER_AGENT, domain=url.netloc, scheme=url.scheme,
+                                        adapter_factory=partial(RequestsAdapter, max_retries=0))
+            with metrics.stage('geocode_api'):
+                location = _geolocator.geocode(country_name, timeout=timeout)
+        except Exception:
+            # Transient failures are not cached
+            nominatim_breaker.record(False)
+            metrics.inc('geocode_errors')
+            return None
+        nominatim_breaker.record(True, time.monotonic() - start)
+    coords = (location.latitude, location.longitude) if location else None
+    geocode_cache.set(country_name, coords)
+    return coords
 
-def get_weather_data(lat, lon):
-    """Get current weather data using OpenWeatherMap API"""
-    # You need to get a free API key from https://openweathermap.org/api
-    API_KEY = "6772a1310aa389da3aae23fabf744da1"  # Replace with your actual API key
-    
+metrics.register_gauges('geocode_cache', geocode_cache.stats)
+
+# OpenWeatherMap settings; the base URL can point at a local stand-in for testing
+# You need to get a free API key from https://openweathermap.org/api
+OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', "6772a1310aa389da3aae23fabf744da1")
+OPENWEATHER_URL = os.environ.get('AGRINOVA_OPENWEATHER_URL', "https://api.openweathermap.org/data/2.5")
+WEATHER_TTL = float(os.environ.get('AGRINOVA_WEATHER_TTL', 600))
+WEATHER_TIMEOUT = (3.05, 5)  # (connect, read) seconds
+# Expired weather up to this old is served while the API is unavailable, before climate defaults
+WEATHER_MAX_STALE = float(os.environ.get('AGRINOVA_WEATHER_MAX_STALE', 6 * 3600))
+# Cached 0.1° buckets (fresh or kept for the stale fallback) before the least recently read are dropped
+WEATHER_CACHE_SIZE = int(os.environ.get('AGRINOVA_WEATHER_CACHE_SIZE', 16384))
+openweather_breaker = make_breaker('openweathermap')
+
+_weather_sessions = {}
+
+def get_weather_session(retries=True):
+    """Pooled HTTP session for OpenWeatherMap, created on first use"""
+    session = _weather_sessions.get(retries)
+    if session is None:
+        session = _weather_sessions[retries] = make_session(retries=2 if retries else 0)
+    return session
+
+def parse_weather_response(data):
+    """Extract model weather inputs from an OpenWeatherMap current-weather payload"""
+    return {
+        'temperature': data['main']['temp'],
+        'humidity': data['main']['humidity'],
+        'rainfall': data.get('rain', {}).get('1h', 0) if 'rain' in data else 0,
+        'wind_speed': data['wind']['speed'],
+        'description': data['weather'][0]['description']
+    }
+
+def fetch_openweather(endpoint, lat, lon, parse):
+    """Call an OpenWeatherMap endpoint through its circuit breaker and parse the payload, None on failure
+
+    The call is skipped (counted as <endpoint>_skipped) while the breaker is
+    open or when the current request's budget is nearly spent. Inside a
+    budget the session does not retry, so one attempt bounds the wait.
+    """
+    timeout = upstream_timeout(WEATHER_TIMEOUT)
+    if timeout is None or not openweather_breaker.allow():
+        metrics.inc(f'{endpoint}_skipped')
+        return None
+    result = None
+    start = time.monotonic()
     try:
-        url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
-        response = requests.get(url)
-        data = response.json()
-        
+        with metrics.stage(f'{endpoint}_api'):
+            response = get_weather_session(retries=time_left() is None).get(
+                f"{OPENWEATHER_URL}/{endpoint}",
+                params={'lat': lat, 'lon': lon, 'appid': OPENWEATHER_API_KEY, 'units': 'metric'},
+                timeout=timeout,
+            )
         if response.status_code == 200:
-            return {
-                'temperature': data['main']['temp'],
-                'humidity': data['main']['humidity'],
-                'rainfall': data.get('rain', {}).get('1h', 0) if 'rain' in data else 0,
-                'wind_speed': data['wind']['speed'],
-                'description': data['weather'][0]['description']
-            }
-        else:
-            return None
-    except:
+            result = parse(response.json())
+    except Exception:
+        pass
+    openweather_breaker.record(result is not None, time.monotonic() - start)
+    if result is None:
+        metrics.inc(f'{endpoint}_errors')
+    return result
+
+def fetch_weather_data(lat, lon):
+    """Fetch current weather data from the OpenWeatherMap API, bypassing the cache"""
+    return fetch_openweather('weather', lat, lon, parse_weather_response)
+
+weather_cache = WeatherCache(fetch_weather_data, ttl=WEATHER_TTL, max_entries=WEATHER_CACHE_SIZE)
+metrics.register_gauges('weather_cache', weather_cache.stats)
+
+def get_weather_data(lat, lon):
+    """Get current weather data, served from the weather cache when fresh"""
+    with metrics.stage('weather'):
+        return weather_cache.get(lat, lon) or get_stale(weather_cache, lat, lon, 'weather_stale')
+
+def get_stale(cache, lat, lon, counter):
+    """Expired cache entry marked "stale": True while the API is unavailable, else None"""
+    stale = cache.stale(lat, lon, WEATHER_MAX_STALE)
+    if stale is None:
         return None
+    metrics.inc(counter)
+    stale['stale'] = True
+    return stale
+
+# Refresh built-in regions and recently requested locations ahead of expiry.
+# Each server process runs its own prefetcher, so the quota is per process.
+WEATHER_PREFETCH = os.environ.get('AGRINOVA_WEATHER_PREFETCH', '1') == '1'
+WEATHER_RATE_PER_MIN = float(os.environ.get('AGRINOVA_WEATHER_RATE_PER_MIN', 50))
+WEATHER_PREFETCH_WORKERS = int(os.environ.get('AGRINOVA_WEATHER_PREFETCH_WORKERS', 4))
+weather_prefetcher = None
+
+def start_weather_prefetch():
+    """Start the background weather prefetcher once per process; returns it (None when disabled)"""
+    global weather_prefetcher
+    if WEATHER_PREFETCH and weather_prefetcher is None:
+        weather_prefetcher = WeatherPrefetcher(
+            weather_cache, countries_coords.values(),
+            requests_per_minute=WEATHER_RATE_PER_MIN, workers=WEATHER_PREFETCH_WORKERS,
+        ).start()
+        metrics.register_gauges('weather_prefetch', weather_prefetcher.stats)
+    return weather_prefetcher
+
+# The 5 day / 3 hour forecast changes less often than current weather
+FORECAST_TTL = float(os.environ.get('AGRINOVA_FORECAST_TTL', 1800))
+
+def parse_forecast_response(data):
+    """Extract one model weather input per timestep from an OpenWeatherMap 5 day / 3 hour forecast payload"""
+    steps = []
+    for entry in data['list']:
+        steps.append({
+            'time': entry['dt'],
+            'temperature': entry['main']['temp'],
+            'humidity': entry['main']['humidity'],
+            # Forecast entries carry the rain accumulated over the 3 hour step
+            'rainfall': entry.get('rain', {}).get('3h', 0),
+            'wind_speed': entry['wind']['speed'],
+            'description': entry['weather'][0]['description']
+        })
+    return {'timezone_offset': data.get('city', {}).get('timezone', 0), 'steps': steps}
+
+def fetch_forecast_data(lat, lon):
+    """Fetch the multi-day forecast in one OpenWeatherMap call, bypassing the cache"""
+    return fetch_openweather('forecast', lat, lon, parse_forecast_response)
+
+forecast_cache = WeatherCache(fetch_forecast_data, ttl=FORECAST_TTL, max_entries=WEATHER_CACHE_SIZE)
+metrics.register_gauges('forecast_cache', forecast_cache.stats)
+
+def get_forecast_data(lat, lon):
+    """Get the forecast ({'timezone_offset', 'steps'}), served from the forecast cache when fresh"""
+    with metrics.stage('forecast'):
+        return forecast_cache.get(lat, lon) or get_stale(forecast_cache, lat, lon, 'forecast_stale')
+
+def get_default_weather(climate):
+    """Get climate-based default weather used when the weather API is unavailable"""
+    if climate == "tropical":
+        return {'temperature': 30, 'humidity': 75, 'rainfall': 20, 'wind_speed': 10, 'description': 'default'}
+    elif climate == "arid":
+        return {'temperature': 35, 'humidity': 20, 'rainfall': 2, 'wind_speed': 15, 'description': 'default'}
+    elif climate == "continental":
+        return {'temperature': 15, 'humidity': 55, 'rainfall': 10, 'wind_speed': 10, 'description': 'default'}
+    elif climate == "highland":
+        return {'temperature': 12, 'humidity': 65, 'rainfall': 25, 'wind_speed': 7, 'description': 'default'}
+    else:
+        return {'temperature': 20, 'humidity': 60, 'rainfall': 8, 'wind_speed': 8, 'description': 'default'}
+
+def get_fallback_weather(country):
+    """Climate defaults for a country whose live weather is unavailable, counted in metrics"""
+    metrics.inc('weather_fallbacks')
+    return get_default_weather(country_climates.get(canonical_country_name(country), 'temperate'))
+
+WEATHER_FIELDS = ('temperature', 'humidity', 'rainfall', 'wind_speed')
+
+def validate_weather(weather):
+    """Copy of client-supplied weather with the model inputs coerced to finite floats; ValueError if any is not"""
+    if not isinstance(weather, dict):
+        raise ValueError('weather must be an object')
+    validated = dict(weather)
+    for field in WEATHER_FIELDS:
+        value = weather.get(field)
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            validated[field] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'weather.{field} must be a number') from None
+        if not np.isfinite(validated[field]):
+            raise ValueError(f'weather.{field} must be a finite number')
+    return validated
+
+_feature_encoder = None
+
+def get_feature_encoder(encoders):
+    """Get the FeatureEncoder for these encoders, rebuilt when a hot-swapped model brings its own baseline"""
+    global _feature_encoder
+    baseline_version, baseline = model_store.baseline
+    if (_feature_encoder is None or _feature_encoder.encoders is not encoders
+            or _feature_encoder.baseline_version != baseline_version):
+        country_classes = encoders['country_encoder'].classes_
+        if baseline is None:
+            baseline = load_historical_baseline(country_classes)
+        elif len(baseline) != len(country_classes):
+            raise ValueError(f"Historical baseline has {len(baseline)} entries for {len(country_classes)} countries")
+        _feature_encoder = FeatureEncoder(encoders, country_climates, baseline, find_nearest_countries,
+                                          baseline_version=baseline_version)
+    return _feature_encoder
+
+def build_feature_row(country, lat, lon, crop_type, weather_data, encoders, month=None):
+    """Build the encoded model feature row for one prediction
+
+    The country is canonicalized here, so "india " is scored as India by
+    every endpoint and by both servers.
+    """
+    if month is None:
+        month = datetime.now().month
+    with metrics.stage('encode'):
+        return get_feature_encoder(encoders).encode(canonical_country_name(country), lat, lon, crop_type, weather_data, month)
 
 def predict_aphid_risk(country, lat, lon, crop_type, weather_data, model, encoders):
     """Predict aphid risk using the trained model"""
-    le_country = encoders['country_encoder']
-    le_climate = encoders['climate_encoder']
-    le_crop = encoders['crop_encoder']
+    row = build_feature_row(country, lat, lon, crop_type, weather_data, encoders)
+    prediction = predict_rows(model, [row])[0]
+    return max(0, min(1, prediction))
+
+def predict_rows(model, rows):
+    """Run one model call over a list of feature row dicts"""
+    return predict_matrix(model, [[row[c] for c in FEATURE_COLUMNS] for row in rows])
+
+def predict_matrix(model, X):
+    """Run one model call over a feature matrix whose columns follow FEATURE_COLUMNS"""
+    with metrics.stage('predict'):
+        return _predict_matrix(model, X)
+
+def _predict_matrix(model, X):
+    if isinstance(model, (CompactForest, AnalyticScorer, RoutedModel)):
+        # Raw feature matrix, no DataFrame needed
+        return model.predict(X)
+    # Prepare feature matrix with correct column names
+    import pandas as pd
+    return model.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS))
+
+def predict_aphid_risk_batch(items, model, encoders):
+    """Predict aphid risk for many (country, crop, optional weather) items with one model call
     
-    current_date = datetime.now()
-    month = current_date.month
+    Geocoding and weather lookups are shared between items for the same
+    country / coordinates. Returns one result dict per item, in order; items
+    that cannot be scored get an 'error' key instead of a 'risk'.
+    """
+    month = datetime.now().month
+    coords_by_country = {}
+    weather_by_coords = {}
+    results = [None] * len(items)
+    rows = []
+    row_indices = []
     
-    # Handle unknown country using nearest neighbors
-    if country not in le_country.classes_:
-        print(f"⚠️  Country '{country}' not in training data. Using nearest neighbors...")
-        nearest_countries = find_nearest_countries(lat, lon)
-        
-        if not nearest_countries:
-            raise ValueError(f"No nearest countries found for coordinates: {lat}, {lon}")
-        
-        nearest_names = [country for country, dist, lat, lon in nearest_countries]
-        print(f"   Nearest countries: {nearest_names}")
-        
-        # Average historical infestation from nearest countries
-        historical_avg = np.mean([historical_baseline.get(c, 0.3) for c in nearest_names])
-        
-        # Use climate from the closest country with proper error handling
-        closest_country = nearest_names[0]
-        climate = country_climates.get(closest_country)
+    for i, item in enumerate(items):
+        country = item.get('country') if isinstance(item, dict) else None
+        crop = item.get('crop') if isinstance(item, dict) else None
+        if not country or not isinstance(country, str) or country.strip() == "":
+            results[i] = {'country': country, 'crop': crop, 'error': 'Country name is required and must be valid.'}
+            continue
         
-        if climate is None:
-            raise ValueError(f"No climate data found for nearest country: {closest_country}")
+        # "india " and "India" share one geocoding lookup
+        name = canonical_country_name(country)
+        if name not in coords_by_country:
+            coords_by_country[name] = get_country_coordinates(name)
+        coords = coords_by_country[name]
+        if not coords:
+            results[i] = {'country': country, 'crop': crop, 'error': f'Could not find coordinates for country: {country}'}
+            continue
+        lat, lon = coords
         
-        country_encoded = le_country.transform([closest_country])[0]
-    else:
-        climate = country_climates.get(country)
-        if climate is None:
-            raise ValueError(f"No climate data found for country: {country}")
+        weather = item.get('weather')
+        if weather:
+            try:
+                weather = validate_weather(weather)
+            except ValueError as e:
+                results[i] = {'country': country, 'crop': crop, 'error': str(e)}
+                continue
+        else:
+            if coords not in weather_by_coords:
+                weather_by_coords[coords] = get_weather_data(lat, lon)
+            weather = weather_by_coords[coords]
+        if not weather:
+            # fallback to climate-based defaults
+            weather = get_fallback_weather(country)
         
-        historical_avg = historical_baseline.get(country, 0.3)
-        country_encoded = le_country.transform([country])[0]
-    
-    # Encode climate and crop
-    climate_encoded = le_climate.transform([climate])[0]
-    crop_encoded = le_crop.transform([crop_type])[0]
-    crop_susceptibility = crops_susceptibility.get(crop_type, 0.5)
+        try:
+            rows.append(build_feature_row(country, lat, lon, crop, weather, encoders, month))
+        except Exception as e:
+            results[i] = {'country': country, 'crop': crop, 'error': str(e)}
+            continue
+        row_indices.append(i)
+        results[i] = {'country': country, 'crop': crop, 'weather': weather}
     
-    # Prepare feature vector with correct column names
-    features = pd.DataFrame([{
-        'temperature': weather_data['temperature'],
-        'humidity': weather_data['humidity'],
-        'rainfall': weather_data['rainfall'],
-        'wind_speed': weather_data['wind_speed'],
-        'month': month,
-        'historical_infestation': historical_avg,
-        'country_encoded': country_encoded,
-        'climate_encoded': climate_encoded,
-        'crop_encoded': crop_encoded
-    }])
+    if rows:
+        # Single vectorized call over the whole feature matrix
+        predictions = predict_rows(model, rows)
+        for i, prediction in zip(row_indices, predictions):
+            results[i]['risk'] = max(0, min(1, float(prediction)))
     
-    # Make prediction
-    prediction = model.predict(features)[0]
-    return max(0, min(1, prediction))
+    return results
+
+def sweep_aphid_risk(regions, crops, model, encoders, chunk_size=256):
+    """Yield predict_aphid_risk_batch results for every (region, crop) pair, one chunk at a time
+
+    Pairs are produced lazily in region-major order, so a chunk shares its
+    geocoding and weather lookups and memory stays at one chunk however many
+    regions the sweep covers.
+    """
+    pairs = ({'country': region, 'crop': crop} for region in regions for crop in crops)
+    while True:
+        items = list(islice(pairs, chunk_size))
+        if not items:
+            return
+        yield predict_aphid_risk_batch(items, model, encoders)
+
+def predict_aphid_risk_forecast(country, lat, lon, crop_type, forecast, model, encoders, window_hours=24):
+    """Score every forecast timestep with one model call and find the peak-risk window
+
+    Each row uses the month of its own timestep. The peak window is the run
+    of consecutive timesteps spanning window_hours with the highest mean risk.
+    """
+    steps = forecast['steps']
+    offset = forecast.get('timezone_offset', 0)
+    rows = []
+    for step in steps:
+        # Month at the location, not on the server
+        month = datetime.fromtimestamp(step['time'] + offset, timezone.utc).month
+        rows.append(build_feature_row(country, lat, lon, crop_type, step, encoders, month))
+    risks = np.clip(np.asarray(predict_rows(model, rows), dtype=float), 0, 1)
+
+    series = []
+    for step, risk in zip(steps, risks):
+        point = {k: v for k, v in step.items() if k != 'time'}
+        point['time'] = datetime.fromtimestamp(step['time'], timezone.utc).isoformat()
+        point['risk'] = float(risk)
+        series.append(point)
+
+    step_seconds = steps[1]['time'] - steps[0]['time'] if len(steps) > 1 else 3 * 3600
+    width = min(len(steps), max(1, round(window_hours * 3600 / step_seconds)))
+    window_means = np.convolve(risks, np.ones(width) / width, mode='valid')
+    start = int(np.argmax(window_means))
+    peak_window = {
+        'start': series[start]['time'],
+        'end': datetime.fromtimestamp(steps[start + width - 1]['time'] + step_seconds, timezone.utc).isoformat(),
+        'mean_risk': float(window_means[start]),
+        'max_risk': float(risks[start:start + width].max()),
+    }
+    return series, peak_window
+
+def predict_grid_matrix(model, X):
+    """predict_matrix for background grid recomputes, timed as grid_predict so request percentiles stay clean"""
+    with metrics.stage('grid_predict'):
+        return _predict_matrix(model, X)
+
+def build_risk_grid(encoders, resolution=2.0):
+    """RiskGrid over every crop, encoded from the nearest countries like unknown locations"""
+    return RiskGrid(get_feature_encoder(encoders), get_country_catalog(), country_climates, get_default_weather,
+                    list(crops_susceptibility), predict_grid_matrix, resolution=resolution)
+
+# Memory-mapped model shared by all worker processes, see model_store.py
+MODEL_STORE_DIR = os.environ.get('AGRINOVA_MODEL_STORE', 'model_store')
+model_store = ModelStore(MODEL_STORE_DIR)
+
+def load_model():
+    """Load the trained model: the shared model store, then the exported .npz forest, then joblib"""
+    if model_store.exists():
+        return model_store.get()
+    if os.path.exists('aphid_risk_predictor.npz'):
+        return load_compact_forest('aphid_risk_predictor.npz')
+    import joblib
+    return joblib.load('aphid_risk_predictor.joblib')
+
+# Per-crop / per-climate specialists from train_specialists.py, loaded on first use
+SPECIALISTS_DIR = os.environ.get('AGRINOVA_SPECIALISTS', 'specialists')
+SPECIALIST_CACHE_MB = float(os.environ.get('AGRINOVA_SPECIALIST_CACHE_MB', 256))
+specialist_registry = ModelRegistry(SPECIALISTS_DIR, max_bytes=int(SPECIALIST_CACHE_MB * 2 ** 20))
+metrics.register_gauges('specialists', specialist_registry.stats)
+
+def with_specialists(model):
+    """Route rows to specialist models where any are published, otherwise return model unchanged"""
+    if isinstance(model, AnalyticScorer):
+        return model
+    return specialist_registry.wrap(model, _predict_matrix)
+
+# "model" serves the trained model, "analytic" the closed-form score from risk_scoring.py
+SCORING_BACKEND = os.environ.get('AGRINOVA_SCORING', 'model')
+# Serve analytic scores when the model cannot be loaded instead of failing every request
+SCORING_FALLBACK = os.environ.get('AGRINOVA_SCORING_FALLBACK', '1') == '1'
+
+def get_analytic_scorer(encoders):
+    """Model-free scorer over the same encoded features, see risk_scoring.py"""
+    return AnalyticScorer(encoders['crop_encoder'].classes_, crops_susceptibility, FEATURE_COLUMNS)
+
+def load_encoders():
+    """Load the fitted label encoders; model store versions trained with other encoders are refused"""
+    import joblib
+    encoders = joblib.load('encoders.joblib')
+    model_store.expected_classes = encoder_classes(encoders)
+    return encoders
+
+def warm_up_prediction(model, encoders):
+    """Run one dummy prediction per code path so lazy initialization happens before serving traffic"""
+    lat, lon = countries_coords["India"]
+    weather = get_default_weather("tropical")
+    predict_aphid_risk("India", lat, lon, "Wheat", weather, model, encoders)
+    # Unknown-country path: builds the centroid spatial index
+    find_nearest_countries(lat, lon)
 
 def main():
     """Main function to run the aphid risk prediction system"""
@@ -192,8 +572,8 @@ def main():
     
     # Load model and encoders
     try:
-        model = joblib.load('aphid_risk_predictor.joblib')
-        encoders = joblib.load('encoders.joblib')
+        model = load_model()
+        encoders = load_encoders()
         print("✅ Model and encoders loaded successfully")
     except FileNotFoundError:
         print("❌ Model files not found. Please train the model first.")
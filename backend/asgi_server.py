@@ -0,0 +1,267 @@
+"""asyncio serving mode for the /api/predict contract
+
+Run with:  uvicorn asgi_server:app --host 127.0.0.1 --port 5000
+
+Geocoding and weather lookups use a non-blocking HTTP client with a
+per-call deadline, capped by the request's overall budget, and are skipped
+while the provider's circuit breaker is open. When the weather is missing
+the request falls back to stale cached weather, then the climate defaults,
+exactly like server.py does when the weather API fails. model.predict runs on a bounded thread pool so the event loop can
+keep thousands of requests open at once.
+"""
+import asyncio
+import contextvars
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import aphid_predict as ap
+from instrumentation import SERVER_TIMING, metrics, start_request, finish_request
+from circuit_breaker import start_deadline, end_deadline, upstream_timeout
+
+GEOCODE_DEADLINE = float(os.environ.get('AGRINOVA_GEOCODE_DEADLINE', 2.0))
+WEATHER_DEADLINE = float(os.environ.get('AGRINOVA_WEATHER_DEADLINE', 1.5))
+PREDICT_WORKERS = int(os.environ.get('AGRINOVA_PREDICT_WORKERS', os.cpu_count() or 4))
+# Predictions allowed to queue on the executor before callers wait on the loop
+MAX_PENDING_PREDICTIONS = PREDICT_WORKERS * 4
+
+state = {'model': None, 'encoders': None, 'client': None, 'executor': None, 'semaphore': None, 'ready': False}
+_inflight = {}
+
+async def _single_flight(key, make_call):
+    """Share one in-flight coroutine between concurrent callers with the same key"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make_call())
+        _inflight[key] = task
+
+        def done(task):
+            _inflight.pop(key, None)
+            # Mark the exception as retrieved when every caller already gave up
+            if not task.cancelled():
+                task.exception()
+        task.add_done_callback(done)
+    return await asyncio.shield(task)
+
+async def get_country_coordinates(country):
+    """Resolve coordinates via the geocoding cache, then Nominatim with a deadline"""
+    found, coords = ap.geocode_cache.get(country)
+    if found:
+        return coords
+    deadline = upstream_timeout(GEOCODE_DEADLINE)
+    if deadline is None or not ap.nominatim_breaker.allow():
+        metrics.inc('geocode_skipped')
+        return None
+
+    async def fetch():
+        start, ok = time.monotonic(), False
+        try:
+            with metrics.stage('geocode_api'):
+                response = await state['client'].get(
+                    f"{ap.NOMINATIM_URL}/search",
+                    params={'q': country, 'format': 'json', 'limit': 1},
+                    headers={'User-Agent': ap.GEOCODE_USER_AGENT},
+                )
+            response.raise_for_status()
+            results = response.json()
+            coords = (float(results[0]['lat']), float(results[0]['lon'])) if results else None
+            ok = True
+        finally:
+            # Recorded once per upstream call, even when every waiting request already timed out
+            ap.nominatim_breaker.record(ok, time.monotonic() - start)
+        ap.geocode_cache.set(country, coords)
+        return coords
+
+    try:
+        return await asyncio.wait_for(_single_flight(('geocode', country), fetch), deadline)
+    except (asyncio.TimeoutError, httpx.HTTPError, ValueError, KeyError):
+        # Transient failures are not cached
+        metrics.inc('geocode_errors')
+        return None
+
+async def get_weather_data(lat, lon):
+    """Get current weather from the shared weather cache, then OpenWeatherMap with a deadline"""
+    weather = ap.weather_cache.peek(lat, lon)
+    if weather is not None:
+        return weather
+    bucket_lat, bucket_lon = ap.weather_cache.key(lat, lon)
+    deadline = upstream_timeout(WEATHER_DEADLINE)
+    if deadline is None or not ap.openweather_breaker.allow():
+        metrics.inc('weather_skipped')
+        return ap.get_stale(ap.weather_cache, lat, lon, 'weather_stale')
+
+    async def fetch():
+        start, weather = time.monotonic(), None
+        try:
+            with metrics.stage('weather_api'):
+                response = await state['client'].get(
+                    f"{ap.OPENWEATHER_URL}/weather",
+                    params={'lat': bucket_lat, 'lon': bucket_lon, 'appid': ap.OPENWEATHER_API_KEY, 'units': 'metric'},
+                )
+            if response.status_code != 200:
+                metrics.inc('weather_errors')
+                return None
+            weather = ap.parse_weather_response(response.json())
+        finally:
+            ap.openweather_breaker.record(weather is not None, time.monotonic() - start)
+        ap.weather_cache.put(bucket_lat, bucket_lon, weather)
+        return weather
+
+    try:
+        weather = await asyncio.wait_for(_single_flight(('weather', bucket_lat, bucket_lon), fetch), deadline)
+    except (asyncio.TimeoutError, httpx.HTTPError, ValueError, KeyError):
+        metrics.inc('weather_errors')
+        weather = None
+    if weather is None:
+        return ap.get_stale(ap.weather_cache, lat, lon, 'weather_stale')
+    return dict(weather)
+
+async def predict(data):
+    """Handle one /api/predict payload; returns (status, body)"""
+    country = data.get('country')
+    crop = data.get('crop')
+    # Validate country name
+    if not country or not isinstance(country, str) or country.strip() == "":
+        return 400, {'error': 'Country name is required and must be valid.'}
+    with metrics.stage('geocode'):
+        coords = await get_country_coordinates(country)
+    if not coords:
+        return 400, {'error': f'Could not find coordinates for country: {country}'}
+    lat, lon = coords
+    with metrics.stage('weather'):
+        weather = await get_weather_data(lat, lon)
+    if not weather:
+        # fallback to climate-based defaults
+        weather = ap.get_fallback_weather(country)
+    model, encoders = state['model'], state['encoders']
+    if ap.model_store.version:
+        # Follow hot-swaps published to the shared model store
+        model = ap.model_store.get()
+    if model:
+        model = ap.with_specialists(model)
+    if not model or not encoders:
+        return 500, {'error': 'Model not loaded'}
+    loop = asyncio.get_running_loop()
+    try:
+        async with state['semaphore']:
+            # Run in a copy of this request's context so encode/predict timings reach Server-Timing
+            risk = await loop.run_in_executor(
+                state['executor'], contextvars.copy_context().run,
+                ap.predict_aphid_risk, country, lat, lon, crop, weather, model, encoders
+            )
+    except Exception as e:
+        return 500, {'error': str(e)}
+    return 200, {
+        'risk': round(risk, 2),
+        'country': country,
+        'crop': crop,
+        'weather': weather
+    }
+
+def load_scorer(encoders):
+    """The trained model, or the analytic scorer when configured or as a fallback for a missing model"""
+    if ap.SCORING_BACKEND == 'analytic':
+        return ap.get_analytic_scorer(encoders)
+    try:
+        return ap.load_model()
+    except Exception as e:
+        if not ap.SCORING_FALLBACK:
+            raise
+        print(f"⚠️  Model loading error: {e}. Serving analytic risk scores instead.")
+        return ap.get_analytic_scorer(encoders)
+
+async def startup():
+    state['executor'] = ThreadPoolExecutor(max_workers=PREDICT_WORKERS, thread_name_prefix='predict')
+    state['semaphore'] = asyncio.Semaphore(MAX_PENDING_PREDICTIONS)
+    state['client'] = httpx.AsyncClient(
+        timeout=httpx.Timeout(max(GEOCODE_DEADLINE, WEATHER_DEADLINE)),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    ap.start_weather_prefetch()
+    loop = asyncio.get_running_loop()
+    try:
+        state['encoders'] = await loop.run_in_executor(state['executor'], ap.load_encoders)
+        state['model'] = await loop.run_in_executor(state['executor'], load_scorer, state['encoders'])
+        await loop.run_in_executor(state['executor'], ap.warm_up_prediction, state['model'], state['encoders'])
+        state['ready'] = True
+    except Exception as e:
+        state['model'] = None
+        state['encoders'] = None
+        print(f"Model loading error: {e}")
+
+async def shutdown():
+    await state['client'].aclose()
+    state['executor'].shutdown(wait=False)
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    await _send(send, status, body, b'application/json', extra_headers)
+
+async def _send(send, status, body, content_type, extra_headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            (b'access-control-allow-headers', b'Content-Type'),
+            (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+            *extra_headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+    if method == 'OPTIONS':
+        await _send_json(send, 204, None)
+    elif path == '/healthz':
+        await _send_json(send, 200, {'status': 'alive'})
+    elif path == '/readyz':
+        await _send_json(send, 200 if state['ready'] else 503, {'status': 'ready' if state['ready'] else 'not_ready'})
+    elif path == '/metrics':
+        await _send(send, 200, metrics.render_prometheus().encode(), b'text/plain; version=0.0.4')
+    elif path == '/api/predict' and method == 'POST':
+        try:
+            data = json.loads(await _read_body(receive) or b'{}')
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            await _send_json(send, 400, {'error': 'Request body must be a JSON object.'})
+            return
+        token = start_request() if SERVER_TIMING else None
+        # Upstream calls made for this request share one latency budget
+        deadline_token = start_deadline(ap.REQUEST_BUDGET)
+        try:
+            with metrics.stage('http_api_predict'):
+                status, payload = await predict(data)
+        finally:
+            end_deadline(deadline_token)
+        headers = [(b'server-timing', finish_request(token).encode())] if token is not None else []
+        await _send_json(send, status, payload, headers)
+    else:
+        await _send_json(send, 404, {'error': 'Not found'})
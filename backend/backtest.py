@@ -0,0 +1,276 @@
+"""Offline backtest of the served (or a candidate) model over a whole dataset
+
+Usage: python backtest.py [--data synthetic_aphid_dataset_with_risk1.csv] [--bundle artifacts/<version>]
+                          [--workers N] [--chunk-size 200000] [--analytic] [--output report.json]
+
+Rows are encoded the way predict_aphid_risk encodes a request: the
+country's climate and the published historical baseline come from the
+serving tables rather than from the dataset row. Only weather, month and
+crop are taken from the dataset. Chunks are scored in a process pool.
+Each worker returns per-group error sums, never predictions, so memory
+stays bounded by the chunks in flight whatever the dataset size.
+Feather/Parquet files are split by record batch / row group and read by
+the workers themselves. CSV chunks are read by the parent and shipped to
+the workers. Rows the server would reject (e.g. a country without a
+climate entry) are counted by reason instead of scored.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+import pandas as pd
+from dataset_io import count_parts, iter_dataset, read_part
+from feature_encoding import NEAREST_PRECISION
+
+GROUP_COLUMNS = ['country', 'climate_zone', 'crop_type', 'month']
+WEATHER_COLUMNS = ['temperature', 'humidity', 'rainfall', 'wind_speed']
+TARGET_COLUMN = 'aphid_risk'
+DATASET_COLUMNS = ['country', 'climate_zone', 'latitude', 'longitude', 'month', 'crop_type'] + WEATHER_COLUMNS + [TARGET_COLUMN]
+SUM_COLUMNS = ['rows', 'abs_error', 'sq_error', 'error', 'target', 'sq_target']
+
+_worker = {}
+
+def load_scorer(bundle=None, model_path=None, analytic=False):
+    """(model, encoders, historical baseline or None) from a bundle, a model file or the serving paths"""
+    import joblib
+    import aphid_predict as ap
+    if bundle:
+        encoders = joblib.load(os.path.join(bundle, 'encoders.joblib'))
+        baseline = np.load(os.path.join(bundle, 'historical_baseline.npy')).astype(np.float32)
+        model_path = model_path or os.path.join(bundle, 'model.joblib')
+    else:
+        encoders, baseline = ap.load_encoders(), None
+    if analytic:
+        model = ap.get_analytic_scorer(encoders)
+    elif model_path:
+        model = ap.load_compact_forest(model_path) if model_path.endswith('.npz') else joblib.load(model_path)
+    elif os.path.exists('aphid_risk_predictor.joblib'):
+        # sklearn's compiled traversal beats CompactForest on large chunks
+        model = joblib.load('aphid_risk_predictor.joblib')
+    else:
+        model = ap.load_model()
+    if hasattr(model, 'n_jobs'):
+        # Parallelism comes from the process pool
+        model.n_jobs = 1
+    return model, encoders, baseline
+
+def _init_worker(data_path, bundle, model_path, analytic):
+    import aphid_predict as ap
+    from feature_encoding import FeatureEncoder
+    model, encoders, baseline = load_scorer(bundle, model_path, analytic)
+    if baseline is None:
+        encoder = ap.get_feature_encoder(encoders)
+    else:
+        encoder = FeatureEncoder(encoders, ap.country_climates, baseline, ap.find_nearest_countries)
+    _worker.update(data_path=data_path, model=model, encoder=encoder)
+
+def encode_chunk(encoder, df):
+    """Feature matrix for a chunk plus a Counter of rows that cannot be encoded, by reason
+
+    Static features are resolved once per distinct (country, coordinates,
+    crop, month) through the same FeatureEncoder the server uses.
+    Coordinates only matter for countries outside the encoder's table,
+    which go through the nearest-country path.
+    """
+    country_ids, country_names = pd.factorize(df['country'])
+    crop_ids, crop_names = pd.factorize(df['crop_type'])
+    country_names = [str(name) for name in country_names]
+    known = np.array([name in encoder.country_codes for name in country_names], dtype=bool)[country_ids]
+    # One int64 key per row: country | crop | month | coordinate bucket (zero for known countries)
+    scale = 10 ** NEAREST_PRECISION
+    lat = np.where(known, 0, np.rint(df['latitude'].to_numpy(dtype=np.float64) * scale) + 90 * scale)
+    lon = np.where(known, 0, np.rint(df['longitude'].to_numpy(dtype=np.float64) * scale) + 180 * scale)
+    keys = country_ids.astype(np.int64)
+    for values, bits in ((crop_ids, 8), (df['month'].to_numpy(), 4), (lat, 15), (lon, 16)):
+        keys = (keys << bits) | values.astype(np.int64)
+    group_ids, unique = pd.factorize(keys)
+    unique = np.asarray(unique)
+    unique = np.column_stack([unique >> 43, (unique >> 35) & 0xff, (unique >> 31) & 0xf,
+                              (unique >> 16) & 0x7fff, unique & 0xffff])
+
+    static = np.full((len(unique), 5), np.nan)
+    reasons = {}
+    for i, (country_id, crop_id, month, lat, lon) in enumerate(unique.tolist()):
+        country = country_names[country_id]
+        coords = (None, None) if country in encoder.country_codes else ((lat - 90 * scale) / scale, (lon - 180 * scale) / scale)
+        try:
+            row = encoder.static_features(country, *coords, str(crop_names[crop_id]), month)
+        except ValueError as e:
+            reasons[i] = str(e)
+            continue
+        static[i] = [row['month'], row['historical_infestation'], row['country_encoded'],
+                     row['climate_encoded'], row['crop_encoded']]
+
+    X = np.empty((len(df), 9))
+    X[:, :4] = df[WEATHER_COLUMNS].to_numpy(dtype=np.float64)
+    X[:, 4:] = static[group_ids]
+    skipped = Counter()
+    if reasons:
+        counts = np.bincount(group_ids, minlength=len(unique))
+        for i, reason in reasons.items():
+            skipped[reason] += int(counts[i])
+    return X, skipped
+
+def group_sums(df, prediction):
+    """Per-group error sums for every breakdown column, plus the overall sums"""
+    target = df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    error = prediction - target
+    sums = pd.DataFrame({
+        'rows': 1, 'abs_error': np.abs(error), 'sq_error': error ** 2,
+        'error': error, 'target': target, 'sq_target': target ** 2,
+    })
+    breakdowns = {}
+    for column in GROUP_COLUMNS:
+        # Categorical columns (columnar files) group on their codes
+        keys = df[column].array if column != 'month' else df[column].to_numpy(dtype=np.int64)
+        grouped = sums.groupby(keys, sort=False, observed=True).sum()
+        if column != 'month':
+            grouped.index = grouped.index.astype(str)
+        breakdowns[column] = grouped
+    return {'overall': sums.sum(), 'breakdowns': breakdowns}
+
+def score_chunk(chunk):
+    """Worker task: a chunk DataFrame (CSV) or a part index (columnar); returns partial sums and timings"""
+    import aphid_predict as ap
+    start = time.perf_counter()
+    df = chunk if isinstance(chunk, pd.DataFrame) else read_part(_worker['data_path'], chunk, DATASET_COLUMNS)
+    read_seconds = time.perf_counter() - start
+    X, skipped = encode_chunk(_worker['encoder'], df)
+    scorable = ~np.isnan(X[:, 4])
+    encode_seconds = time.perf_counter() - start - read_seconds
+    prediction = np.clip(ap.predict_matrix(_worker['model'], X[scorable]), 0, 1)
+    predict_seconds = time.perf_counter() - start - read_seconds - encode_seconds
+    result = group_sums(df[scorable], prediction)
+    result.update(skipped=skipped, read_seconds=read_seconds, encode_seconds=encode_seconds,
+                  predict_seconds=predict_seconds,
+                  aggregate_seconds=time.perf_counter() - start - read_seconds - encode_seconds - predict_seconds)
+    return result
+
+def iter_tasks(data_path, chunk_size):
+    """Part indices for columnar files (workers read them), DataFrame chunks for CSV"""
+    parts = count_parts(data_path)
+    if parts is None:
+        yield from iter_dataset(data_path, chunk_size, DATASET_COLUMNS)
+    else:
+        yield from range(parts)
+
+def run_backtest(data_path, workers=None, chunk_size=200_000, bundle=None, model_path=None, analytic=False,
+                 progress=True):
+    """Score the whole dataset in a process pool; returns the merged report dict"""
+    workers = workers or os.cpu_count()
+    overall = pd.Series(0.0, index=SUM_COLUMNS)
+    breakdowns = {column: None for column in GROUP_COLUMNS}
+    skipped = Counter()
+    timings = Counter()
+    start = time.perf_counter()
+
+    def merge(result):
+        nonlocal overall
+        overall = overall + result['overall']
+        for column, sums in result['breakdowns'].items():
+            current = breakdowns[column]
+            breakdowns[column] = sums if current is None else current.add(sums, fill_value=0)
+        skipped.update(result['skipped'])
+        for name in ('read_seconds', 'encode_seconds', 'predict_seconds', 'aggregate_seconds'):
+            timings[name] += result[name]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data_path, bundle, model_path, analytic)) as executor:
+        pending = set()
+        # At most two chunks per worker in flight bounds memory for CSV input
+        for task in iter_tasks(data_path, chunk_size):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future.result())
+            pending.add(executor.submit(score_chunk, task))
+            if progress:
+                scored = int(overall['rows'])
+                print(f"\r⏳ {scored:,} rows scored", end='', flush=True)
+        for future in wait(pending).done:
+            merge(future.result())
+    seconds = time.perf_counter() - start
+    if progress:
+        print('\r' + ' ' * 40 + '\r', end='')
+
+    rows = int(overall['rows']) + sum(skipped.values())
+    return {
+        'data': os.path.abspath(data_path),
+        'model': 'analytic' if analytic else (model_path or bundle or 'served'),
+        'workers': workers,
+        'rows': rows,
+        'scored_rows': int(overall['rows']),
+        'skipped': dict(skipped),
+        'seconds': round(seconds, 3),
+        'rows_per_s': round(rows / seconds, 1) if seconds else None,
+        'worker_seconds': {name: round(value, 3) for name, value in timings.items()},
+        'overall': error_metrics(overall),
+        'breakdowns': {column: {str(key): error_metrics(row) for key, row in sorted_groups(column, sums).iterrows()}
+                       for column, sums in breakdowns.items() if sums is not None},
+    }
+
+def sorted_groups(column, sums):
+    """Months in calendar order, other breakdowns worst MAE first"""
+    if column == 'month':
+        return sums.sort_index()
+    return sums.loc[(sums['abs_error'] / sums['rows']).sort_values(ascending=False).index]
+
+def error_metrics(sums):
+    """Rows, MAE, RMSE, bias and R² from summed errors"""
+    rows = sums['rows']
+    if not rows:
+        return {'rows': 0, 'mae': None, 'rmse': None, 'bias': None, 'r2': None}
+    variance = sums['sq_target'] - sums['target'] ** 2 / rows
+    return {
+        'rows': int(rows),
+        'mae': float(sums['abs_error'] / rows),
+        'rmse': float(np.sqrt(sums['sq_error'] / rows)),
+        'bias': float(sums['error'] / rows),
+        'r2': float(1 - sums['sq_error'] / variance) if variance > 0 else None,
+    }
+
+def format_metrics(metrics):
+    r2 = f"{metrics['r2']:7.4f}" if metrics['r2'] is not None else '      -'
+    return f"{metrics['rows']:>11,}  {metrics['mae']:.4f}  {metrics['rmse']:.4f}  {r2}  {metrics['bias']:+.4f}"
+
+def print_report(report):
+    print(f"📊 Backtest of {report['model']} on {report['data']}")
+    print(f"   {report['rows']:,} rows in {report['seconds']:.1f} s ({report['rows_per_s']:,.0f} rows/s, "
+          f"{report['workers']} worker{'s' if report['workers'] > 1 else ''})")
+    timings = report['worker_seconds']
+    print(f"   Worker time: read {timings.get('read_seconds', 0):.1f} s, encode {timings.get('encode_seconds', 0):.1f} s, "
+          f"predict {timings.get('predict_seconds', 0):.1f} s, aggregate {timings.get('aggregate_seconds', 0):.1f} s")
+    for reason, count in report['skipped'].items():
+        print(f"⚠️  {count:,} rows not scorable: {reason}")
+    header = f"  {'':18s}{'rows':>11s}  MAE     RMSE        R²    bias"
+    print(header)
+    print(f"  {'overall':18s}{format_metrics(report['overall'])}")
+    for column, groups in report['breakdowns'].items():
+        print(f"\nBy {column} (worst MAE first):" if column != 'month' else f"\nBy {column}:")
+        for name, metrics in groups.items():
+            print(f"  {name[:18]:18s}{format_metrics(metrics)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest a model over a dataset, with error breakdowns")
+    parser.add_argument('--data', default="synthetic_aphid_dataset_with_risk1.csv",
+                        help="dataset path (.csv, .feather/.arrow or .parquet)")
+    parser.add_argument('--bundle', help="artifacts/<version> bundle to evaluate instead of the served model")
+    parser.add_argument('--model', help="model file (.joblib or .npz) to evaluate")
+    parser.add_argument('--analytic', action='store_true', help="evaluate the analytic risk score instead of a model")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, default one per core")
+    parser.add_argument('--chunk-size', type=int, default=200_000, help="rows per CSV chunk")
+    parser.add_argument('--output', help="write the report as JSON")
+    args = parser.parse_args()
+
+    report = run_backtest(args.data, args.workers, args.chunk_size, args.bundle, args.model, args.analytic)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Fault-injection check for the upstream circuit breakers and the request latency budget
+
+Usage: python bench_breaker.py [--requests 40] [--budget 1.0] [--slow-latency 3.0]
+
+Runs server.py in-process (with the Flask test client, from the directory
+holding the model and encoders) against fake_upstreams.py. The fake's latency
+and error rate are changed between phases:
+
+    healthy   normal answers, weather is cached
+    outage    every upstream call answers 503
+    slow      every upstream call takes --slow-latency seconds
+    recovery  healthy again, after the breaker's reset timeout
+
+The outage and slow phases run twice, first with the breakers and the
+budget disabled, then with both on. Each phase reports latency percentiles, how many answers used live,
+stale or default weather, and the breaker state at the end.
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+import numpy as np
+from fake_upstreams import start_fake_upstreams
+
+COUNTRIES = ['India', 'Kenya', 'France', 'Brazil', 'Canada', 'Egypt', 'Japan', 'Peru']
+
+def run_phase(client, name, n_requests, geocode=False):
+    """Send n_requests predictions; returns latency and weather-source counts"""
+    latencies, sources, errors = [], {'live': 0, 'stale': 0, 'default': 0}, 0
+    for i in range(n_requests):
+        # Unseen place names go to the geocoder, built-in countries only need weather
+        country = f"Place {name} {i}" if geocode and i % 2 else COUNTRIES[i % len(COUNTRIES)]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Silence the per-request nearest-country notes for unseen places
+            response = client.post('/api/predict', json={'country': country, 'crop': 'Wheat'})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors += 1
+            continue
+        weather = response.get_json()['weather']
+        sources['stale' if weather.get('stale') else 'default' if weather['description'] == 'default' else 'live'] += 1
+    return np.array(latencies) * 1000, sources, errors
+
+def report(server_module, name, latencies_ms, sources, errors):
+    breakers = {provider: breaker.stats() for provider, breaker in
+                (('nominatim', server_module.nominatim_breaker), ('openweathermap', server_module.openweather_breaker))}
+    print(f"{name:<22} p50 {np.percentile(latencies_ms, 50):7.1f} ms  p99 {np.percentile(latencies_ms, 99):7.1f} ms  "
+          f"max {latencies_ms.max():7.1f} ms  live {sources['live']:3d} stale {sources['stale']:3d} "
+          f"default {sources['default']:3d} errors {errors:3d}")
+    print(f"{'':<22} breakers: " + ', '.join(
+        f"{provider} {stats['state']} (opens {stats['opens']}, short-circuited {stats['short_circuited']})"
+        for provider, stats in breakers.items()))
+
+def reset_breakers(breakers, enabled):
+    for breaker in breakers:
+        breaker.state, breaker.consecutive_failures = 'closed', 0
+        breaker.failure_threshold = 3 if enabled else 10 ** 9
+        breaker.slow_call = 1.0 if enabled else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Circuit breaker and latency budget under injected upstream faults")
+    parser.add_argument('--requests', type=int, default=40, help="requests per phase")
+    parser.add_argument('--budget', type=float, default=1.0, help="request latency budget in seconds")
+    parser.add_argument('--slow-latency', type=float, default=3.0, help="upstream delay in the slow phase")
+    parser.add_argument('--reset', type=float, default=2.0, help="breaker reset timeout in seconds")
+    args = parser.parse_args()
+
+    upstream = start_fake_upstreams(latency=0.02)
+    # Slow answers to calls the server already gave up on end in broken pipes, which are expected here
+    upstream.handle_error = lambda request, client_address: None
+    os.environ.update({
+        'AGRINOVA_NOMINATIM_URL': upstream.base_url,
+        'AGRINOVA_OPENWEATHER_URL': f"{upstream.base_url}/data/2.5",
+        'AGRINOVA_GEOCODE_CACHE': '',
+        # Every read misses, so each request exercises the weather API (or the stale copy)
+        'AGRINOVA_WEATHER_TTL': '0',
+        'AGRINOVA_BREAKER_RESET': str(args.reset),
+        'AGRINOVA_WEATHER_PREFETCH': '0',
+        'AGRINOVA_RISK_GRID_RESOLUTION': '0',
+        'AGRINOVA_WARMUP': 'sync',
+    })
+    import aphid_predict
+    import server
+    client = server.app.test_client()
+    breakers = (server.nominatim_breaker, server.openweather_breaker)
+
+    reset_breakers(breakers, enabled=True)
+    report(server, 'healthy', *run_phase(client, 'healthy', args.requests, geocode=True))
+    for enabled in (False, True):
+        label = 'breaker+budget' if enabled else 'no breaker'
+        aphid_predict.REQUEST_BUDGET = server.REQUEST_BUDGET = args.budget if enabled else 0
+        reset_breakers(breakers, enabled)
+        upstream.error_rate, upstream.latency = 1.0, 0.02
+        report(server, f'outage, {label}', *run_phase(client, f'outage {enabled}', args.requests, geocode=True))
+        reset_breakers(breakers, enabled)
+        upstream.error_rate, upstream.latency = 0.0, args.slow_latency
+        n_slow = args.requests if enabled else min(args.requests, 8)
+        report(server, f'slow, {label}', *run_phase(client, f'slow {enabled}', n_slow, geocode=True))
+
+    upstream.error_rate, upstream.latency = 0.0, 0.02
+    time.sleep(args.reset)
+    report(server, 'recovery', *run_phase(client, 'recovery', args.requests, geocode=True))
+    upstream.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Load time and peak RSS of dataset files, each measured in a fresh process
+
+Usage: python bench_dataset_io.py DATASET [DATASET ...]
+"""
+import json
+import subprocess
+import sys
+
+LOADER = """
+import json, resource, sys, time
+from dataset_io import load_dataset
+FEATURE_COLUMNS = ['temperature', 'humidity', 'rainfall', 'wind_speed', 'month',
+                   'historical_infestation', 'country_encoded', 'climate_encoded', 'crop_encoded']
+start = time.perf_counter()
+df = load_dataset(sys.argv[1])
+X = df[FEATURE_COLUMNS].to_numpy()
+elapsed = time.perf_counter() - start
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({'rows': len(df), 'seconds': elapsed, 'peak_rss_mb': rss_mb}))
+"""
+
+def measure(path):
+    output = subprocess.run(
+        [sys.executable, '-c', LOADER, path], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    # Baseline interpreter + imports, to separate data from library footprint
+    baseline = json.loads(subprocess.run(
+        [sys.executable, '-c', LOADER.replace("df = load_dataset(sys.argv[1])", "import pandas as pd; df = pd.DataFrame({c: [] for c in FEATURE_COLUMNS})"), '-'],
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1])
+    print(f"{'interpreter + imports':40s} {'':>10s} {'':>9s} {baseline['peak_rss_mb']:9.0f} MB")
+    for path in sys.argv[1:]:
+        result = measure(path)
+        print(f"{path:40s} {result['rows']:10d} {result['seconds']:8.2f}s {result['peak_rss_mb']:9.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Parity check and per-row latency benchmark: sklearn forest vs CompactForest
+
+Usage: python bench_forest.py [model.joblib] [dataset.csv]
+"""
+import sys
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from forest_export import CompactForest, export_forest
+
+def time_per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'aphid_risk_predictor.joblib'
+    data_path = sys.argv[2] if len(sys.argv) > 2 else 'synthetic_aphid_dataset_with_risk1.csv'
+
+    model = joblib.load(model_path)
+    compact = CompactForest(export_forest(model))
+    df = pd.read_csv(data_path)
+    X = df[compact.feature_names]
+
+    # Parity over the full dataset
+    expected = model.predict(X)
+    actual = compact.predict(X.to_numpy())
+    max_diff = float(np.max(np.abs(expected - actual)))
+    print(f"Parity on {len(df)} rows: max |sklearn - compact| = {max_diff:.3e}")
+    if max_diff > 1e-9:
+        print("❌ Compact forest does not match sklearn")
+        sys.exit(1)
+
+    # Single-row latency, the /api/predict case
+    row_df = X.iloc[[0]]
+    row = X.iloc[0].to_numpy()
+    sklearn_row = time_per_call(lambda: model.predict(row_df), 50)
+    compact_row = time_per_call(lambda: compact.predict(row), 500)
+    print(f"Per-row latency  sklearn: {sklearn_row * 1e6:9.1f} µs   compact: {compact_row * 1e6:9.1f} µs"
+          f"   speedup: {sklearn_row / compact_row:.1f}x")
+
+    # Whole-matrix throughput
+    sklearn_all = time_per_call(lambda: model.predict(X), 3)
+    compact_all = time_per_call(lambda: compact.predict(X.to_numpy()), 3)
+    print(f"{len(df)}-row batch  sklearn: {sklearn_all * 1e3:9.1f} ms   compact: {compact_all * 1e3:9.1f} ms")
+
+if __name__ == "__main__":
+    main()
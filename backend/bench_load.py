@@ -0,0 +1,223 @@
+"""Load test: drive /api/predict and /api/predict/batch against fake upstreams
+
+Usage: python bench_load.py [--server flask|asgi|URL] [--concurrency 16] [--duration 20]
+                            [--latency 0.05] [--error-rate 0.0] [--output load.json]
+
+Starts fake_upstreams.py and the server under test as subprocesses (run
+from the directory holding the model and encoders), waits for /readyz,
+then keeps `concurrency` clients sending requests for `duration` seconds
+and reports throughput, latency percentiles, status codes and how many
+upstream calls the server made.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVER_COMMANDS = {
+    'flask': [sys.executable, '-c', "import sys, server; server.app.run('127.0.0.1', int(sys.argv[1]), threaded=True)"],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi_server:app', '--host', '127.0.0.1', '--log-level', 'warning', '--port'],
+}
+
+def free_port():
+    import socket
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for(base_url, path, timeout=120.0):
+    """Poll base_url + path until it answers 200"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if request(base_url, 'GET', path)[0] == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{base_url}{path} did not become ready within {timeout:.0f}s")
+
+def request(base_url, method, path, payload=None, connection=None):
+    """One HTTP request; returns (status, body bytes)"""
+    url = urlsplit(base_url)
+    conn = connection or http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    body = json.dumps(payload).encode() if payload is not None else None
+    headers = {'Content-Type': 'application/json'} if body else {}
+    try:
+        conn.request(method, path, body, headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        if connection is None:
+            conn.close()
+
+def start_servers(server, latency, jitter, error_rate, seed):
+    """Start fake upstreams and the server under test; returns (base_url, upstream_url, processes)"""
+    upstream_port = free_port()
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, 'fake_upstreams.py'), '--port', str(upstream_port),
+         '--latency', str(latency), '--jitter', str(jitter), '--error-rate', str(error_rate), '--seed', str(seed)],
+        stdout=subprocess.DEVNULL)
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    processes = [upstream]
+    if server not in SERVER_COMMANDS:
+        return server.rstrip('/'), upstream_url, processes
+
+    port = free_port()
+    env = dict(os.environ,
+               PYTHONPATH=BACKEND_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''),
+               AGRINOVA_NOMINATIM_URL=upstream_url,
+               AGRINOVA_OPENWEATHER_URL=f"{upstream_url}/data/2.5",
+               AGRINOVA_GEOCODE_CACHE='',
+               AGRINOVA_WEATHER_PREFETCH='0')
+    processes.append(subprocess.Popen(SERVER_COMMANDS[server] + [str(port)], env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    return f"http://127.0.0.1:{port}", upstream_url, processes
+
+def make_payload(rng, countries, crops, unknown_ratio, batch_size):
+    """Pick the next request: ('predict' | 'batch', path, body)"""
+    def item():
+        if rng.random() < unknown_ratio:
+            # Not in the built-in table: geocoded through the upstream, then cached
+            country = f"Region {rng.randrange(200)}"
+        else:
+            country = rng.choice(countries)
+        return {'country': country, 'crop': rng.choice(crops)}
+    if batch_size:
+        return 'batch', '/api/predict/batch', {'items': [item() for _ in range(batch_size)]}
+    return 'predict', '/api/predict', item()
+
+def run_load(base_url, concurrency=16, duration=20.0, warmup=2.0, batch_ratio=0.1, batch_size=20,
+             unknown_ratio=0.1, seed=0):
+    """Drive the server with closed-loop clients; returns a results dict"""
+    from aphid_predict import countries_coords, crops_susceptibility
+    countries = sorted(countries_coords)
+    crops = sorted(crops_susceptibility)
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+    samples = {'predict': [], 'batch': []}
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        url = urlsplit(base_url)
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+        local = {'predict': [], 'batch': []}
+        local_statuses = {}
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            kind, path, payload = make_payload(rng, countries, crops, unknown_ratio,
+                                               batch_size if rng.random() < batch_ratio else 0)
+            try:
+                status, _ = request(base_url, 'POST', path, payload, conn)
+            except (OSError, http.client.HTTPException):
+                # Server closed the connection (HTTP/1.0), reconnect
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+                status = 'connection_error'
+            end = time.perf_counter()
+            if now >= measure_from:
+                local[kind].append(end - now)
+                local_statuses[str(status)] = local_statuses.get(str(status), 0) + 1
+        conn.close()
+        with lock:
+            for kind in samples:
+                samples[kind].extend(local[kind])
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = {
+        'config': {'concurrency': concurrency, 'duration_s': duration, 'batch_ratio': batch_ratio,
+                   'batch_size': batch_size, 'unknown_ratio': unknown_ratio, 'seed': seed},
+        'statuses': statuses,
+    }
+    for kind, latencies in samples.items():
+        if latencies:
+            results[kind] = latency_summary(latencies, duration)
+    results['error_rate'] = 1 - statuses.get('200', 0) / max(1, sum(statuses.values()))
+    return results
+
+def latency_summary(latencies, duration):
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / duration,
+        'mean_ms': float(latencies_ms.mean()),
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+    }
+
+def run(server='flask', concurrency=16, duration=20.0, latency=0.05, jitter=0.0, error_rate=0.0,
+        batch_ratio=0.1, batch_size=20, unknown_ratio=0.1, seed=0):
+    """Start everything, run the load test and stop the subprocesses"""
+    base_url, upstream_url, processes = start_servers(server, latency, jitter, error_rate, seed)
+    try:
+        wait_for(upstream_url, '/__stats')
+        wait_for(base_url, '/readyz')
+        results = run_load(base_url, concurrency, duration, batch_ratio=batch_ratio, batch_size=batch_size,
+                           unknown_ratio=unknown_ratio, seed=seed)
+        results['config'].update({'server': server, 'upstream_latency_s': latency,
+                                  'upstream_jitter_s': jitter, 'upstream_error_rate': error_rate})
+        results['upstream_requests'] = json.loads(request(upstream_url, 'GET', '/__stats')[1])
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    return results
+
+def print_results(results):
+    config = results['config']
+    print(f"🚦 {config['server']}: {config['concurrency']} clients for {config['duration_s']:.0f}s, "
+          f"upstream latency {config['upstream_latency_s'] * 1000:.0f} ms, error rate {config['upstream_error_rate']:.0%}")
+    for kind in ('predict', 'batch'):
+        if kind in results:
+            r = results[kind]
+            print(f"  {kind:8s} {r['requests']:6d} req  {r['throughput_rps']:8.1f} req/s   "
+                  f"p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms  p99 {r['p99_ms']:7.1f} ms")
+    print(f"  statuses: {results['statuses']}   upstream calls: {results['upstream_requests']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the prediction API against fake upstreams")
+    parser.add_argument('--server', default='flask', help="flask, asgi, or the base URL of a running server")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help="measured seconds (after a 2 s warm-up)")
+    parser.add_argument('--latency', type=float, default=0.05, help="fake upstream delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of upstream calls failing with 503")
+    parser.add_argument('--batch-ratio', type=float, default=0.1, help="fraction of requests sent to /api/predict/batch")
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--unknown-ratio', type=float, default=0.1, help="fraction of items naming places outside the built-in table")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.server, args.concurrency, args.duration, args.latency, args.jitter, args.error_rate,
+                  args.batch_ratio, args.batch_size, args.unknown_ratio, args.seed)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
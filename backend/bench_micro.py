@@ -0,0 +1,93 @@
+"""Microbenchmarks for the hot paths: prediction, nearest-country lookup, dataset generation
+
+Usage: python bench_micro.py [--rows 200000] [--output micro.json]
+
+Run from the directory holding the model and encoders. Each benchmark is
+repeated and the median per-call time is reported; no network is used
+(weather is passed in, coordinates come from the built-in table).
+"""
+import argparse
+import json
+import statistics
+import time
+import numpy as np
+
+def median_seconds(fn, number, repeat=5):
+    """Median over `repeat` runs of the mean time per call across `number` calls"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return statistics.median(times)
+
+def bench_predict(model, encoders):
+    from aphid_predict import (countries_coords, parse_forecast_response, predict_aphid_risk,
+                               predict_aphid_risk_batch, predict_aphid_risk_forecast)
+    from fake_upstreams import fake_forecast
+    weather = {'temperature': 24, 'humidity': 65, 'rainfall': 3, 'wind_speed': 4}
+    lat, lon = countries_coords['India']
+    single = median_seconds(lambda: predict_aphid_risk('India', lat, lon, 'Wheat', weather, model, encoders), 200)
+    # Coordinates outside the table exercise the nearest-country path of the encoder
+    unknown = median_seconds(lambda: predict_aphid_risk('Atlantis', 31.5, -40.2, 'Wheat', weather, model, encoders), 200)
+    items = [{'country': country, 'crop': 'Maize', 'weather': weather} for country in list(countries_coords)[:40]] * 5
+    batch = median_seconds(lambda: predict_aphid_risk_batch(items, model, encoders), 10)
+    forecast = parse_forecast_response(fake_forecast(lat, lon))
+    week = median_seconds(lambda: predict_aphid_risk_forecast('India', lat, lon, 'Wheat', forecast, model, encoders), 20)
+    return {
+        'predict_aphid_risk_us': single * 1e6,
+        'predict_aphid_risk_unknown_country_us': unknown * 1e6,
+        'predict_aphid_risk_batch_200_ms': batch * 1e3,
+        'predict_aphid_risk_batch_items_per_s': len(items) / batch,
+        'predict_aphid_risk_forecast_40_steps_us': week * 1e6,
+    }
+
+def bench_find_nearest():
+    from aphid_predict import find_nearest_countries
+    rng = np.random.default_rng(0)
+    points = list(zip(rng.uniform(-60, 70, 1000), rng.uniform(-180, 180, 1000)))
+    find_nearest_countries(*points[0])
+    index = iter(range(10 ** 9))
+    per_call = median_seconds(lambda: find_nearest_countries(*points[next(index) % len(points)]), 1000)
+    return {'find_nearest_countries_us': per_call * 1e6}
+
+def bench_gends(n_rows):
+    from gends import build_encoders, generate_dataset
+    encoders = build_encoders()
+    seconds = median_seconds(lambda: sum(len(chunk) for chunk in generate_dataset(n_rows, 42, encoders=encoders)), 1, repeat=3)
+    return {'gends_rows': n_rows, 'gends_seconds': seconds, 'gends_rows_per_s': n_rows / seconds}
+
+def run(n_rows=200_000):
+    """Run every microbenchmark; returns a flat dict of metrics"""
+    from aphid_predict import load_encoders, load_model
+    results = {}
+    try:
+        model, encoders = load_model(), load_encoders()
+    except (OSError, FileNotFoundError) as e:
+        print(f"⚠️  Skipping prediction benchmarks, model not found: {e}")
+    else:
+        results.update(bench_predict(model, encoders))
+    results.update(bench_find_nearest())
+    results.update(bench_gends(n_rows))
+    return results
+
+def print_results(results):
+    for name, value in results.items():
+        print(f"  {name:42s} {value:12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for prediction, region lookup and dataset generation")
+    parser.add_argument('--rows', type=int, default=200_000, help="rows generated by the gends benchmark")
+    parser.add_argument('--output', help="write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rows)
+    print("⏱️  Microbenchmarks")
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Per-worker memory of N simultaneous workers: private joblib copies vs the shared model store
+
+Usage: python bench_model_store.py [model.joblib] [n_workers]
+
+Each worker loads the model the way server.py would, runs a batch of
+predictions so the pages it needs are touched, then reports RSS and PSS
+(proportional set size: shared pages divided between the processes
+mapping them) while all workers are alive at once.
+"""
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+def memory_kb():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+def worker(mode, source, barrier, results):
+    import joblib
+    from model_store import ModelStore
+
+    start = time.perf_counter()
+    if mode == 'joblib':
+        model = joblib.load(source)
+    else:
+        model = ModelStore(source).get()
+    load_seconds = time.perf_counter() - start
+    X = np.random.default_rng(os.getpid()).uniform(0, 50, size=(2000, 9))
+    model.predict(X)
+    barrier.wait()
+    results.put((mode, load_seconds, memory_kb()))
+    barrier.wait()
+
+def run(mode, source, n_workers):
+    ctx = mp.get_context('spawn')
+    barrier = ctx.Barrier(n_workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(mode, source, barrier, results)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    rss = np.mean([r[2]['rss'] for r in reports]) / 1024
+    pss = np.mean([r[2]['pss'] for r in reports]) / 1024
+    load = np.mean([r[1] for r in reports])
+    print(f"{mode:12s} workers={n_workers}  load: {load:6.2f} s   RSS/worker: {rss:7.1f} MB   PSS/worker: {pss:7.1f} MB")
+
+def main():
+    import joblib
+    from forest_export import export_forest
+    from model_store import ModelStore
+
+    source = sys.argv[1] if len(sys.argv) > 1 else 'aphid_risk_predictor.joblib'
+    n_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with tempfile.TemporaryDirectory() as store_dir:
+        ModelStore(store_dir).publish(export_forest(joblib.load(source)))
+        run('joblib', source, n_workers)
+        run('model_store', store_dir, n_workers)
+
+if __name__ == "__main__":
+    main()
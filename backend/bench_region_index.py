@@ -0,0 +1,57 @@
+"""Benchmark: nearest-region lookup, per-point haversine loop vs batched BallTree query
+
+Usage: python bench_region_index.py [n_points] [n_regions]
+"""
+import sys
+import time
+import numpy as np
+from aphid_predict import countries_coords, haversine_distance
+from region_index import RegionCatalog
+
+def loop_nearest(coords, lat, lon, k):
+    """The original find_nearest_countries: full distance list, then sort"""
+    distances = []
+    for name, (region_lat, region_lon) in coords.items():
+        distances.append((name, haversine_distance(lat, lon, region_lat, region_lon), region_lat, region_lon))
+    distances.sort(key=lambda x: x[1])
+    return distances[:k]
+
+def run(coords, lats, lons, k=5):
+    catalog = RegionCatalog.from_coords(coords)
+
+    start = time.perf_counter()
+    expected = [loop_nearest(coords, lat, lon, k)[0][0] for lat, lon in zip(lats, lons)]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, indices = catalog.query(lats, lons, k)
+    index_time = time.perf_counter() - start
+
+    actual = [catalog.names[i] for i in indices[:, 0]]
+    mismatches = sum(a != e for a, e in zip(actual, expected))
+    print(f"{len(coords):6d} regions x {len(lats)} points   loop: {loop_time:8.3f} s   "
+          f"BallTree batch: {index_time:8.4f} s   speedup: {loop_time / index_time:7.1f}x   "
+          f"nearest mismatches: {mismatches}")
+
+def main():
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    n_regions = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(-60, 70, n_points)
+    lons = rng.uniform(-180, 180, n_points)
+
+    run(countries_coords, lats, lons)
+
+    regions = {
+        f"region-{i}": (lat, lon)
+        for i, (lat, lon) in enumerate(zip(rng.uniform(-60, 70, n_regions), rng.uniform(-180, 180, n_regions)))
+    }
+    # The loop is O(points x regions); time it on a subset and scale
+    subset = max(1, n_points // 50)
+    catalog_start = time.perf_counter()
+    RegionCatalog.from_coords(regions)
+    print(f"Index build for {n_regions} regions: {time.perf_counter() - catalog_start:.4f} s")
+    run(regions, lats[:subset], lons[:subset])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Replay a traffic log through GET /api/predict and report the response cache hit ratio
+
+Usage: python bench_response_cache.py [traffic.jsonl] [--requests 5000] [--write-log traffic.jsonl]
+
+A traffic log has one JSON object per line with "country" and "crop".
+Without a log, Zipf-distributed traffic over the built-in countries and
+crops is generated (popular countries dominate, like real dashboards).
+Requests run in-process against the Flask app, with fake_upstreams.py
+standing in for the weather and geocoding APIs, in log order. Run from
+the directory holding the model and encoders.
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+
+def synthetic_log(n_requests, seed=0, zipf_a=1.3):
+    from aphid_predict import countries_coords, crops_susceptibility
+    rng = np.random.default_rng(seed)
+    countries = list(countries_coords)
+    crops = list(crops_susceptibility)
+    country_ranks = np.minimum(rng.zipf(zipf_a, n_requests), len(countries)) - 1
+    crop_ranks = np.minimum(rng.zipf(zipf_a + 0.5, n_requests), len(crops)) - 1
+    return [{'country': countries[i], 'crop': crops[j]} for i, j in zip(country_ranks, crop_ranks)]
+
+def replay(entries, client, response_cache):
+    """Send every entry as GET /api/predict; returns latency lists split by cache hit / miss"""
+    hit_latencies, miss_latencies = [], []
+    statuses = {}
+    for entry in entries:
+        hits_before = response_cache.hits
+        start = time.perf_counter()
+        response = client.get('/api/predict', query_string={'country': entry['country'], 'crop': entry['crop']})
+        elapsed = time.perf_counter() - start
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        (hit_latencies if response_cache.hits > hits_before else miss_latencies).append(elapsed)
+    return hit_latencies, miss_latencies, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay traffic and report the /api/predict response cache hit ratio")
+    parser.add_argument('log', nargs='?', help="JSON-lines traffic log; synthetic Zipf traffic when omitted")
+    parser.add_argument('--requests', type=int, default=5000, help="synthetic requests to generate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--write-log', help="save the synthetic log for later replays")
+    args = parser.parse_args()
+
+    from fake_upstreams import start_fake_upstreams
+    upstream = start_fake_upstreams(latency=0.02)
+    os.environ.update({
+        'AGRINOVA_NOMINATIM_URL': upstream.base_url,
+        'AGRINOVA_OPENWEATHER_URL': f"{upstream.base_url}/data/2.5",
+        'AGRINOVA_GEOCODE_CACHE': '',
+        'AGRINOVA_WARMUP': 'sync',
+        'AGRINOVA_RISK_GRID_RESOLUTION': '0',
+        'AGRINOVA_WEATHER_PREFETCH': '0',
+    })
+    import server
+
+    if args.log:
+        with open(args.log) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    else:
+        entries = synthetic_log(args.requests, args.seed)
+        if args.write_log:
+            with open(args.write_log, 'w') as f:
+                f.writelines(json.dumps(entry) + '\n' for entry in entries)
+
+    hits, misses, statuses = replay(entries, server.app.test_client(), server.response_cache)
+    stats = server.response_cache.stats()
+    distinct = len({(e['country'], e['crop']) for e in entries})
+    print(f"🔁 Replayed {len(entries)} requests ({distinct} distinct country/crop pairs), statuses {statuses}")
+    print(f"   Response cache: {stats['hits']} hits, {stats['misses']} misses, hit ratio {stats['hit_ratio']:.1%}, "
+          f"{stats['evictions']} evictions")
+    if hits:
+        print(f"   Hit latency:  p50 {np.percentile(hits, 50) * 1e3:7.2f} ms   p95 {np.percentile(hits, 95) * 1e3:7.2f} ms")
+    if misses:
+        print(f"   Miss latency: p50 {np.percentile(misses, 50) * 1e3:7.2f} ms   p95 {np.percentile(misses, 95) * 1e3:7.2f} ms")
+    print(f"   Upstream calls: {upstream.requests}")
+    upstream.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Benchmark the vectorized analytic risk score against the scalar gends.py formula
+
+Usage: python bench_risk_scoring.py [--rows 1000000] [--model-rows 100000]
+
+Inputs are drawn the way gends.py draws them. The scalar loop and the
+vectorized function score the same rows; both add ±0.05 label noise from
+different generators, so agreement is checked against the noise-free
+vectorized score. When a model is found in the working directory, the
+analytic scorer and the model are also timed on the same encoded feature
+matrix, the cheap-tier comparison.
+"""
+import argparse
+import time
+import numpy as np
+from gends import (calculate_aphid_risk, countries_coords, country_climates, crops_susceptibility,
+                   generate_weather_arrays)
+from risk_scoring import AnalyticScorer, analytic_risk
+
+def make_inputs(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    countries = list(countries_coords)
+    climates = np.array([country_climates.get(countries[i], "temperate") for i in rng.integers(0, len(countries), n_rows)])
+    months = rng.integers(1, 13, n_rows)
+    temp, humidity, rainfall, wind = generate_weather_arrays(rng, climates, months)
+    crop_idx = rng.integers(0, len(crops_susceptibility), n_rows)
+    susceptibility = np.array(list(crops_susceptibility.values()))[crop_idx]
+    historical = rng.uniform(0, 1, n_rows)
+    return (temp, humidity, rainfall, wind, months, susceptibility, historical), crop_idx
+
+def bench_scalar_vs_vectorized(inputs):
+    n_rows = len(inputs[0])
+    start = time.perf_counter()
+    columns = [column.tolist() for column in inputs]
+    scalar = np.array([calculate_aphid_risk(*row) for row in zip(*columns)])
+    scalar_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    start = time.perf_counter()
+    analytic_risk(*inputs, rng=rng)
+    vector_seconds = time.perf_counter() - start
+
+    expected = analytic_risk(*inputs)
+    max_diff = float(np.max(np.abs(scalar - expected)))
+    print(f"📐 {n_rows} rows: scalar {scalar_seconds:.2f} s ({n_rows / scalar_seconds:,.0f} rows/s), "
+          f"vectorized {vector_seconds * 1e3:.1f} ms ({n_rows / vector_seconds:,.0f} rows/s), "
+          f"{scalar_seconds / vector_seconds:.0f}x faster")
+    print(f"   max |scalar - noise-free vectorized| = {max_diff:.4f} (label noise is ±0.05)")
+    return max_diff <= 0.05 + 1e-9
+
+def bench_cheap_tier(inputs, crop_idx, n_rows):
+    from aphid_predict import FEATURE_COLUMNS, load_encoders, load_model, predict_matrix
+    try:
+        model, encoders = load_model(), load_encoders()
+    except (OSError, FileNotFoundError) as e:
+        print(f"⚠️  Skipping model comparison, model not found: {e}")
+        return
+    temp, humidity, rainfall, wind, months, susceptibility, historical = (column[:n_rows] for column in inputs)
+    crop_classes = encoders['crop_encoder'].classes_
+    crop_codes = np.array([list(crop_classes).index(crop) for crop in crops_susceptibility])
+    # Country and climate codes do not enter the formula; zeros keep the matrix model-shaped
+    columns = {'temperature': temp, 'humidity': humidity, 'rainfall': rainfall, 'wind_speed': wind, 'month': months,
+               'historical_infestation': historical, 'country_encoded': np.zeros(n_rows),
+               'climate_encoded': np.zeros(n_rows), 'crop_encoded': crop_codes[crop_idx[:n_rows]]}
+    X = np.column_stack([columns[name] for name in FEATURE_COLUMNS]).astype(np.float64)
+    scorer = AnalyticScorer(crop_classes, crops_susceptibility, FEATURE_COLUMNS)
+    expected = analytic_risk(temp, humidity, rainfall, wind, months, susceptibility, historical)
+
+    start = time.perf_counter()
+    analytic = predict_matrix(scorer, X)
+    analytic_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    predicted = np.clip(predict_matrix(model, X), 0, 1)
+    model_seconds = time.perf_counter() - start
+    print(f"⚖️  {n_rows} encoded rows: analytic scorer {analytic_seconds * 1e3:.1f} ms, "
+          f"model {model_seconds * 1e3:.1f} ms ({model_seconds / analytic_seconds:.0f}x)")
+    print(f"   analytic vs formula max diff {np.max(np.abs(analytic - expected)):.1e}, "
+          f"model vs formula MAE {np.mean(np.abs(predicted - expected)):.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scalar vs vectorized analytic risk score")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--model-rows', type=int, default=100_000, help="rows for the analytic vs model comparison, 0 skips it")
+    args = parser.parse_args()
+
+    inputs, crop_idx = make_inputs(args.rows)
+    if not bench_scalar_vs_vectorized(inputs):
+        print("❌ Vectorized score disagrees with the scalar formula beyond the label noise")
+        raise SystemExit(1)
+    if args.model_rows:
+        bench_cheap_tier(inputs, crop_idx, min(args.model_rows, args.rows))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark suite: microbenchmarks plus a load test, saved as JSON and compared between commits
+
+Usage:
+    python bench_suite.py --output bench_results/$(git rev-parse --short HEAD).json
+    python bench_suite.py --output new.json --compare bench_results/baseline.json
+    python bench_suite.py --compare old.json new.json      (compare two saved runs only)
+
+Metrics ending in _us/_ms/_seconds are lower-is-better, metrics ending in
+_per_s/_rps are higher-is-better; anything else is informational. A change
+worse than --tolerance (default 10%) is reported as a regression and makes
+the exit status 1.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+import bench_load
+import bench_micro
+
+LOWER_IS_BETTER = ('_us', '_ms', '_seconds')
+HIGHER_IS_BETTER = ('_per_s', '_rps')
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def flatten(results, prefix=''):
+    """Nested results dict -> {'load.predict.p95_ms': value, ...} for numeric leaves"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(old, new, tolerance=0.10):
+    """Print a metric-by-metric comparison; returns the names of regressed metrics"""
+    old_flat, new_flat = flatten(old['results']), flatten(new['results'])
+    regressions = []
+    print(f"📊 {old.get('commit') or 'old'} -> {new.get('commit') or 'new'}")
+    for name in sorted(old_flat.keys() & new_flat.keys()):
+        before, after = old_flat[name], new_flat[name]
+        metric = name.rsplit('.', 1)[-1]
+        if metric.endswith(LOWER_IS_BETTER):
+            worse = after > before * (1 + tolerance)
+        elif metric.endswith(HIGHER_IS_BETTER):
+            worse = after < before * (1 - tolerance)
+        else:
+            continue
+        change = (after - before) / before if before else 0.0
+        marker = '❌' if worse else '  '
+        print(f"{marker} {name:52s} {before:12.2f} -> {after:12.2f}  ({change:+.1%})")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+def run(args):
+    results = {'micro': bench_micro.run(args.rows)}
+    if not args.skip_load:
+        results['load'] = bench_load.run(args.server, args.concurrency, args.duration, args.latency,
+                                         error_rate=args.error_rate, seed=args.seed)
+    return {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare against a saved run")
+    parser.add_argument('runs', nargs='*', help="with --compare: a saved run to compare instead of running the suite")
+    parser.add_argument('--output', help="write this run as JSON")
+    parser.add_argument('--compare', help="saved run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument('--rows', type=int, default=200_000, help="rows for the gends benchmark")
+    parser.add_argument('--skip-load', action='store_true', help="only run the microbenchmarks")
+    parser.add_argument('--server', default='flask', help="flask, asgi, or the base URL of a running server")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--latency', type=float, default=0.05, help="fake upstream delay in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of upstream calls failing")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.compare and args.runs:
+        with open(args.runs[0]) as f:
+            current = json.load(f)
+    else:
+        current = run(args)
+        print("⏱️  Microbenchmarks")
+        bench_micro.print_results(current['results']['micro'])
+        if 'load' in current['results']:
+            bench_load.print_results(current['results']['load'])
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+            print(f"💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Circuit breakers for upstream providers and per-request latency budgets
+
+A breaker starts closed. After ``failure_threshold`` consecutive failed
+(or slower than ``slow_call``) calls it opens, and calls are skipped for
+``reset_timeout`` seconds. It then goes half-open: up to
+``half_open_calls`` probes are let through, and the first result closes or
+re-opens it.
+
+A request's latency budget is kept in a context variable (``start_deadline``),
+so upstream calls made anywhere below the request handler can clamp their
+timeouts with ``upstream_timeout`` or skip the call when the budget is spent.
+"""
+import threading
+import time
+from contextvars import ContextVar
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+# Not worth starting an upstream call with less than this left in the budget
+MIN_UPSTREAM_SECONDS = 0.05
+
+_deadline = ContextVar('request_deadline', default=None)
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one upstream provider"""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_calls=1, slow_call=None,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.slow_call = slow_call
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.short_circuited = 0
+        self.opens = 0
+        self._opened_at = None
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True when a call may go upstream now; False (counted as short-circuited) while open"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record(self, ok, seconds=None):
+        """Report the outcome of a call allowed by ``allow``; slow successes count as failures"""
+        if ok and self.slow_call is not None and seconds is not None and seconds > self.slow_call:
+            ok = False
+            self.slow_calls += 1
+        with self._lock:
+            if ok:
+                self.successes += 1
+                self.consecutive_failures = 0
+                self.state = CLOSED
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opens += 1
+                self.state = OPEN
+                self._opened_at = self.clock()
+
+    def stats(self):
+        """Return the state (also as state_code 0/1/2 for closed/half-open/open) and call counters"""
+        with self._lock:
+            retry_in = max(0.0, self._opened_at + self.reset_timeout - self.clock()) if self.state == OPEN else 0.0
+            return {
+                'state': self.state,
+                'state_code': STATE_CODES[self.state],
+                'consecutive_failures': self.consecutive_failures,
+                'successes': self.successes,
+                'failures': self.failures,
+                'slow_calls': self.slow_calls,
+                'short_circuited': self.short_circuited,
+                'opens': self.opens,
+                'retry_in': round(retry_in, 3),
+            }
+
+def start_deadline(budget):
+    """Give the current request `budget` seconds for upstream calls; returns a reset token"""
+    return _deadline.set(time.monotonic() + budget if budget else None)
+
+def end_deadline(token):
+    _deadline.reset(token)
+
+def time_left():
+    """Seconds left in the current request's budget, None outside a budgeted request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def upstream_timeout(timeout):
+    """Clamp a scalar or (connect, read) timeout to the remaining budget; None when too little is left"""
+    left = time_left()
+    if left is None:
+        return timeout
+    if left < MIN_UPSTREAM_SECONDS:
+        return None
+    if isinstance(timeout, tuple):
+        return tuple(min(t, left) for t in timeout)
+    return min(timeout, left)
@@ -0,0 +1,268 @@
+"""Search smaller variants of a trained forest and report accuracy vs latency vs size
+
+Usage: python compact_model.py [--bundle artifacts/<version>] [--data dataset] [--distill]
+                               [--budget-us 500] [--max-mae-increase 0.002] [--publish]
+
+Candidates are scored on the held-out split train.py uses (same test size
+and random state):
+
+- the bundle's forest as trained
+- the forest cut down to its first N trees (no retraining)
+- forests retrained over a grid of tree count x max depth x min leaf size
+- with --distill, a single shallow tree and small gradient-boosted models
+  fitted to the original forest's predictions. They are fitted on the
+  training rows plus copies whose weather comes from another row of the
+  same climate zone, so the student sees the teacher's smooth response
+  instead of the label noise.
+
+Latency is the median single-row predict time on the served
+CompactForest. Size is the exported .npz, the file workers map from the
+model store. Candidates no other candidate beats on all three are marked
+as Pareto-optimal. Every variant must stay within --max-mae-increase of
+the original's test MAE and under --max-size-mb. With --budget-us the most
+accurate variant that fits the budget is chosen, otherwise the fastest.
+It is written as a normal bundle; --publish installs it like train.py
+--publish.
+"""
+import argparse
+import copy
+import io
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeRegressor
+from dataset_io import load_dataset
+from forest_export import CompactForest, export_forest
+from train import (FEATURE_COLUMNS, TARGET_COLUMN, bundle_version, compute_historical_baseline, evaluate, file_sha256,
+                   load_bundle, publish_bundle, train_model, write_bundle)
+
+def truncate_forest(model, n_trees):
+    """Copy of a fitted forest keeping only its first n_trees trees"""
+    truncated = copy.copy(model)
+    truncated.estimators_ = model.estimators_[:n_trees]
+    truncated.n_estimators = n_trees
+    return truncated
+
+def augment_weather(X, rng, copies):
+    """X plus `copies` versions whose weather columns come from random rows of the same climate zone"""
+    columns = X.columns
+    X = X.to_numpy(dtype=np.float64)
+    weather = [FEATURE_COLUMNS.index(c) for c in ('temperature', 'humidity', 'rainfall', 'wind_speed')]
+    climate = X[:, FEATURE_COLUMNS.index('climate_encoded')]
+    parts = [X]
+    for _ in range(copies):
+        copy_ = X.copy()
+        for zone in np.unique(climate):
+            rows = np.flatnonzero(climate == zone)
+            copy_[np.ix_(rows, weather)] = X[np.ix_(rng.choice(rows, len(rows)), weather)]
+        parts.append(copy_)
+    return pd.DataFrame(np.concatenate(parts), columns=columns)
+
+def row_latency_us(compact, X, rows=200, passes=5):
+    """Single-row CompactForest predict time: best over `passes` of the median across `rows` test rows"""
+    X = X[:rows]
+    for row in X[:20]:
+        compact.predict(row)
+    medians = []
+    for _ in range(passes):
+        times = []
+        for row in X:
+            start = time.perf_counter()
+            compact.predict(row)
+            times.append(time.perf_counter() - start)
+        medians.append(statistics.median(times))
+    return min(medians) * 1e6
+
+def measure(name, model, X_test, y_test, fit_seconds=0.0):
+    arrays = export_forest(model, FEATURE_COLUMNS)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    joblib_buffer = io.BytesIO()
+    joblib.dump(model, joblib_buffer)
+    compact = CompactForest(arrays)
+    test = evaluate(model, X_test, y_test)
+    return {
+        'name': name,
+        'model': model,
+        'trees': len(arrays['roots']),
+        'depth': int(arrays['max_depth']),
+        'nodes': len(arrays['feature']),
+        'mae': test['mae'],
+        'rmse': test['rmse'],
+        'r2': test['r2'],
+        'latency_us': row_latency_us(compact, X_test.to_numpy()),
+        'size_mb': buffer.getbuffer().nbytes / 1e6,
+        'joblib_mb': joblib_buffer.getbuffer().nbytes / 1e6,
+        'fit_seconds': fit_seconds,
+    }
+
+def search(base_model, X_train, y_train, X_test, y_test, trees, depths, leaf_sizes, distill=False, n_jobs=-1,
+           random_state=42, progress=print):
+    """Measure every candidate; returns a list of result dicts"""
+    results = [measure('original', base_model, X_test, y_test)]
+    progress(f"  original: MAE {results[0]['mae']:.4f}, {results[0]['latency_us']:.0f} µs/row")
+    # Only a random forest can be cut down to a prefix of its trees
+    forest_size = len(base_model.estimators_) if isinstance(getattr(base_model, 'estimators_', None), list) else 0
+    for n_trees in trees:
+        if n_trees < forest_size:
+            results.append(measure(f'first-{n_trees}', truncate_forest(base_model, n_trees), X_test, y_test))
+
+    for n_trees in trees:
+        for depth in depths:
+            for leaf in leaf_sizes:
+                start = time.perf_counter()
+                model = train_model(X_train, y_train, n_trees, n_jobs, random_state,
+                                    max_depth=depth, min_samples_leaf=leaf)
+                name = f'rf-{n_trees}t-d{depth or "max"}-l{leaf}'
+                results.append(measure(name, model, X_test, y_test, time.perf_counter() - start))
+        progress(f"  retrained {n_trees}-tree forests: {len(depths) * len(leaf_sizes)} variants")
+
+    if distill:
+        rng = np.random.default_rng(random_state)
+        X_distill = augment_weather(X_train, rng, copies=2)
+        teacher = base_model.predict(X_distill)
+        for depth in (6, 8, 10, 12):
+            start = time.perf_counter()
+            model = DecisionTreeRegressor(max_depth=depth, min_samples_leaf=5, random_state=random_state)
+            model.fit(X_distill, teacher)
+            results.append(measure(f'distill-tree-d{depth}', model, X_test, y_test, time.perf_counter() - start))
+        for n_trees, depth in ((50, 3), (100, 3), (100, 4)):
+            start = time.perf_counter()
+            model = GradientBoostingRegressor(n_estimators=n_trees, max_depth=depth, learning_rate=0.1,
+                                              random_state=random_state)
+            model.fit(X_distill, teacher)
+            results.append(measure(f'distill-gbm-{n_trees}t-d{depth}', model, X_test, y_test,
+                                   time.perf_counter() - start))
+        progress("  distilled a single tree and gradient-boosted models")
+    mark_pareto(results)
+    return results
+
+def mark_pareto(results, keys=('mae', 'latency_us', 'size_mb')):
+    """Flag results no other result matches or beats on every key while beating on one"""
+    for result in results:
+        result['pareto'] = not any(
+            all(other[k] <= result[k] for k in keys) and any(other[k] < result[k] for k in keys)
+            for other in results if other is not result
+        )
+
+def choose(results, budget_us=None, max_size_mb=None, max_mae_increase=None):
+    """Result to publish, or None when nothing fits the budgets
+
+    With a latency budget, the most accurate variant that fits it; without
+    one, the fastest variant within the accuracy loss allowed.
+    """
+    original = results[0]
+    eligible = [
+        r for r in results
+        if (budget_us is None or r['latency_us'] <= budget_us)
+        and (max_size_mb is None or r['size_mb'] <= max_size_mb)
+        and (max_mae_increase is None or r['mae'] <= original['mae'] + max_mae_increase)
+    ]
+    if not eligible:
+        return None
+    if budget_us is not None:
+        return min(eligible, key=lambda r: (r['mae'], r['latency_us']))
+    return min(eligible, key=lambda r: (r['latency_us'], r['size_mb']))
+
+def print_table(results, chosen=None):
+    print(f"\n  {'variant':24s}{'trees':>6s}{'depth':>6s}{'nodes':>9s}{'MAE':>9s}{'R²':>8s}"
+          f"{'µs/row':>9s}{'npz MB':>9s}{'joblib MB':>11s}")
+    for r in sorted(results, key=lambda r: r['mae']):
+        mark = '✅' if r is chosen else ('* ' if r['pareto'] else '  ')
+        print(f"{mark}{r['name']:24s}{r['trees']:6d}{r['depth']:6d}{r['nodes']:9,d}{r['mae']:9.4f}{r['r2']:8.4f}"
+              f"{r['latency_us']:9.0f}{r['size_mb']:9.2f}{r['joblib_mb']:11.2f}")
+    print("\n  * Pareto-optimal on MAE / latency / size, ✅ chosen")
+
+def parse_depth(value):
+    return None if value in ('none', 'max') else int(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact a trained forest under a latency budget")
+    parser.add_argument('--bundle', help="bundle to compact (default: artifacts/LATEST)")
+    parser.add_argument('--artifacts-dir', default="artifacts")
+    parser.add_argument('--data', help="dataset path (default: the dataset recorded in the bundle manifest)")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--trees', default="10,25,50", help="tree counts to try")
+    parser.add_argument('--depths', default="6,8,12,none", help="max depths to try (none = unbounded)")
+    parser.add_argument('--leaf-sizes', default="1,5,20", help="min_samples_leaf values to try")
+    parser.add_argument('--distill', action='store_true', help="also distill into a single tree and gradient-boosted models")
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--budget-us', type=float, help="max single-row latency of the chosen variant")
+    parser.add_argument('--max-size-mb', type=float, help="max exported size of the chosen variant")
+    parser.add_argument('--max-mae-increase', type=float, default=0.002,
+                        help="max test MAE increase over the original")
+    parser.add_argument('--output', help="write the results table as JSON")
+    parser.add_argument('--publish', action='store_true', help="install the chosen variant as the served model")
+    args = parser.parse_args()
+
+    bundle_dir = args.bundle
+    if bundle_dir is None:
+        with open(os.path.join(args.artifacts_dir, 'LATEST')) as f:
+            bundle_dir = os.path.join(args.artifacts_dir, f.read().strip())
+    base_model, encoders, manifest = load_bundle(bundle_dir)
+    data_path = args.data or manifest['dataset']['path']
+
+    print(f"📂 Loading {data_path}...")
+    df = load_dataset(data_path, columns=FEATURE_COLUMNS + [TARGET_COLUMN])
+    X, y = df[FEATURE_COLUMNS], df[TARGET_COLUMN]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=args.random_state)
+
+    print(f"🔎 Compacting {manifest['version']} ({type(base_model).__name__})...")
+    results = search(
+        base_model, X_train, y_train, X_test, y_test,
+        trees=[int(v) for v in args.trees.split(',')],
+        depths=[parse_depth(v) for v in args.depths.split(',')],
+        leaf_sizes=[int(v) for v in args.leaf_sizes.split(',')],
+        distill=args.distill, n_jobs=args.n_jobs, random_state=args.random_state,
+    )
+    chosen = choose(results, args.budget_us, args.max_size_mb, args.max_mae_increase)
+    print_table(results, chosen)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump([{k: v for k, v in r.items() if k != 'model'} for r in results], f, indent=2)
+
+    if chosen is None:
+        print("❌ No variant meets the budget")
+        raise SystemExit(1)
+    original = results[0]
+    print(f"\n✅ Chosen {chosen['name']}: MAE {chosen['mae']:.4f} (original {original['mae']:.4f}), "
+          f"{chosen['latency_us']:.0f} µs/row (original {original['latency_us']:.0f}), "
+          f"{chosen['size_mb']:.2f} MB (original {original['size_mb']:.2f})")
+    if chosen is original:
+        return
+
+    model = chosen['model']
+    created_at = datetime.now(timezone.utc)
+    dataset_hash = file_sha256(data_path)
+    historical_baseline = compute_historical_baseline(df, len(encoders['country_encoder'].classes_))
+    compact_manifest = {
+        'version': bundle_version(created_at, dataset_hash),
+        'created_at': created_at.isoformat(),
+        'parent': manifest['version'],
+        'dataset': {'path': os.path.abspath(data_path), 'sha256': dataset_hash, 'rows': len(df)},
+        'features': FEATURE_COLUMNS,
+        'target': TARGET_COLUMN,
+        'params': {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        'n_trees': chosen['trees'],
+        'training_seconds': chosen['fit_seconds'],
+        'metrics': {'train': evaluate(model, X_train, y_train), 'test': evaluate(model, X_test, y_test)},
+        'compaction': {k: v for k, v in chosen.items() if k not in ('model', 'pareto')},
+        'historical_baseline': {c: round(float(v), 4)
+                                for c, v in zip(encoders['country_encoder'].classes_.tolist(), historical_baseline)},
+    }
+    bundle = write_bundle(args.artifacts_dir, model, encoders, historical_baseline, compact_manifest)
+    print(f"✅ Bundle written to {bundle}")
+    if args.publish:
+        publish_bundle(bundle)
+        print("✅ Published as aphid_risk_predictor.joblib / encoders.joblib / historical_baseline.npy and to model_store/")
+
+if __name__ == "__main__":
+    main()
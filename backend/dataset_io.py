@@ -0,0 +1,141 @@
+"""Columnar storage for the synthetic aphid dataset
+
+Feather (Arrow IPC, uncompressed) is the default: it is memory-mapped on
+load, so numeric columns are read straight from the page cache. Parquet is
+supported for compressed archival copies and CSV stays available as an
+export. String columns are dictionary encoded with fixed category lists, so
+the category codes equal the LabelEncoder codes used for training.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = {
+    'country': 'country_encoder',
+    'climate_zone': 'climate_encoder',
+    'crop_type': 'crop_encoder',
+}
+
+COLUMN_DTYPES = {
+    'latitude': np.float32,
+    'longitude': np.float32,
+    'month': np.int8,
+    'temperature': np.float32,
+    'humidity': np.float32,
+    'rainfall': np.float32,
+    'wind_speed': np.float32,
+    'crop_susceptibility': np.float32,
+    'historical_infestation': np.float32,
+    'aphid_risk': np.float32,
+    # Up to 32767 countries; int8 would wrap past 127
+    'country_encoded': np.int16,
+    'climate_encoded': np.int8,
+    'crop_encoded': np.int8,
+}
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Columnar datasets need pyarrow: pip install pyarrow")
+    return pyarrow
+
+def dataset_format(path):
+    """Infer the storage format from a file extension"""
+    path = str(path).lower()
+    if path.endswith(('.feather', '.arrow')):
+        return 'feather'
+    if path.endswith('.parquet'):
+        return 'parquet'
+    return 'csv'
+
+def to_compact(df, encoders):
+    """Convert a dataset chunk to categorical / float32 / small integer columns"""
+    df = df.copy()
+    for column, encoder_name in CATEGORICAL_COLUMNS.items():
+        if column in df:
+            categories = encoders[encoder_name].classes_.tolist()
+            df[column] = pd.Categorical(df[column], categories=categories)
+    for column, dtype in COLUMN_DTYPES.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date']).astype('datetime64[s]')
+    return df
+
+def write_dataset(chunks, path, encoders):
+    """Write an iterable of dataset chunks to CSV, Feather or Parquet; returns the row count"""
+    fmt = dataset_format(path)
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if fmt == 'csv':
+                chunk.to_csv(path, mode='w' if rows == 0 else 'a', header=rows == 0, index=False)
+            else:
+                pa = _require_pyarrow()
+                table = pa.Table.from_pandas(to_compact(chunk, encoders), preserve_index=False)
+                if writer is None:
+                    if fmt == 'feather':
+                        # Uncompressed so the file can be memory-mapped
+                        writer = pa.ipc.new_file(path, table.schema)
+                    else:
+                        writer = pa.parquet.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def load_dataset(path, columns=None):
+    """Load a dataset as a DataFrame; Feather files are memory-mapped"""
+    fmt = dataset_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    pa = _require_pyarrow()
+    if fmt == 'parquet':
+        table = pa.parquet.read_table(path, columns=columns)
+    else:
+        table = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    return table.to_pandas(split_blocks=True)
+
+def iter_dataset(path, chunk_size=1_000_000, columns=None):
+    """Yield a dataset as DataFrame chunks without loading it whole"""
+    fmt = dataset_format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+        return
+    pa = _require_pyarrow()
+    if fmt == 'parquet':
+        batches = pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(str(path), 'r'))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        if columns is not None:
+            batches = (batch.select(columns) for batch in batches)
+    for batch in batches:
+        yield batch.to_pandas()
+
+def count_parts(path):
+    """Number of independently readable parts (record batches / row groups) of a columnar file, None for CSV"""
+    fmt = dataset_format(path)
+    if fmt == 'csv':
+        return None
+    pa = _require_pyarrow()
+    if fmt == 'parquet':
+        return pa.parquet.ParquetFile(path).num_row_groups
+    return pa.ipc.open_file(pa.memory_map(str(path), 'r')).num_record_batches
+
+def read_part(path, index, columns=None):
+    """Read one record batch / row group of a columnar file, so separate processes can split a file"""
+    pa = _require_pyarrow()
+    if dataset_format(path) == 'parquet':
+        return pa.parquet.ParquetFile(path).read_row_group(index, columns=columns).to_pandas()
+    batch = pa.ipc.open_file(pa.memory_map(str(path), 'r')).get_batch(index)
+    if columns is not None:
+        batch = batch.select(columns)
+    return batch.to_pandas()
@@ -0,0 +1,147 @@
+"""Local stand-ins for Nominatim and OpenWeatherMap with configurable latency and errors
+
+Usage: python fake_upstreams.py [--port 8089] [--latency 0.05] [--jitter 0.02] [--error-rate 0.05]
+
+Point the backend at it with
+    AGRINOVA_NOMINATIM_URL=http://127.0.0.1:8089
+    AGRINOVA_OPENWEATHER_URL=http://127.0.0.1:8089/data/2.5
+
+Serves /search, /weather and /forecast. Answers are deterministic: a
+name geocodes to a point derived from its hash and weather is a function
+of the coordinates. Names starting with
+"Nowhere" are not found. A seeded fraction of requests fails with HTTP 503.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == '/__stats':
+            # Upstream call counts, read by bench_load.py
+            return self._send(200, dict(server.requests), count=False)
+        delay, fail = server.next_outcome()
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            self._send(503, {'error': 'injected failure'})
+        elif url.path.endswith('/search'):
+            self._send(200, fake_geocode(query.get('q', '')))
+        elif url.path.endswith('/weather'):
+            self._send(200, fake_weather(float(query.get('lat', 0)), float(query.get('lon', 0))))
+        elif url.path.endswith('/forecast'):
+            self._send(200, fake_forecast(float(query.get('lat', 0)), float(query.get('lon', 0))))
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def _send(self, status, payload, count=True):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if count:
+            endpoint = urlsplit(self.path).path.rsplit('/', 1)[-1]
+            with self.server.lock:
+                self.server.requests[endpoint] = self.server.requests.get(endpoint, 0) + 1
+
+    def log_message(self, *args):
+        pass
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.05, jitter=0.0, error_rate=0.0, seed=0):
+        super().__init__(address, FakeUpstreamHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {'search': 0, 'weather': 0}
+
+    def next_outcome(self):
+        """Draw (delay, fail) for one request from the seeded generator"""
+        with self.lock:
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            return delay, self.rng.random() < self.error_rate
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def fake_geocode(name):
+    """Nominatim /search response for a place name"""
+    if name.startswith('Nowhere'):
+        return []
+    digest = hashlib.sha256(name.encode()).digest()
+    lat = digest[0] / 255 * 120 - 55
+    lon = digest[1] / 255 * 340 - 170
+    return [{'lat': str(lat), 'lon': str(lon), 'display_name': name}]
+
+def fake_weather(lat, lon):
+    """OpenWeatherMap current-weather response for a coordinate"""
+    temperature = round(30 - abs(lat) * 0.45 + (lon % 7), 1)
+    humidity = int(40 + (abs(lon) * 3) % 50)
+    payload = {
+        'main': {'temp': temperature, 'humidity': humidity},
+        'wind': {'speed': round(2 + abs(lat + lon) % 12, 1)},
+        'weather': [{'description': 'scattered clouds'}],
+    }
+    if humidity > 70:
+        payload['rain'] = {'1h': round((humidity - 70) / 4, 1)}
+    return payload
+
+def fake_forecast(lat, lon, steps=40):
+    """OpenWeatherMap 5 day / 3 hour forecast response: the current weather with a daily cycle"""
+    now = int(time.time()) // 10800 * 10800
+    current = fake_weather(lat, lon)
+    entries = []
+    for i in range(steps):
+        hour = (now // 3600 + 3 * i) % 24
+        cycle = (12 - abs(hour - 14)) / 12
+        entry = {
+            'dt': now + 10800 * (i + 1),
+            'main': {'temp': round(current['main']['temp'] - 4 + 8 * cycle, 1),
+                     'humidity': int(min(100, current['main']['humidity'] + 15 - 30 * cycle))},
+            'wind': current['wind'],
+            'weather': current['weather'],
+        }
+        if entry['main']['humidity'] > 70:
+            entry['rain'] = {'3h': round((entry['main']['humidity'] - 70) / 3, 1)}
+        entries.append(entry)
+    return {'cnt': steps, 'list': entries, 'city': {'timezone': int(lon / 15) * 3600}}
+
+def start_fake_upstreams(port=0, latency=0.05, jitter=0.0, error_rate=0.0, seed=0):
+    """Serve the fake upstreams on a daemon thread; returns the server (use .base_url, .shutdown())"""
+    server = FakeUpstreamServer(('127.0.0.1', port), latency, jitter, error_rate, seed)
+    threading.Thread(target=server.serve_forever, name='fake-upstreams', daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Nominatim/OpenWeatherMap server for load tests")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.05, help="mean response delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="uniform +/- delay spread in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeUpstreamServer(('127.0.0.1', args.port), args.latency, args.jitter, args.error_rate, args.seed)
+    print(f"🌐 Fake upstreams on {server.base_url} (latency {args.latency}s, error rate {args.error_rate})")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
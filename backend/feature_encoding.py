@@ -0,0 +1,103 @@
+from functools import lru_cache
+import numpy as np
+
+# Unknown-country coordinates are bucketed to 0.01° (~1 km) for nearest-neighbour reuse
+NEAREST_PRECISION = 2
+MAX_NEAREST_ENTRIES = 65536
+
+class FeatureEncoder:
+    """Model feature encoding built once from the fitted LabelEncoders
+
+    Replaces per-call ``LabelEncoder.transform`` with dict lookups.
+    ``historical_baseline`` is an array indexed by encoded country. The
+    static part of a feature row (everything except weather) is cached per
+    (country, crop, month), and nearest-country resolution for unknown
+    countries is memoized per coordinate bucket.
+    """
+
+    def __init__(self, encoders, country_climates, historical_baseline, find_nearest, k=5, baseline_version=None):
+        self.encoders = encoders
+        self.country_climates = country_climates
+        self.historical_baseline = historical_baseline
+        # Model store version the baseline was published with, None for the serving-directory file
+        self.baseline_version = baseline_version
+        self.find_nearest = find_nearest
+        self.k = k
+        self.country_codes = _codes(encoders['country_encoder'])
+        self.climate_codes = _codes(encoders['climate_encoder'])
+        self.crop_codes = _codes(encoders['crop_encoder'])
+        self._nearest = {}
+        self.static_features = lru_cache(maxsize=4096)(self._static_features)
+
+    def resolve_country(self, country, lat, lon):
+        """Return (encoded country, climate, historical infestation) for a country"""
+        if country in self.country_codes:
+            climate = self.country_climates.get(country)
+            if climate is None:
+                raise ValueError(f"No climate data found for country: {country}")
+            code = self.country_codes[country]
+            return code, climate, float(self.historical_baseline[code])
+
+        key = (round(float(lat), NEAREST_PRECISION), round(float(lon), NEAREST_PRECISION))
+        resolved = self._nearest.get(key)
+        if resolved is None:
+            if len(self._nearest) >= MAX_NEAREST_ENTRIES:
+                self._nearest.clear()
+            resolved = self._nearest[key] = self._resolve_nearest(country, *key)
+        return resolved
+
+    def encode(self, country, lat, lon, crop_type, weather_data, month):
+        """Build the encoded model feature row as a dict"""
+        if country in self.country_codes:
+            # Known countries do not depend on coordinates; keep one cache entry
+            lat = lon = None
+        else:
+            lat, lon = round(float(lat), NEAREST_PRECISION), round(float(lon), NEAREST_PRECISION)
+        static = self.static_features(country, lat, lon, crop_type, month)
+        row = {
+            'temperature': weather_data['temperature'],
+            'humidity': weather_data['humidity'],
+            'rainfall': weather_data['rainfall'],
+            'wind_speed': weather_data['wind_speed'],
+        }
+        row.update(static)
+        return row
+
+    def _static_features(self, country, lat, lon, crop_type, month):
+        if crop_type not in self.crop_codes:
+            raise ValueError(f"Unknown crop type: {crop_type}")
+        country_encoded, climate, historical_avg = self.resolve_country(country, lat, lon)
+        if climate not in self.climate_codes:
+            raise ValueError(f"Unknown climate zone: {climate}")
+        return {
+            'month': month,
+            'historical_infestation': historical_avg,
+            'country_encoded': country_encoded,
+            'climate_encoded': self.climate_codes[climate],
+            'crop_encoded': self.crop_codes[crop_type],
+        }
+
+    def _resolve_nearest(self, country, lat, lon):
+        print(f"⚠️  Country '{country}' not in training data. Using nearest neighbors...")
+        nearest_countries = self.find_nearest(lat, lon, k=self.k)
+        if not nearest_countries:
+            raise ValueError(f"No nearest countries found for coordinates: {lat}, {lon}")
+
+        nearest_names = [name for name, dist, lat, lon in nearest_countries]
+        print(f"   Nearest countries: {nearest_names}")
+
+        # Average historical infestation from nearest countries
+        nearest_codes = [self.country_codes[c] for c in nearest_names if c in self.country_codes]
+        historical_avg = float(np.mean(self.historical_baseline[nearest_codes]))
+
+        # Use climate from the closest country
+        closest_country = nearest_names[0]
+        climate = self.country_climates.get(closest_country)
+        if climate is None:
+            raise ValueError(f"No climate data found for nearest country: {closest_country}")
+        if closest_country not in self.country_codes:
+            raise ValueError(f"Nearest country not in training data: {closest_country}")
+        return self.country_codes[closest_country], climate, historical_avg
+
+def _codes(label_encoder):
+    return {label: code for code, label in enumerate(label_encoder.classes_.tolist())}
@@ -0,0 +1,124 @@
+import sys
+import numpy as np
+
+def _tree_terms(model):
+    """(tree, scale, offset) per tree, such that the model predicts the mean of scale * leaf value + offset"""
+    if hasattr(model, 'tree_'):
+        # A single decision tree
+        return [(model.tree_, 1.0, 0.0)]
+    if hasattr(model, 'learning_rate'):
+        # Gradient boosting: init + learning_rate * sum of tree outputs, spread evenly over the trees
+        trees = [estimator.tree_ for estimator in model.estimators_[:, 0]]
+        init = float(model.init_.predict(np.zeros((1, model.n_features_in_)))[0])
+        return [(tree, model.learning_rate * len(trees), init) for tree in trees]
+    return [(estimator.tree_, 1.0, 0.0) for estimator in model.estimators_]
+
+def export_forest(model, feature_names=None):
+    """Flatten a fitted RandomForestRegressor into contiguous node arrays
+
+    All trees are concatenated into one node table. Leaves point to
+    themselves so every tree can be walked for the same number of steps.
+    A single DecisionTreeRegressor or a squared-error
+    GradientBoostingRegressor is exported the same way, with leaf values
+    rescaled so that averaging over the trees reproduces its prediction.
+    """
+    if feature_names is None:
+        feature_names = list(getattr(model, 'feature_names_in_', range(model.n_features_in_)))
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree, scale, shift in _tree_terms(model):
+        node_ids = np.arange(tree.node_count, dtype=np.int32)
+        is_leaf = tree.children_left == -1
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left).astype(np.int32) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right).astype(np.int32) + offset)
+        values.append(tree.value[:, 0, 0].astype(np.float64) * scale + shift)
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    left = np.concatenate(lefts)
+    right = np.concatenate(rights)
+    return {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': left,
+        'right': right,
+        # Interleaved (left, right) children so one gather picks the branch
+        'children': np.stack([left, right], axis=1).ravel(),
+        'value': np.concatenate(values),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': np.int32(max_depth),
+        'feature_names': np.asarray([str(name) for name in feature_names]),
+    }
+
+class CompactForest:
+    """Array-backed forest predictor that takes raw feature vectors or matrices
+
+    Built for the per-request case: a single row skips sklearn's input
+    validation and DataFrame handling entirely. For matrices of many
+    thousands of rows sklearn's compiled traversal is still faster.
+    """
+
+    # Rows walked together; bounds the (rows x trees) node index buffers
+    block_size = 4096
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.feature_names = [str(name) for name in arrays['feature_names']]
+        self.n_estimators = len(self.roots)
+        if 'children' in arrays:
+            self.children = arrays['children']
+        else:
+            self.children = np.stack([arrays['left'], arrays['right']], axis=1).ravel()
+
+    def predict(self, X):
+        """Predict for a feature vector, a 2-D array or a DataFrame"""
+        if hasattr(X, 'columns'):
+            X = X[self.feature_names].to_numpy()
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+        if X.shape[0] <= self.block_size:
+            return self._predict_block(X)
+        return np.concatenate([
+            self._predict_block(X[start:start + self.block_size])
+            for start in range(0, X.shape[0], self.block_size)
+        ])
+
+    def _predict_block(self, X):
+        flat = np.ascontiguousarray(X).ravel()
+        row_offsets = (np.arange(X.shape[0], dtype=np.int64) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_estimators))
+        for step in range(self.max_depth):
+            go_right = flat[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            next_nodes = self.children[2 * nodes + go_right]
+            # Every walk has reached a leaf once the node table stops changing
+            if step % 4 == 3 and np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return self.value[nodes].mean(axis=1)
+
+def save_compact_forest(arrays, path):
+    """Save exported forest arrays to an uncompressed .npz file"""
+    np.savez(path, **arrays)
+
+def load_compact_forest(path):
+    """Load a CompactForest from a .npz file written by save_compact_forest"""
+    with np.load(path) as data:
+        return CompactForest({name: data[name] for name in data.files})
+
+if __name__ == "__main__":
+    import joblib
+
+    source = sys.argv[1] if len(sys.argv) > 1 else 'aphid_risk_predictor.joblib'
+    target = sys.argv[2] if len(sys.argv) > 2 else 'aphid_risk_predictor.npz'
+    arrays = export_forest(joblib.load(source))
+    save_compact_forest(arrays, target)
+    print(f"✅ Exported {len(arrays['roots'])} trees / {len(arrays['feature'])} nodes to {target}")
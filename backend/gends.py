@@ -1,11 +1,11 @@
 import pandas as pd
 import numpy as np
 import random
-from datetime import datetime, timedelta
+import argparse
 from sklearn.preprocessing import LabelEncoder
 import joblib
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
+from dataset_io import write_dataset
+from risk_scoring import analytic_risk
 
 # List of ~50 countries with approximate centroids (lat, lon)
 countries_coords = {
@@ -118,122 +118,171 @@ def calculate_aphid_risk(temp, humidity, rainfall, wind, month, crop_susceptibil
     final_risk += random.uniform(-0.05, 0.05)
     return max(0, min(1, final_risk))
 
-# Generate 10000 records
-records = []
-start_date = datetime(2020, 1, 1)
+# Per-climate weather draws, identical in distribution to generate_weather
+def generate_weather_arrays(rng, climates, months):
+    n = len(climates)
+    temp = np.empty(n)
+    humidity = np.empty(n)
+    rainfall = np.empty(n)
+    wind = np.empty(n)
+    
+    def draw(mask, temp_range, humidity_range, rainfall_range, wind_range):
+        count = int(mask.sum())
+        temp[mask] = rng.uniform(*temp_range, count)
+        humidity[mask] = rng.uniform(*humidity_range, count)
+        rainfall[mask] = rng.uniform(*rainfall_range, count)
+        wind[mask] = rng.uniform(*wind_range, count)
+    
+    mask = climates == "tropical"
+    wet = np.isin(months, [5, 6, 7, 8, 9])
+    draw(mask, (20, 35), (60, 95), (np.where(wet[mask], 5, 0), np.where(wet[mask], 300, 100)), (0, 15))
+    
+    mask = climates == "temperate"
+    seasonal_temp = 15 + 10 * np.sin(2 * np.pi * (months[mask] - 3) / 12)
+    draw(mask, (seasonal_temp - 8, seasonal_temp + 8), (40, 85), (0, 150), (0, 20))
+    
+    mask = climates == "continental"
+    seasonal_temp = 10 + 15 * np.sin(2 * np.pi * (months[mask] - 3) / 12)
+    draw(mask, (seasonal_temp - 12, seasonal_temp + 12), (30, 75), (0, 100), (0, 25))
+    
+    draw(climates == "arid", (15, 45), (10, 50), (0, 30), (0, 30))
+    
+    # highland is the catch-all branch of generate_weather
+    mask = ~np.isin(climates, ["tropical", "temperate", "continental", "arid"])
+    draw(mask, (5, 25), (50, 90), (0, 200), (0, 15))
+    
+    return temp.round(1), humidity.round(1), rainfall.round(1), wind.round(1)
+
+# Vectorized calculate_aphid_risk over whole columns, see risk_scoring.py
+def calculate_aphid_risk_array(rng, temp, humidity, rainfall, wind, month, crop_susceptibility, historical_infestation):
+    return analytic_risk(temp, humidity, rainfall, wind, month, crop_susceptibility, historical_infestation, rng=rng)
 
 # Create historical infestation baseline per country
-historical_baseline = {}
-for country in countries_coords.keys():
-    climate = country_climates.get(country, "temperate")
-    # Higher baseline for tropical regions
-    if climate == "tropical":
-        historical_baseline[country] = random.uniform(0.4, 0.8)
-    elif climate == "arid":
-        historical_baseline[country] = random.uniform(0.1, 0.4)
-    else:
-        historical_baseline[country] = random.uniform(0.2, 0.6)
+def make_historical_baseline(rng):
+    historical_baseline = {}
+    for country in countries_coords.keys():
+        climate = country_climates.get(country, "temperate")
+        # Higher baseline for tropical regions
+        if climate == "tropical":
+            historical_baseline[country] = rng.uniform(0.4, 0.8)
+        elif climate == "arid":
+            historical_baseline[country] = rng.uniform(0.1, 0.4)
+        else:
+            historical_baseline[country] = rng.uniform(0.2, 0.6)
+    return historical_baseline
+
+# Label encoders fitted on the full category lists (LabelEncoder sorts classes)
+def build_encoders():
+    return {
+        'country_encoder': LabelEncoder().fit(list(countries_coords.keys())),
+        'climate_encoder': LabelEncoder().fit([country_climates.get(c, "temperate") for c in countries_coords]),
+        'crop_encoder': LabelEncoder().fit(list(crops_susceptibility.keys()))
+    }
 
-for _ in range(10000):
-    country, (lat, lon) = random.choice(list(countries_coords.items()))
-    climate = country_climates.get(country, "temperate")
+START_DATE = np.datetime64('2020-01-01')
+
+def generate_chunk(rng, n_rows, historical_baseline, encoders):
+    """Generate one chunk of synthetic records as a DataFrame"""
+    countries = np.array(list(countries_coords.keys()))
+    country_lats = np.array([countries_coords[c][0] for c in countries])
+    country_lons = np.array([countries_coords[c][1] for c in countries])
+    country_climate = np.array([country_climates.get(c, "temperate") for c in countries])
+    baseline = np.array([historical_baseline[c] for c in countries])
+    crops = np.array(list(crops_susceptibility.keys()))
+    susceptibility = np.array([crops_susceptibility[c] for c in crops])
+    
+    country_idx = rng.integers(0, len(countries), n_rows)
+    climates = country_climate[country_idx]
     
     # Add some random "jitter" to lat/lon
-    lat += random.uniform(-2.0, 2.0)
-    lon += random.uniform(-2.0, 2.0)
+    lat = country_lats[country_idx] + rng.uniform(-2.0, 2.0, n_rows)
+    lon = country_lons[country_idx] + rng.uniform(-2.0, 2.0, n_rows)
     
     # Random date within 4 years
-    date = start_date + timedelta(days=random.randint(0, 1460))
-    month = date.month
+    dates = START_DATE + rng.integers(0, 1461, n_rows).astype('timedelta64[D]')
+    months = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
     
-    # Generate weather based on climate and month
-    temp, humidity, rainfall, wind = generate_weather(climate, month)
+    temp, humidity, rainfall, wind = generate_weather_arrays(rng, climates, months)
     
-    # Random crop
-    crop = random.choice(list(crops_susceptibility.keys()))
-    crop_susceptibility = crops_susceptibility[crop]
+    crop_idx = rng.integers(0, len(crops), n_rows)
+    crop_susceptibility = susceptibility[crop_idx]
     
     # Historical infestation with some yearly variation
-    year_variation = random.uniform(-0.2, 0.2)
-    historical_infestation = max(0, min(1, historical_baseline[country] + year_variation))
-    
-    # Calculate aphid risk
-    aphid_risk = calculate_aphid_risk(temp, humidity, rainfall, wind, month, crop_susceptibility, historical_infestation)
-    
-    records.append({
-        "country": country,
-        "climate_zone": climate,
-        "latitude": round(lat, 4),
-        "longitude": round(lon, 4),
-        "date": date.strftime("%Y-%m-%d"),
-        "month": month,
+    historical_infestation = np.clip(baseline[country_idx] + rng.uniform(-0.2, 0.2, n_rows), 0, 1)
+    
+    aphid_risk = calculate_aphid_risk_array(
+        rng, temp, humidity, rainfall, wind, months, crop_susceptibility, historical_infestation
+    )
+    
+    return pd.DataFrame({
+        "country": countries[country_idx],
+        "climate_zone": climates,
+        "latitude": lat.round(4),
+        "longitude": lon.round(4),
+        "date": np.datetime_as_string(dates, unit='D'),
+        "month": months,
         "temperature": temp,
         "humidity": humidity,
         "rainfall": rainfall,
         "wind_speed": wind,
-        "crop_type": crop,
+        "crop_type": crops[crop_idx],
         "crop_susceptibility": crop_susceptibility,
-        "historical_infestation": round(historical_infestation, 3),
-        "aphid_risk": round(aphid_risk, 3)
+        "historical_infestation": historical_infestation.round(3),
+        "aphid_risk": aphid_risk.round(3),
+        "country_encoded": encoders['country_encoder'].transform(countries)[country_idx],
+        "climate_encoded": encoders['climate_encoder'].transform(country_climate)[country_idx],
+        "crop_encoded": encoders['crop_encoder'].transform(crops)[crop_idx]
     })
 
-# Convert to DataFrame
-df = pd.DataFrame(records)
-
-# Encode categorical variables
-le_country = LabelEncoder()
-le_climate = LabelEncoder()
-le_crop = LabelEncoder()
+def generate_dataset(n_rows=10000, seed=42, chunk_size=1_000_000, encoders=None):
+    """Yield the synthetic dataset as DataFrame chunks of at most chunk_size rows"""
+    rng = np.random.default_rng(seed)
+    if encoders is None:
+        encoders = build_encoders()
+    historical_baseline = make_historical_baseline(rng)
+    for start in range(0, n_rows, chunk_size):
+        yield generate_chunk(rng, min(chunk_size, n_rows - start), historical_baseline, encoders)
 
-df['country_encoded'] = le_country.fit_transform(df['country'])
-df['climate_encoded'] = le_climate.fit_transform(df['climate_zone'])
-df['crop_encoded'] = le_crop.fit_transform(df['crop_type'])
+def export_csv(chunks, path):
+    """Pass chunks through while also appending them to a CSV export"""
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        yield chunk
 
-# Save encoders for prediction
-encoders = {
-    'country_encoder': le_country,
-    'climate_encoder': le_climate,
-    'crop_encoder': le_crop
-}
-joblib.dump(encoders, 'encoders.joblib')
-
-# Train Random Forest model
-def train_aphid_model(df):
-    feature_columns = [
-        'temperature', 'humidity', 'rainfall', 'wind_speed', 'month',
-        'historical_infestation', 'country_encoded', 'climate_encoded', 'crop_encoded'
-    ]
+def main():
+    parser = argparse.ArgumentParser(description="Generate the synthetic aphid dataset")
+    parser.add_argument('--rows', type=int, default=10000, help="number of records to generate")
+    parser.add_argument('--seed', type=int, default=42, help="random seed")
+    parser.add_argument('--chunk-size', type=int, default=1_000_000, help="records generated and written per chunk")
+    parser.add_argument('--output', default="synthetic_aphid_dataset_with_risk1.feather",
+                        help="output path; .feather/.arrow, .parquet or .csv")
+    parser.add_argument('--csv', help="optional additional CSV export path")
+    args = parser.parse_args()
+    if args.rows < 1 or args.chunk_size < 1:
+        parser.error("--rows and --chunk-size must be at least 1")
     
-    X = df[feature_columns]
-    y = df['aphid_risk']
+    # Save encoders for prediction
+    encoders = build_encoders()
+    joblib.dump(encoders, 'encoders.joblib')
     
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    chunks = generate_dataset(args.rows, args.seed, args.chunk_size, encoders)
+    if args.csv:
+        chunks = export_csv(chunks, args.csv)
+    preview = []
     
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
+    def keep_preview(chunks):
+        for chunk in chunks:
+            if not preview:
+                preview.append(chunk.head(10))
+            yield chunk
     
-    train_score = model.score(X_train, y_train)
-    test_score = model.score(X_test, y_test)
-    print(f"Model R² score - Train: {train_score:.4f}, Test: {test_score:.4f}")
+    write_dataset(keep_preview(chunks), args.output, encoders)
+    print("✅ Synthetic dataset created with", args.rows, "records")
+    print("✅ Encoders saved")
+    print("\nDataset preview:")
+    print(preview[0][['country', 'climate_zone', 'month', 'temperature', 'humidity', 'historical_infestation', 'aphid_risk']])
     
-    joblib.dump(model, 'aphid_risk_predictor.joblib')
-    return model
-
-# Train and save model
-print("Training model...")
-model = train_aphid_model(df)
-
-# Save dataset
-df.to_csv("synthetic_aphid_dataset_with_risk1.csv", index=False)
+    print(f"\nTrain a model on it with: python train.py --data {args.output}")
 
-print("✅ Synthetic dataset created with", len(df), "records")
-print("✅ Model trained and saved")
-print("✅ Encoders saved")
-print("\nDataset preview:")
-print(df[['country', 'climate_zone', 'month', 'temperature', 'humidity', 'historical_infestation', 'aphid_risk']].head(10))
-print(f"\nAphid risk statistics:")
-print(f"Mean: {df['aphid_risk'].mean():.3f}")
-print(f"Min: {df['aphid_risk'].min():.3f}")
-print(f"Max: {df['aphid_risk'].max():.3f}")
-# Add this right after loading the model
-print("Model feature names:", model.feature_names_in_)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Resolved names are kept for 30 days, unknown names for 1 hour
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_NEGATIVE_TTL = 3600
+
+def normalize_name(name):
+    """Normalize a place name into a cache key"""
+    return " ".join(name.split()).casefold()
+
+class GeocodeCache:
+    """Two-level geocoding cache: in-process LRU over a persistent SQLite store
+
+    Entries seeded from a built-in table (e.g. ``countries_coords``) never
+    expire and are not written to disk. A cached value of ``None`` records a
+    name the geocoder could not resolve (negative caching).
+    """
+
+    def __init__(self, path=None, seed=None, max_entries=1024,
+                 ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._seed = {}
+        for name, (lat, lon) in (seed or {}).items():
+            self._seed[normalize_name(name)] = (float(lat), float(lon))
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "name TEXT PRIMARY KEY, lat REAL, lon REAL, expires_at REAL)"
+            )
+            self._db.commit()
+
+    def get(self, name):
+        """Return (found, coords); coords is None for a negatively cached name"""
+        key = normalize_name(name)
+        if key in self._seed:
+            self.hits += 1
+            return True, self._seed[key]
+
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                coords, expires_at = entry
+                if expires_at > now:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    return True, coords
+                del self._lru[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT lat, lon, expires_at FROM geocode WHERE name = ?", (key,)
+                ).fetchone()
+                if row is not None and row[2] > now:
+                    coords = None if row[0] is None else (row[0], row[1])
+                    self._remember(key, coords, row[2])
+                    self.hits += 1
+                    return True, coords
+
+            self.misses += 1
+            return False, None
+
+    def set(self, name, coords):
+        """Store a geocoding result; pass None to cache an unknown name"""
+        key = normalize_name(name)
+        ttl = self.ttl if coords is not None else self.negative_ttl
+        expires_at = time.time() + ttl
+        if coords is not None:
+            coords = (float(coords[0]), float(coords[1]))
+
+        with self._lock:
+            self._remember(key, coords, expires_at)
+            if self._db is not None:
+                lat, lon = coords if coords is not None else (None, None)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO geocode (name, lat, lon, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, lat, lon, expires_at),
+                )
+                self._db.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current LRU size"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._lru)}
+
+    def _remember(self, key, coords, expires_at):
+        self._lru[key] = (coords, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
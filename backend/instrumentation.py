@@ -0,0 +1,158 @@
+"""Lightweight per-stage timers, counters and Prometheus text exposition
+
+Stage latencies go into fixed log-spaced histograms (bucket lookup is one
+bisect), so recording a timing costs well under a few microseconds.
+Percentiles are read back from the buckets. When a request collector is
+active (see ``start_request``) each stage timing is also kept for that
+request so it can be returned in a ``Server-Timing`` header.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# 1 µs .. ~11 s, each bucket 1.5x the previous one
+BUCKET_BOUNDS = [1e-6 * 1.5 ** i for i in range(41)]
+QUANTILES = (0.5, 0.95, 0.99)
+# Add a Server-Timing header with the stage breakdown to every API response
+SERVER_TIMING = os.environ.get('AGRINOVA_SERVER_TIMING', '0') == '1'
+
+_request_timings = ContextVar('request_timings', default=None)
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(BUCKET_BOUNDS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q):
+        """Estimate the q-th quantile by interpolating inside its bucket (None when empty)"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= target:
+                if index == len(BUCKET_BOUNDS):
+                    return BUCKET_BOUNDS[-1]
+                lower = BUCKET_BOUNDS[index - 1] if index else 0.0
+                return lower + (BUCKET_BOUNDS[index] - lower) * (target - cumulative) / count
+            cumulative += count
+        return BUCKET_BOUNDS[-1]
+
+class _Stage:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    """Registry of stage histograms and counters"""
+
+    def __init__(self, prefix='agrinova'):
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.gauge_sources = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        """Context manager timing one pipeline stage"""
+        return _Stage(self, name)
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.observe(seconds)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, seconds))
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def register_gauges(self, name, source):
+        """Expose the numeric values of source() (e.g. cache.stats) at scrape time"""
+        self.gauge_sources[name] = source
+
+    def snapshot(self):
+        """Stage percentiles (ms), counters and gauges as a dict"""
+        stages = {}
+        for name, histogram in sorted(self.histograms.items()):
+            stages[name] = {'count': histogram.count, 'mean_ms': histogram.sum / histogram.count * 1000 if histogram.count else None}
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                stages[name][f'p{int(q * 100)}_ms'] = value * 1000 if value is not None else None
+        gauges = {name: source() for name, source in self.gauge_sources.items()}
+        return {'stages': stages, 'counters': dict(self.counters), 'gauges': gauges}
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        p = self.prefix
+        lines = [
+            f'# HELP {p}_stage_seconds Latency of each request pipeline stage',
+            f'# TYPE {p}_stage_seconds histogram',
+        ]
+        for name, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKET_BOUNDS, histogram.counts):
+                cumulative += count
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{p}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {histogram.sum:.9f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+        lines.append(f'# HELP {p}_stage_seconds_quantile Latency percentiles interpolated from the histogram buckets')
+        lines.append(f'# TYPE {p}_stage_seconds_quantile gauge')
+        for name, histogram in sorted(self.histograms.items()):
+            for q in QUANTILES:
+                value = histogram.quantile(q)
+                if value is not None:
+                    lines.append(f'{p}_stage_seconds_quantile{{stage="{name}",quantile="{q}"}} {value:.9f}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'# TYPE {p}_{name}_total counter')
+            lines.append(f'{p}_{name}_total {value}')
+        for name, source in sorted(self.gauge_sources.items()):
+            for key, value in sorted(source().items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'{p}_{name}_{key} {value}')
+        return '\n'.join(lines) + '\n'
+
+def start_request():
+    """Start collecting stage timings for the current request; returns a reset token"""
+    return _request_timings.set([])
+
+def finish_request(token):
+    """Stop collecting and return the request's Server-Timing header value
+
+    Repeated stages (e.g. one encode per batch item) are summed.
+    """
+    totals = {}
+    for name, seconds in _request_timings.get() or []:
+        totals[name] = totals.get(name, 0.0) + seconds
+    _request_timings.reset(token)
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in totals.items())
+
+metrics = Metrics()
@@ -0,0 +1,176 @@
+"""Specialist models per crop and/or climate zone, routed to per feature row
+
+Layout (written by train_specialists.py):
+    specialists/
+        index.json              version, class lists, one entry per specialist
+        <version>/<key>.npz     exported forest arrays, see forest_export.py
+
+A row is scored by the most specific specialist available: (crop, climate),
+then crop only, then climate only, then the global model. Specialists load
+on first use and are kept in an LRU bounded by array memory. Replacing
+index.json (atomically) swaps the whole set on the next lookup.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from forest_export import load_compact_forest
+
+class ModelRegistry:
+    """Lazily loaded specialist CompactForests with a memory-bounded LRU"""
+
+    def __init__(self, registry_dir, max_bytes=256 * 2 ** 20, check_interval=1.0):
+        self.registry_dir = registry_dir
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.version = None
+        self.entries = {}
+        self.crop_classes = []
+        self.climate_classes = []
+        self.features = []
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self._models = OrderedDict()
+        self._bytes = 0
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._wrapped = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.registry_dir, 'index.json')
+
+    def exists(self):
+        """True when specialists have been published to this directory"""
+        return os.path.exists(self.index_path)
+
+    def refresh(self):
+        """Reload index.json when it changed, dropping every loaded specialist"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.index_path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            index = {'version': None, 'models': [], 'crop_classes': [], 'climate_classes': [], 'features': []}
+            if mtime is not None:
+                with open(self.index_path) as f:
+                    index = json.load(f)
+            self.entries = {(entry['crop'], entry['climate']): entry for entry in index['models']}
+            self.crop_classes = index['crop_classes']
+            self.climate_classes = index['climate_classes']
+            self.features = index['features']
+            self.version = index['version']
+            self._models.clear()
+            self._bytes = 0
+            self._mtime = mtime
+
+    def get(self, crop, climate):
+        """Load (or reuse) the most specific specialist for a crop and climate, None for the global model
+
+        Lookup and load happen under one lock, so an index reload in between
+        cannot leave a key without its entry.
+        """
+        with self._lock:
+            for key in ((crop, climate), (crop, None), (None, climate)):
+                entry = self.entries.get(key)
+                if entry is not None:
+                    break
+            else:
+                return None
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            model = load_compact_forest(os.path.join(self.registry_dir, entry['file']))
+            size = _model_bytes(model)
+            self._models[key] = model
+            self._bytes += size
+            self.loads += 1
+            # The model just loaded is never evicted, even when it alone exceeds the budget
+            while self._bytes > self.max_bytes and len(self._models) > 1:
+                _, evicted = self._models.popitem(last=False)
+                self._bytes -= _model_bytes(evicted)
+                self.evictions += 1
+            return model
+
+    def wrap(self, base_model, predict):
+        """Model routing rows to specialists and the rest to base_model (scored with predict)
+
+        The same wrapper is returned while the base model and the specialist
+        set are unchanged, so callers can key caches on its identity.
+        """
+        self.refresh()
+        if not self.entries:
+            return base_model
+        wrapped = self._wrapped
+        if wrapped is None or wrapped.base is not base_model or wrapped.version != self.version:
+            wrapped = self._wrapped = RoutedModel(self, base_model, predict, self.version)
+        return wrapped
+
+    def stats(self):
+        """Return specialist counts, LRU memory use and load/hit/eviction counters"""
+        return {
+            'version': self.version,
+            'specialists': len(self.entries),
+            'loaded': len(self._models),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'loads': self.loads,
+            'hits': self.hits,
+            'evictions': self.evictions,
+        }
+
+class RoutedModel:
+    """Model stand-in that scores each feature row with its specialist, falling back to the base model"""
+
+    def __init__(self, registry, base, predict, version):
+        self.registry = registry
+        self.base = base
+        self.predict_base = predict
+        self.version = version
+        self.crop_column = registry.features.index('crop_encoded')
+        self.climate_column = registry.features.index('climate_encoded')
+
+    def predict(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        registry = self.registry
+        if len(X) == 1:
+            specialist = registry.get(_class_name(registry.crop_classes, int(X[0, self.crop_column])),
+                                      _class_name(registry.climate_classes, int(X[0, self.climate_column])))
+            return self.predict_base(self.base, X) if specialist is None else specialist.predict(X)
+        crop_codes = X[:, self.crop_column].astype(np.intp)
+        climate_codes = X[:, self.climate_column].astype(np.intp)
+        pairs, group_ids = np.unique(np.column_stack([crop_codes, climate_codes]), axis=0, return_inverse=True)
+        group_ids = group_ids.ravel()
+        # Rows sharing a specialist (or the base model, None) are scored in one call
+        routes = {}
+        for i, (crop, climate) in enumerate(pairs.tolist()):
+            specialist = registry.get(_class_name(registry.crop_classes, crop), _class_name(registry.climate_classes, climate))
+            routes.setdefault(id(specialist), (specialist, []))[1].append(i)
+        if list(routes) == [id(None)]:
+            return np.asarray(self.predict_base(self.base, X), dtype=np.float64)
+        predictions = np.empty(len(X))
+        for specialist, groups in routes.values():
+            rows = np.flatnonzero(np.isin(group_ids, groups))
+            if specialist is None:
+                predictions[rows] = self.predict_base(self.base, X[rows])
+            else:
+                predictions[rows] = specialist.predict(X[rows])
+        return predictions
+
+def _class_name(classes, code):
+    return classes[code] if 0 <= code < len(classes) else None
+
+def _model_bytes(model):
+    return sum(array.nbytes for array in vars(model).values() if isinstance(array, np.ndarray))
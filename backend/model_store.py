@@ -0,0 +1,150 @@
+"""Memory-mapped model store shared by all server worker processes
+
+Layout:
+    model_store/
+        CURRENT                 name of the active version
+        versions/<version>/     one .npy file per forest array
+            meta/               historical_baseline.npy and classes.json published with the forest
+
+Every worker maps the same .npy files read-only (``mmap_mode='r'``), so the
+forest lives once in the OS page cache no matter how many workers run.
+Publishing writes a new version directory and then atomically replaces
+CURRENT; workers notice on their next lookup and swap models without a
+restart.
+
+The historical baseline a model was trained with is swapped together with
+it. A version whose label encoder classes differ from the ones the worker
+serves with (``expected_classes``) is refused, and the old model stays.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from forest_export import CompactForest
+
+class ModelStore:
+    """Versioned, memory-mapped CompactForest store with atomic hot-swap"""
+
+    def __init__(self, store_dir, check_interval=1.0):
+        self.store_dir = store_dir
+        self.check_interval = check_interval
+        self.version = None
+        self.expected_classes = None
+        self.refused_version = None
+        # (version, baseline array or None), replaced as one object on swap
+        self.baseline = (None, None)
+        self._model = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def current_path(self):
+        return os.path.join(self.store_dir, 'CURRENT')
+
+    def exists(self):
+        """True when a version has been published to this store"""
+        return os.path.exists(self.current_path)
+
+    def publish(self, arrays, version=None, historical_baseline=None, classes=None):
+        """Write exported forest arrays (plus optional baseline and encoder classes) as a new version and make it current"""
+        version = version or datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')
+        versions_dir = os.path.join(self.store_dir, 'versions')
+        os.makedirs(versions_dir, exist_ok=True)
+        tmp_dir = os.path.join(versions_dir, f'.{version}.tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), np.asarray(array))
+        if historical_baseline is not None or classes is not None:
+            meta_dir = os.path.join(tmp_dir, 'meta')
+            os.makedirs(meta_dir, exist_ok=True)
+            if historical_baseline is not None:
+                np.save(os.path.join(meta_dir, 'historical_baseline.npy'), np.asarray(historical_baseline, dtype=np.float32))
+            if classes is not None:
+                with open(os.path.join(meta_dir, 'classes.json'), 'w') as f:
+                    json.dump(classes, f)
+        final_dir = os.path.join(versions_dir, version)
+        if os.path.exists(final_dir):
+            shutil.rmtree(final_dir)
+        os.rename(tmp_dir, final_dir)
+
+        tmp_current = self.current_path + '.tmp'
+        with open(tmp_current, 'w') as f:
+            f.write(version + '\n')
+        os.replace(tmp_current, self.current_path)
+        return version
+
+    def current_version(self):
+        with open(self.current_path) as f:
+            return f.read().strip()
+
+    def load(self, version):
+        """Map one version's arrays read-only and build a CompactForest over them"""
+        version_dir = os.path.join(self.store_dir, 'versions', version)
+        arrays = {}
+        for filename in os.listdir(version_dir):
+            if filename.endswith('.npy'):
+                # np.asarray drops the memmap subclass but keeps the shared mapping
+                arrays[filename[:-4]] = np.asarray(np.load(os.path.join(version_dir, filename), mmap_mode='r'))
+        return CompactForest(arrays)
+
+    def load_meta(self, version):
+        """Return (historical baseline, encoder classes) published with a version, None for each one missing"""
+        meta_dir = os.path.join(self.store_dir, 'versions', version, 'meta')
+        baseline_path = os.path.join(meta_dir, 'historical_baseline.npy')
+        classes_path = os.path.join(meta_dir, 'classes.json')
+        baseline = np.load(baseline_path).astype(np.float32) if os.path.exists(baseline_path) else None
+        classes = None
+        if os.path.exists(classes_path):
+            with open(classes_path) as f:
+                classes = json.load(f)
+        return baseline, classes
+
+    def get(self):
+        """Return the current model, reloading when CURRENT names a new version"""
+        now = time.monotonic()
+        if self._model is not None and now - self._checked_at < self.check_interval:
+            return self._model
+        with self._lock:
+            if self._model is None or now - self._checked_at >= self.check_interval:
+                version = self.current_version()
+                if version != self.version and version != self.refused_version:
+                    baseline, classes = self.load_meta(version)
+                    if classes is not None and self.expected_classes is not None and classes != self.expected_classes:
+                        message = f"Model version {version} was trained with different encoders"
+                        if self._model is None:
+                            raise ValueError(message)
+                        print(f"⚠️  {message}, keeping {self.version}")
+                        self.refused_version = version
+                    else:
+                        # In-flight requests keep their reference to the old model
+                        self._model = self.load(version)
+                        self.baseline = (version, baseline)
+                        self.version = version
+                self._checked_at = now
+        return self._model
+
+    def prune(self, keep=3):
+        """Delete all but the newest `keep` versions (never the current one)"""
+        versions_dir = os.path.join(self.store_dir, 'versions')
+        current = self.current_version()
+        versions = sorted(v for v in os.listdir(versions_dir) if not v.startswith('.'))
+        for version in versions[:-keep]:
+            if version != current:
+                shutil.rmtree(os.path.join(versions_dir, version))
+
+def encoder_classes(encoders):
+    """Label encoder classes as plain lists, the form kept in classes.json"""
+    return {name: [str(c) for c in encoder.classes_] for name, encoder in sorted(encoders.items())}
+
+if __name__ == "__main__":
+    import sys
+    import joblib
+    from forest_export import export_forest
+
+    source = sys.argv[1] if len(sys.argv) > 1 else 'aphid_risk_predictor.joblib'
+    store_dir = sys.argv[2] if len(sys.argv) > 2 else 'model_store'
+    version = ModelStore(store_dir).publish(export_forest(joblib.load(source)))
+    print(f"✅ Published {source} to {store_dir} as version {version}")
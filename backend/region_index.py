@@ -0,0 +1,67 @@
+import csv
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+class RegionCatalog:
+    """Named regions (countries, sub-national regions, farm plots) with a haversine BallTree
+
+    Optional per-region attributes such as ``country`` or ``climate_zone``
+    are kept in ``attributes`` as lists aligned with ``names``.
+    """
+
+    def __init__(self, names, lats, lons, attributes=None):
+        from sklearn.neighbors import BallTree
+
+        self.names = list(names)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.attributes = attributes or {}
+        self.tree = BallTree(np.radians(np.column_stack([self.lats, self.lons])), metric='haversine')
+
+    @classmethod
+    def from_coords(cls, coords, **attributes):
+        """Build a catalog from a {name: (lat, lon)} table such as countries_coords"""
+        names = list(coords)
+        lats = [coords[name][0] for name in names]
+        lons = [coords[name][1] for name in names]
+        return cls(names, lats, lons, {key: [table.get(name) for name in names] for key, table in attributes.items()})
+
+    @classmethod
+    def from_csv(cls, path):
+        """Load a catalog from a CSV with name, latitude and longitude columns
+
+        Any further columns (e.g. country, climate_zone) become attributes.
+        """
+        names, lats, lons = [], [], []
+        attributes = {}
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                names.append(row.pop('name'))
+                lats.append(float(row.pop('latitude')))
+                lons.append(float(row.pop('longitude')))
+                for key, value in row.items():
+                    attributes.setdefault(key, []).append(value)
+        return cls(names, lats, lons, attributes)
+
+    def __len__(self):
+        return len(self.names)
+
+    def query(self, lats, lons, k=5):
+        """Vectorized k-NN: returns (distances in km, region indices), each of shape (n, k)"""
+        points = np.radians(np.column_stack([np.atleast_1d(lats), np.atleast_1d(lons)]))
+        distances, indices = self.tree.query(points, k=min(k, len(self.names)))
+        return distances * EARTH_RADIUS_KM, indices
+
+    def within(self, min_lat, min_lon, max_lat, max_lon):
+        """Return indices of regions inside a lat/lon bounding box"""
+        mask = (self.lats >= min_lat) & (self.lats <= max_lat) & (self.lons >= min_lon) & (self.lons <= max_lon)
+        return np.flatnonzero(mask)
+
+    def nearest(self, lat, lon, k=5):
+        """Return the k nearest regions as (name, distance_km, lat, lon) tuples"""
+        distances, indices = self.query(lat, lon, k)
+        return [
+            (self.names[i], float(d), float(self.lats[i]), float(self.lons[i]))
+            for d, i in zip(distances[0], indices[0])
+        ]
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+class ResponseCache:
+    """Size-bounded LRU of computed /api/predict response bodies
+
+    Keys are tuples such as (normalized country, crop, month, weather bucket,
+    model version). Entries expire after ``ttl`` seconds, or sooner when
+    ``put`` is given the remaining lifetime of the weather the body was
+    computed from, so a body never outlives that weather.
+    """
+
+    def __init__(self, max_entries=4096, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return (body, expires_at) for a fresh entry, else None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, body, ttl=None):
+        """Store a response body for at most ttl seconds (capped at self.ttl); returns (body, expires_at)
+
+        A body whose weather has already expired (ttl <= 0) is not stored and
+        comes back with expires_at None.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return body, None
+        entry = (body, time.time() + ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def stats(self):
+        """Return hit/miss/eviction counters, hit ratio and current size"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+        }
+
+def make_etag(body):
+    """Strong ETag value (unquoted) from the canonical JSON encoding of a response body"""
+    return hashlib.sha1(json.dumps(body, sort_keys=True, separators=(',', ':')).encode()).hexdigest()[:20]
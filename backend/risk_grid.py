@@ -0,0 +1,261 @@
+"""Precomputed global aphid risk raster, one layer per crop, served from memory
+
+Every cell of a lat/lon grid is encoded like an unknown-country location
+(nearest country from the region catalog, climate of the closest one,
+historical infestation averaged over the k nearest) and scored with the
+served model. Risks are stored as uint8 (risk * 254, 255 = no data) or
+float16 (NaN = no data), so a 2° grid for every crop fits in ~120 KB.
+
+Cells start with climate-default weather. ``update_weather`` (hooked to the
+weather cache) and ``update_region`` replace the weather of the cells they
+touch and mark only those cells dirty; a background thread rescoring dirty
+cells keeps inference off the request path. A hot-swapped model that brings
+its own historical baseline recomputes the historical column and every cell. Slices and map tiles are read
+straight from the array.
+"""
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+import numpy as np
+
+NO_DATA = 255
+# Rows scored per model call while recomputing
+MAX_BATCH_ROWS = 65536
+WEATHER_FIELDS = ('temperature', 'humidity', 'rainfall', 'wind_speed')
+
+class RiskGrid:
+    """Risk raster of shape (crops, lats, lons) with incremental recomputation"""
+
+    def __init__(self, encoder, catalog, country_climates, default_weather, crops, predict,
+                 resolution=2.0, lat_range=(-60.0, 76.0), dtype='uint8', k=5):
+        self.encoder = encoder
+        self.crops = [crop for crop in crops if crop in encoder.crop_codes]
+        self.predict = predict
+        self.resolution = float(resolution)
+        self.lat_min, self.lat_max = lat_range
+        self.dtype = np.dtype(dtype)
+        self.lats = np.arange(self.lat_min + self.resolution / 2, self.lat_max, self.resolution)
+        self.lons = np.arange(-180 + self.resolution / 2, 180, self.resolution)
+        self.shape = (len(self.lats), len(self.lons))
+        n_cells = self.shape[0] * self.shape[1]
+
+        # Static encoding of every cell from its nearest countries
+        cell_lats, cell_lons = np.meshgrid(self.lats, self.lons, indexing='ij')
+        _, nearest = catalog.query(cell_lats.ravel(), cell_lons.ravel(), k)
+        region_codes = np.array([encoder.country_codes.get(name, -1) for name in catalog.names])
+        region_climates = [country_climates.get(name) for name in catalog.names]
+        region_climate_codes = np.array([encoder.climate_codes.get(climate, -1) for climate in region_climates])
+        closest = nearest[:, 0]
+        self.country_codes = region_codes[closest]
+        self.climate_codes = region_climate_codes[closest]
+        self._nearest = nearest
+        self._region_codes = region_codes
+        self.historical = self._historical(encoder.historical_baseline)
+        # Cells whose closest country cannot be encoded (e.g. no climate entry) stay "no data"
+        self.valid = (self.country_codes >= 0) & (self.climate_codes >= 0) & ~np.isnan(self.historical)
+
+        self.weather = np.zeros((n_cells, len(WEATHER_FIELDS)), dtype=np.float32)
+        defaults = {}
+        for i in np.flatnonzero(self.valid):
+            climate = region_climates[closest[i]]
+            if climate not in defaults:
+                defaults[climate] = [default_weather(climate)[field] for field in WEATHER_FIELDS]
+            self.weather[i] = defaults[climate]
+
+        self.risk = np.full((len(self.crops),) + self.shape, self._no_data(), dtype=self.dtype)
+        self.dirty = self.valid.copy()
+        self.month = None
+        self.model = None
+        self.version = 0
+        self.updated_at = None
+        self.last_recompute = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def _historical(self, baseline):
+        """Per-cell historical infestation: the baseline averaged over the k nearest countries"""
+        self.baseline = baseline
+        region_baseline = np.where(self._region_codes >= 0, np.asarray(baseline)[self._region_codes], np.nan)
+        with np.errstate(invalid='ignore'):
+            return np.nanmean(region_baseline[self._nearest], axis=1)
+
+    def _no_data(self):
+        return NO_DATA if self.dtype == np.uint8 else np.nan
+
+    def cell_index(self, lat, lon):
+        """Flat index of the cell containing (lat, lon), or None outside the grid"""
+        i = int((lat - self.lat_min) // self.resolution)
+        j = int((lon + 180) // self.resolution) % self.shape[1]
+        if not 0 <= i < self.shape[0]:
+            return None
+        return i * self.shape[1] + j
+
+    def update_weather(self, lat, lon, weather):
+        """Replace the weather of the cell containing (lat, lon) and mark it for recomputation"""
+        index = self.cell_index(lat, lon)
+        if index is not None and self.valid[index]:
+            self._set_weather(np.array([index]), weather)
+
+    def update_region(self, min_lat, min_lon, max_lat, max_lon, weather):
+        """Replace the weather of every cell whose centre lies in the bounding box"""
+        rows = np.flatnonzero((self.lats >= min_lat) & (self.lats <= max_lat))
+        cols = np.flatnonzero((self.lons >= min_lon) & (self.lons <= max_lon))
+        indices = (rows[:, None] * self.shape[1] + cols[None, :]).ravel()
+        indices = indices[self.valid[indices]]
+        if len(indices):
+            self._set_weather(indices, weather)
+        return len(indices)
+
+    def _set_weather(self, indices, weather):
+        values = [float(weather[field]) for field in WEATHER_FIELDS]
+        with self._lock:
+            self.weather[indices] = values
+            self.dirty[indices] = True
+        self._wake.set()
+
+    def recompute(self, model, month=None, encoder=None):
+        """Rescore dirty cells (all cells after a model, baseline or month change); returns cells scored
+
+        ``encoder`` is the FeatureEncoder currently serving requests; when its
+        historical baseline differs from the grid's, the grid switches to it.
+        """
+        month = month or datetime.now().month
+        with self._lock:
+            if encoder is not None and encoder.historical_baseline is not self.baseline:
+                self.historical = self._historical(encoder.historical_baseline)
+                self.dirty[:] = self.valid
+            if model is not self.model or month != self.month:
+                self.dirty[:] = self.valid
+                self.model, self.month = model, month
+            cells = np.flatnonzero(self.dirty)
+            # Cleared up front: updates arriving while scoring mark cells dirty again
+            self.dirty[:] = False
+            weather = self.weather[cells]
+        if not len(cells):
+            return 0
+
+        start = time.perf_counter()
+        n_crops = len(self.crops)
+        crop_codes = np.array([self.encoder.crop_codes[crop] for crop in self.crops], dtype=np.float32)
+        step = max(1, MAX_BATCH_ROWS // n_crops)
+        for offset in range(0, len(cells), step):
+            chunk = cells[offset:offset + step]
+            chunk_weather = weather[offset:offset + step]
+            # Rows ordered cell-major, crop-minor; columns follow FEATURE_COLUMNS
+            X = np.empty((len(chunk), n_crops, 9), dtype=np.float32)
+            X[:, :, 0:4] = chunk_weather[:, None, :]
+            X[:, :, 4] = month
+            X[:, :, 5] = self.historical[chunk, None]
+            X[:, :, 6] = self.country_codes[chunk, None]
+            X[:, :, 7] = self.climate_codes[chunk, None]
+            X[:, :, 8] = crop_codes[None, :]
+            X = X.reshape(-1, 9)
+            # Neighbouring cells often share a nearest country and weather, score each distinct row once
+            unique, inverse = np.unique(X, axis=0, return_inverse=True)
+            risks = np.clip(np.asarray(self.predict(model, unique), dtype=np.float64), 0, 1)[inverse.ravel()]
+            risks = risks.reshape(len(chunk), n_crops).T
+            rows, cols = np.divmod(chunk, self.shape[1])
+            if self.dtype == np.uint8:
+                self.risk[:, rows, cols] = np.rint(risks * (NO_DATA - 1)).astype(np.uint8)
+            else:
+                self.risk[:, rows, cols] = risks.astype(self.dtype)
+        self.version += 1
+        self.updated_at = time.time()
+        self.last_recompute = {'cells': int(len(cells)), 'seconds': round(time.perf_counter() - start, 3)}
+        return len(cells)
+
+    def start(self, get_model, get_encoder=None, interval=5.0):
+        """Recompute in a daemon thread whenever cells are dirty, the month changes or the model is swapped"""
+        def run():
+            while True:
+                try:
+                    # The model first: fetching it is what installs a hot-swapped baseline
+                    model = get_model()
+                    self.recompute(model, encoder=get_encoder() if get_encoder else None)
+                except Exception as e:
+                    print(f"Risk grid recompute error: {e}")
+                self._wake.wait(interval)
+                self._wake.clear()
+        threading.Thread(target=run, name='risk-grid', daemon=True).start()
+
+    def crop_layer(self, crop):
+        """Stored risk layer for a crop; raises KeyError for unknown crops"""
+        if crop not in self.crops:
+            raise KeyError(f"Unknown crop type: {crop}")
+        return self.risk[self.crops.index(crop)]
+
+    def to_risk(self, values):
+        """Stored values -> float risks with NaN for no data"""
+        if self.dtype == np.uint8:
+            return np.where(values == NO_DATA, np.nan, values / (NO_DATA - 1))
+        return values.astype(np.float64)
+
+    def slice(self, crop, min_lat=-90.0, min_lon=-180.0, max_lat=90.0, max_lon=180.0):
+        """Cells of one crop inside a bounding box: (lats, lons, risks with NaN for no data)"""
+        rows = np.flatnonzero((self.lats >= min_lat) & (self.lats <= max_lat))
+        cols = np.flatnonzero((self.lons >= min_lon) & (self.lons <= max_lon))
+        values = self.crop_layer(crop)[np.ix_(rows, cols)]
+        return self.lats[rows], self.lons[cols], self.to_risk(values)
+
+    def tile(self, crop, z, x, y, size=256):
+        """Web Mercator (slippy map) tile of one crop as a (size, size) array of stored values"""
+        layer = self.crop_layer(crop)
+        n = 2 ** z
+        pixels = (np.arange(size) + 0.5) / size
+        lons = (x + pixels) / n * 360.0 - 180.0
+        lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + pixels) / n))))
+        rows = np.floor((lats - self.lat_min) / self.resolution).astype(np.int64)
+        cols = np.floor((lons + 180.0) / self.resolution).astype(np.int64) % self.shape[1]
+        inside = (rows >= 0) & (rows < self.shape[0])
+        tile = np.full((size, size), self._no_data(), dtype=self.dtype)
+        tile[inside] = layer[rows[inside]][:, cols]
+        return tile
+
+    def tile_png(self, crop, z, x, y, size=256):
+        """Colored RGBA PNG tile (green = low, red = high risk, transparent = no data)"""
+        risks = self.to_risk(self.tile(crop, z, x, y, size))
+        return encode_png(colorize(risks))
+
+    def meta(self):
+        """Grid geometry and recomputation status"""
+        return {
+            'resolution': self.resolution,
+            'bounds': [self.lat_min, -180.0, self.lat_max, 180.0],
+            'shape': list(self.shape),
+            'crops': self.crops,
+            'dtype': self.dtype.name,
+            'month': self.month,
+            'version': self.version,
+            'updated_at': self.updated_at,
+            'pending_cells': int(self.dirty.sum()),
+            'last_recompute': self.last_recompute,
+            'bytes': int(self.risk.nbytes),
+        }
+
+def colorize(risks, alpha=170):
+    """Risk array (NaN = no data) -> RGBA uint8 image, green -> yellow -> red"""
+    rgba = np.zeros(risks.shape + (4,), dtype=np.uint8)
+    known = ~np.isnan(risks)
+    r = np.clip(risks[known] * 2, 0, 1)
+    g = np.clip(2 - risks[known] * 2, 0, 1)
+    rgba[known] = np.column_stack([r * 255, g * 200, np.zeros_like(r), np.full_like(r, alpha)]).astype(np.uint8)
+    return rgba
+
+def encode_png(rgba):
+    """Minimal RGBA PNG encoder (no imaging dependency)"""
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+def valid_tile(z, x, y):
+    return 0 <= z <= 12 and 0 <= x < 2 ** z and 0 <= y < 2 ** z
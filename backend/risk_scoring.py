@@ -0,0 +1,80 @@
+"""Closed-form aphid risk score over whole arrays
+
+The same formula gends.py labels the synthetic dataset with: a Gaussian
+temperature response around 22.5°C, a piecewise humidity response (rising
+to 60%, flat to 80%, falling after), rainfall and wind decay, spring
+seasonality, scaled by crop susceptibility and historical infestation.
+Evaluated branch-free with NumPy it needs no model, so the server can use
+it as a fallback or cheap tier and dataset generation as its labeler.
+"""
+import numpy as np
+
+# Spring peak of the month factor, precomputed for months 1-12 (index 0 unused)
+MONTH_FACTOR = 0.5 + 0.5 * np.cos(2 * np.pi * (np.arange(13) - 4) / 12)
+NOISE = 0.05
+
+def analytic_risk(temp, humidity, rainfall, wind, month, crop_susceptibility, historical_infestation, rng=None):
+    """Aphid risk in [0, 1] per row; with `rng`, adds the uniform ±0.05 label noise gends.py uses"""
+    temp = np.asarray(temp, dtype=np.float64)
+    humidity = np.asarray(humidity, dtype=np.float64)
+    month = np.asarray(month)
+
+    # Each factor is computed into one buffer in place, multiplied in the scalar formula's order
+    risk = temp - 22.5
+    risk /= 8
+    np.square(risk, out=risk)
+    risk *= -0.5
+    np.exp(risk, out=risk)
+
+    # min(h / 60, 1, 1 - (h - 80) / 20) matches the three humidity branches
+    factor = humidity / 60
+    np.minimum(factor, 1.0, out=factor)
+    np.minimum(factor, 1 - (humidity - 80) / 20, out=factor)
+    risk *= factor
+
+    np.multiply(rainfall, 0.1, out=factor)
+    factor += 1
+    np.divide(1, factor, out=factor)
+    risk *= factor
+
+    np.multiply(wind, 0.15, out=factor)
+    factor += 1
+    np.divide(1, factor, out=factor)
+    risk *= factor
+
+    if month.dtype.kind in 'iu':
+        risk *= MONTH_FACTOR[month]
+    else:
+        risk *= 0.5 + 0.5 * np.cos(2 * np.pi * (month - 4) / 12)
+
+    risk *= crop_susceptibility
+    np.multiply(historical_infestation, 0.3, out=factor)
+    factor += 0.7
+    risk *= factor
+
+    if rng is not None:
+        risk += rng.uniform(-NOISE, NOISE, len(risk))
+    return np.clip(risk, 0, 1, out=risk)
+
+class AnalyticScorer:
+    """Model stand-in that scores encoded feature matrices with ``analytic_risk``
+
+    ``predict(X)`` takes the same matrix the trained model does; crop
+    susceptibility is looked up from the encoded crop column. Scores are
+    noise-free, i.e. the expected value of the training label.
+    """
+
+    def __init__(self, crop_classes, crops_susceptibility, feature_columns):
+        self.susceptibility = np.array([crops_susceptibility.get(crop, np.nan) for crop in crop_classes])
+        self.columns = {name: i for i, name in enumerate(feature_columns)}
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        column = lambda name: X[:, self.columns[name]]
+        return analytic_risk(
+            column('temperature'), column('humidity'), column('rainfall'), column('wind_speed'),
+            column('month').astype(np.intp), self.susceptibility[column('crop_encoded').astype(np.intp)],
+            column('historical_infestation'),
+        )
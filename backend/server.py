@@ -1,58 +1,413 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
-import joblib
-from aphid_predict import get_country_coordinates, get_weather_data, predict_aphid_risk, crops_susceptibility, country_climates, countries_coords
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from instrumentation import SERVER_TIMING, metrics, start_request, finish_request
+from circuit_breaker import start_deadline, end_deadline
+from response_cache import ResponseCache, make_etag
+from risk_grid import valid_tile
+from aphid_predict import WEATHER_TTL, REQUEST_BUDGET, nominatim_breaker, openweather_breaker, SCORING_BACKEND, SCORING_FALLBACK, canonical_country_name, geocode_cache, model_store, weather_cache, forecast_cache, get_country_coordinates, get_weather_data, get_forecast_data, get_fallback_weather, load_encoders, load_model, get_analytic_scorer, get_feature_encoder, specialist_registry, with_specialists, predict_aphid_risk, predict_aphid_risk_batch, predict_aphid_risk_forecast, sweep_aphid_risk, get_country_catalog, start_weather_prefetch, build_risk_grid, warm_up_prediction, crops_susceptibility, country_climates, countries_coords
 
 app = Flask(__name__)
 CORS(app)
 
-# Load model and encoders once at startup
-try:
-    model = joblib.load('aphid_risk_predictor.joblib')
-    encoders = joblib.load('encoders.joblib')
-except Exception as e:
-    model = None
-    encoders = None
-    print(f"Model loading error: {e}")
+# Upper bound on items accepted by one /api/predict/batch request
+MAX_BATCH_SIZE = 1000
 
-@app.route('/api/predict', methods=['POST'])
+# (region, crop) pairs scored per model call by /api/sweep
+SWEEP_CHUNK_SIZE = 256
+
+# "background" serves health checks while the model loads, "sync" loads during import
+WARMUP_MODE = os.environ.get('AGRINOVA_WARMUP', 'background')
+
+# Cell size in degrees of the precomputed risk grid, 0 disables it
+RISK_GRID_RESOLUTION = float(os.environ.get('AGRINOVA_RISK_GRID_RESOLUTION', 2.0))
+
+# Full /api/predict bodies, reused while the weather they were computed from is fresh
+response_cache = ResponseCache(int(os.environ.get('AGRINOVA_RESPONSE_CACHE_SIZE', 4096)), ttl=WEATHER_TTL)
+metrics.register_gauges('response_cache', response_cache.stats)
+
+# Per-request "scoring" values; "analytic" is the cheap, model-free tier
+SCORING_BACKENDS = ('model', 'analytic')
+
+model = None
+encoders = None
+analytic_scorer = None
+risk_grid = None
+warmup_state = {'ready': False, 'error': None, 'model_error': None, 'seconds': None}
+
+def warm_up():
+    """Load the encoders and model once, then run a dummy prediction"""
+    global model, encoders, analytic_scorer
+    start = time.perf_counter()
+    try:
+        encoders = load_encoders()
+        analytic_scorer = get_analytic_scorer(encoders)
+        if SCORING_BACKEND == 'model':
+            try:
+                model = load_model()
+            except Exception as e:
+                if not SCORING_FALLBACK:
+                    raise
+                # Degrade to the closed-form score instead of answering 500 to every request
+                warmup_state['model_error'] = str(e)
+                print(f"⚠️  Model loading error: {e}. Serving analytic risk scores instead.")
+        warm_up_prediction(get_model(), encoders)
+    except Exception as e:
+        warmup_state['error'] = str(e)
+        print(f"Model loading error: {e}")
+        return
+    warmup_state['seconds'] = round(time.perf_counter() - start, 3)
+    warmup_state['ready'] = True
+    if RISK_GRID_RESOLUTION > 0:
+        start_risk_grid()
+
+def start_risk_grid():
+    """Build the risk grid and keep it current from a background thread"""
+    global risk_grid
+    risk_grid = build_risk_grid(encoders, RISK_GRID_RESOLUTION)
+    # Fresh weather for a location rescores only the grid cell containing it
+    weather_cache.subscribe(risk_grid.update_weather)
+    # A hot-swapped model's baseline reaches the grid through the request-path feature encoder
+    risk_grid.start(get_model, lambda: get_feature_encoder(encoders))
+
+def get_model(scoring=None):
+    """Return the scorer for a request: the served model (following hot-swaps, routed to specialists) or the analytic scorer
+
+    Requests that do not pick a backend fall back to the analytic scorer
+    without a model; an explicit "model" gets None instead.
+    """
+    if scoring == 'analytic' or (scoring is None and (SCORING_BACKEND == 'analytic' or model is None)):
+        return analytic_scorer
+    if model is None:
+        return None
+    return with_specialists(model_store.get() if model_store.version else model)
+
+def scoring_backend():
+    """Backend answering requests that do not pick one, None before warm-up"""
+    if not warmup_state['ready']:
+        return None
+    return 'analytic' if get_model() is analytic_scorer else 'model'
+
+def invalid_scoring(scoring):
+    """Error response for an unknown per-request scoring backend, else None"""
+    if scoring is not None and scoring not in SCORING_BACKENDS:
+        return jsonify({'error': f"scoring must be one of: {', '.join(SCORING_BACKENDS)}"}), 400
+    return None
+
+def model_unavailable(scoring=None):
+    """Error response while the model is missing or still warming up, or when the requested backend is not loaded, else None"""
+    if not warmup_state['ready']:
+        if warmup_state['error'] is None:
+            return jsonify({'error': 'Model is warming up'}), 503
+        return jsonify({'error': 'Model not loaded'}), 500
+    if get_model(scoring) is None:
+        return jsonify({'error': 'Model scoring is unavailable, the model is not loaded. Use "scoring": "analytic".'}), 503
+    return None
+
+if WARMUP_MODE == 'sync':
+    warm_up()
+else:
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+
+# Weather prefetch does not need the model, so it starts without waiting for warm-up
+weather_prefetcher = start_weather_prefetch()
+
+@app.before_request
+def start_timing():
+    g.request_start = time.perf_counter()
+    # Upstream calls made for this request share one latency budget
+    g.deadline_token = start_deadline(REQUEST_BUDGET)
+    if SERVER_TIMING:
+        g.timing_token = start_request()
+
+@app.after_request
+def finish_timing(response):
+    if request.endpoint and 'request_start' in g:
+        metrics.observe(f'http_{request.endpoint}', time.perf_counter() - g.request_start)
+    if 'deadline_token' in g:
+        end_deadline(g.pop('deadline_token'))
+    if 'timing_token' in g:
+        response.headers['Server-Timing'] = finish_request(g.pop('timing_token'))
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({'status': 'alive'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: model loaded and warm
+    if warmup_state['ready']:
+        return jsonify({'status': 'ready', 'warmup_seconds': warmup_state['seconds'],
+                        'scoring': scoring_backend(), 'model_error': warmup_state['model_error']})
+    status = 'warming_up' if warmup_state['error'] is None else 'failed'
+    return jsonify({'status': status, 'error': warmup_state['error']}), 503
+
+@app.route('/api/predict', methods=['GET', 'POST'])
 def api_predict():
-    data = request.get_json()
+    # GET /api/predict?country=..&crop=.. is cacheable by browsers and proxies
+    data = request.args if request.method == 'GET' else request.get_json()
     country = data.get('country')
     crop = data.get('crop')
+    scoring = data.get('scoring')
     # Validate country name
     if not country or not isinstance(country, str) or country.strip() == "":
         return jsonify({'error': 'Country name is required and must be valid.'}), 400
+    # crop is part of the response cache key, so it has to be hashable
+    if not isinstance(crop, str):
+        return jsonify({'error': 'Crop name is required and must be a string.'}), 400
+    invalid = invalid_scoring(scoring)
+    if invalid:
+        return invalid
     coords = get_country_coordinates(country)
     if not coords:
         return jsonify({'error': f'Could not find coordinates for country: {country}'}), 400
     lat, lon = coords
-    weather = get_weather_data(lat, lon)
-    if not weather:
-        # fallback to climate-based defaults
-        climate = country_climates.get(country, 'temperate')
-        if climate == "tropical":
-            weather = {'temperature': 30, 'humidity': 75, 'rainfall': 20, 'wind_speed': 10, 'description': 'default'}
-        elif climate == "arid":
-            weather = {'temperature': 35, 'humidity': 20, 'rainfall': 2, 'wind_speed': 15, 'description': 'default'}
-        elif climate == "continental":
-            weather = {'temperature': 15, 'humidity': 55, 'rainfall': 10, 'wind_speed': 10, 'description': 'default'}
-        elif climate == "highland":
-            weather = {'temperature': 12, 'humidity': 65, 'rainfall': 25, 'wind_speed': 7, 'description': 'default'}
+    # "india " and "India" share one cache entry and are both scored as India
+    name = canonical_country_name(country)
+    scorer = get_model(scoring)
+    if scorer is None:
+        return model_unavailable(scoring)
+    model_version = 'analytic' if scorer is analytic_scorer else (model_store.version or id(scorer), specialist_registry.version)
+    key = (name, crop, datetime.now().month, weather_cache.key(lat, lon), model_version)
+    cached = response_cache.get(key)
+    if cached:
+        body, expires_at = cached
+    else:
+        weather = get_weather_data(lat, lon)
+        fallback = not weather
+        if fallback:
+            # fallback to climate-based defaults
+            weather = get_fallback_weather(name)
+        unavailable = model_unavailable(scoring)
+        if unavailable:
+            return unavailable
+        try:
+            risk = predict_aphid_risk(name, lat, lon, crop, weather, scorer, encoders)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        body = {'risk': round(risk, 2), 'weather': weather}
+        if fallback or weather.get('stale'):
+            # Climate-default and stale answers are not cached, the next request retries the weather API
+            expires_at = None
         else:
-            weather = {'temperature': 20, 'humidity': 60, 'rainfall': 8, 'wind_speed': 8, 'description': 'default'}
-    if not model or not encoders:
-        return jsonify({'error': 'Model not loaded'}), 500
+            # Live answers expire with the weather entry they were computed from
+            body, expires_at = response_cache.put(key, body, weather_cache.expires_in(lat, lon))
+    payload = {
+        'risk': body['risk'],
+        'country': country,
+        'crop': crop,
+        'weather': body['weather']
+    }
+    response = jsonify(payload)
+    if request.method == 'GET':
+        response.set_etag(make_etag(payload))
+        response.cache_control.public = True
+        response.cache_control.max_age = max(0, int(expires_at - time.time())) if expires_at else 0
+        response = response.make_conditional(request)
+    return response
+
+@app.route('/api/predict/batch', methods=['POST'])
+def api_predict_batch():
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list of {country, crop, weather?} objects.'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} items are allowed per batch.'}), 400
+    invalid = invalid_scoring(data.get('scoring'))
+    if invalid:
+        return invalid
+    unavailable = model_unavailable(data.get('scoring'))
+    if unavailable:
+        return unavailable
     try:
-        risk = predict_aphid_risk(country, lat, lon, crop, weather, model, encoders)
+        results = predict_aphid_risk_batch(items, get_model(data.get('scoring')), encoders)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    for result in results:
+        if 'risk' in result:
+            result['risk'] = round(result['risk'], 2)
+    return jsonify({'results': results})
+
+@app.route('/api/sweep', methods=['POST'])
+def api_sweep():
+    data = request.get_json(silent=True) or {}
+    countries = data.get('countries')
+    bbox = data.get('bbox')
+    crops = data.get('crops') or list(crops_susceptibility)
+    chunk_size = data.get('chunk_size', SWEEP_CHUNK_SIZE)
+    if countries is not None and bbox is not None:
+        return jsonify({'error': 'Give either countries or bbox, not both.'}), 400
+    if countries is not None and (not isinstance(countries, list) or not all(isinstance(c, str) for c in countries)):
+        return jsonify({'error': 'countries must be a list of country names.'}), 400
+    if bbox is not None and (not isinstance(bbox, list) or len(bbox) != 4
+                             or not all(isinstance(v, (int, float)) for v in bbox)):
+        return jsonify({'error': 'bbox must be [min_lat, min_lon, max_lat, max_lon].'}), 400
+    if not isinstance(crops, list) or not all(isinstance(c, str) for c in crops):
+        return jsonify({'error': 'crops must be a list of crop names.'}), 400
+    if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or not 1 <= chunk_size <= MAX_BATCH_SIZE:
+        return jsonify({'error': f'chunk_size must be between 1 and {MAX_BATCH_SIZE}.'}), 400
+    invalid = invalid_scoring(data.get('scoring'))
+    if invalid:
+        return invalid
+    unavailable = model_unavailable(data.get('scoring'))
+    if unavailable:
+        return unavailable
+
+    if bbox is not None:
+        catalog = get_country_catalog()
+        regions = [catalog.names[i] for i in catalog.within(*bbox)]
+    else:
+        regions = countries if countries is not None else list(countries_coords)
+    # One model for the whole sweep, even if a new version is hot-swapped meanwhile
+    sweep_model = get_model(data.get('scoring'))
+
+    def generate():
+        start = time.perf_counter()
+        count = errors = 0
+        try:
+            for results in sweep_aphid_risk(regions, crops, sweep_model, encoders, chunk_size):
+                for result in results:
+                    if 'risk' in result:
+                        result['risk'] = round(result['risk'], 2)
+                    else:
+                        errors += 1
+                count += len(results)
+                # The next chunk is only computed once the server has written this one
+                yield ''.join(json.dumps(result) + '\n' for result in results)
+        except Exception as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+            return
+        yield json.dumps({'done': True, 'count': count, 'errors': errors,
+                          'seconds': round(time.perf_counter() - start, 3)}) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    # Ask reverse proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/forecast', methods=['POST'])
+def api_forecast():
+    data = request.get_json(silent=True) or {}
+    country = data.get('country')
+    crop = data.get('crop')
+    window_hours = data.get('window_hours', 24)
+    scoring = data.get('scoring')
+    # Validate country name
+    if not country or not isinstance(country, str) or country.strip() == "":
+        return jsonify({'error': 'Country name is required and must be valid.'}), 400
+    if not isinstance(window_hours, (int, float)) or not 3 <= window_hours <= 120:
+        return jsonify({'error': 'window_hours must be a number between 3 and 120.'}), 400
+    invalid = invalid_scoring(scoring)
+    if invalid:
+        return invalid
+    coords = get_country_coordinates(country)
+    if not coords:
+        return jsonify({'error': f'Could not find coordinates for country: {country}'}), 400
+    lat, lon = coords
+    forecast = get_forecast_data(lat, lon)
+    if not forecast or not forecast['steps']:
+        # Climate defaults say nothing about the coming days, so there is no fallback here
+        return jsonify({'error': 'Weather forecast is unavailable, try again later.'}), 503
+    unavailable = model_unavailable(scoring)
+    if unavailable:
+        return unavailable
+    try:
+        series, peak_window = predict_aphid_risk_forecast(country, lat, lon, crop, forecast, get_model(scoring), encoders, window_hours)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    for point in series:
+        point['risk'] = round(point['risk'], 2)
+    peak_window['mean_risk'] = round(peak_window['mean_risk'], 2)
+    peak_window['max_risk'] = round(peak_window['max_risk'], 2)
     return jsonify({
-        'risk': round(risk, 2),
         'country': country,
         'crop': crop,
-        'weather': weather
+        'series': series,
+        'peak_window': peak_window,
+        # Served from an expired forecast while the weather API is unavailable
+        'stale': bool(forecast.get('stale'))
     })
 
+def grid_unavailable():
+    """Error response while the risk grid is disabled or not computed yet, else None"""
+    if risk_grid is None and RISK_GRID_RESOLUTION <= 0:
+        return jsonify({'error': 'Risk grid is disabled'}), 404
+    if risk_grid is None or risk_grid.version == 0:
+        return jsonify({'error': 'Risk grid is being computed'}), 503
+    return None
+
+@app.route('/api/grid', methods=['GET'])
+def api_grid_meta():
+    unavailable = grid_unavailable()
+    if unavailable:
+        return unavailable
+    return jsonify(risk_grid.meta())
+
+@app.route('/api/grid/<crop>', methods=['GET'])
+def api_grid_slice(crop):
+    unavailable = grid_unavailable()
+    if unavailable:
+        return unavailable
+    try:
+        bbox = [float(v) for v in request.args.get('bbox', '-90,-180,90,180').split(',')]
+        min_lat, min_lon, max_lat, max_lon = bbox
+    except ValueError:
+        return jsonify({'error': 'bbox must be min_lat,min_lon,max_lat,max_lon'}), 400
+    try:
+        lats, lons, risks = risk_grid.slice(crop, min_lat, min_lon, max_lat, max_lon)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 400
+    risks = np.round(risks, 2)
+    return jsonify({
+        'crop': crop,
+        'month': risk_grid.month,
+        'version': risk_grid.version,
+        'lats': lats.tolist(),
+        'lons': lons.tolist(),
+        'risk': [[None if np.isnan(v) else v for v in row] for row in risks.tolist()]
+    })
+
+@app.route('/api/grid/<crop>/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def api_grid_tile(crop, z, x, y):
+    unavailable = grid_unavailable()
+    if unavailable:
+        return unavailable
+    if not valid_tile(z, x, y):
+        return jsonify({'error': 'Tile out of range'}), 404
+    try:
+        png = risk_grid.tile_png(crop, z, x, y)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 400
+    response = Response(png, mimetype='image/png')
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    return jsonify({
+        'scoring': scoring_backend(),
+        'geocode_cache': geocode_cache.stats(),
+        'weather_cache': weather_cache.stats(),
+        'forecast_cache': forecast_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'weather_prefetch': weather_prefetcher.stats() if weather_prefetcher else None,
+        'specialists': specialist_registry.stats(),
+        'breakers': {'nominatim': nominatim_breaker.stats(), 'openweathermap': openweather_breaker.stats()},
+        'metrics': metrics.snapshot()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
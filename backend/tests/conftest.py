@@ -0,0 +1,58 @@
+"""Shared test setup: backend modules on sys.path and upstream APIs served by fake_upstreams.py
+
+aphid_predict and server read their settings at import, so the environment
+is set here, before any test module imports them.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_upstreams import start_fake_upstreams
+
+_upstream = start_fake_upstreams(latency=0.0)
+# Empty directories, so the server loads the committed encoders and nothing else
+_scratch = tempfile.mkdtemp(prefix='agrinova-tests-')
+os.environ.update({
+    'AGRINOVA_NOMINATIM_URL': _upstream.base_url,
+    'AGRINOVA_OPENWEATHER_URL': f"{_upstream.base_url}/data/2.5",
+    'AGRINOVA_GEOCODE_CACHE': '',
+    'AGRINOVA_MODEL_STORE': os.path.join(_scratch, 'model_store'),
+    'AGRINOVA_SPECIALISTS': os.path.join(_scratch, 'specialists'),
+    'AGRINOVA_HISTORICAL_BASELINE': os.path.join(_scratch, 'historical_baseline.npy'),
+    # Every weather read misses, so each request goes to the (fake) weather API or the stale copy
+    'AGRINOVA_WEATHER_TTL': '0',
+    'AGRINOVA_WEATHER_PREFETCH': '0',
+    'AGRINOVA_RISK_GRID_RESOLUTION': '0',
+    'AGRINOVA_WARMUP': 'sync',
+})
+
+@pytest.fixture
+def upstream():
+    """The fake upstream server, healthy again after each test"""
+    yield _upstream
+    _upstream.error_rate, _upstream.latency = 0.0, 0.0
+
+@pytest.fixture(scope='session')
+def server():
+    """server.py imported from the backend directory (where encoders.joblib lives)"""
+    cwd = os.getcwd()
+    os.chdir(BACKEND_DIR)
+    try:
+        import server
+    finally:
+        os.chdir(cwd)
+    return server
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+@pytest.fixture(scope='session')
+def encoders():
+    """The committed label encoders"""
+    import joblib
+    return joblib.load(os.path.join(BACKEND_DIR, 'encoders.joblib'))
@@ -0,0 +1,103 @@
+import pytest
+import aphid_predict as ap
+from circuit_breaker import CircuitBreaker, start_deadline, end_deadline
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    """A fresh OpenWeatherMap breaker (3 failures, 30 s reset) on a fake clock"""
+    breaker = CircuitBreaker('openweathermap', failure_threshold=3, reset_timeout=30.0, clock=clock)
+    monkeypatch.setattr(ap, 'openweather_breaker', breaker)
+    return breaker
+
+@pytest.fixture
+def budget():
+    # Inside a request budget the weather session does not retry, so one fetch is one upstream call
+    token = start_deadline(5.0)
+    yield
+    end_deadline(token)
+
+def weather_calls(upstream):
+    return upstream.requests.get('weather', 0)
+
+def test_opens_after_threshold_and_short_circuits(upstream, breaker, budget):
+    upstream.error_rate = 1.0
+    before = weather_calls(upstream)
+    for _ in range(3):
+        assert breaker.state == 'closed'
+        assert ap.fetch_weather_data(10.0, 10.0) is None
+    assert breaker.state == 'open'
+    assert weather_calls(upstream) == before + 3
+
+    # Open: no upstream call at all
+    assert ap.fetch_weather_data(10.0, 10.0) is None
+    assert weather_calls(upstream) == before + 3
+    assert breaker.stats()['short_circuited'] == 1
+
+def test_half_open_probe_closes_after_reset_timeout(upstream, breaker, clock, budget):
+    upstream.error_rate = 1.0
+    for _ in range(3):
+        ap.fetch_weather_data(10.0, 10.0)
+    upstream.error_rate = 0.0
+    clock.now += 29.0
+    assert ap.fetch_weather_data(10.0, 10.0) is None
+    assert breaker.stats()['retry_in'] == pytest.approx(1.0)
+
+    clock.now += 1.0
+    before = weather_calls(upstream)
+    weather = ap.fetch_weather_data(10.0, 10.0)
+    assert weather is not None and weather['description'] == 'scattered clouds'
+    assert weather_calls(upstream) == before + 1
+    assert breaker.state == 'closed'
+    assert breaker.consecutive_failures == 0
+
+def test_failed_probe_opens_again(upstream, breaker, clock, budget):
+    upstream.error_rate = 1.0
+    for _ in range(3):
+        ap.fetch_weather_data(10.0, 10.0)
+    clock.now += 30.0
+    assert ap.fetch_weather_data(10.0, 10.0) is None
+    assert breaker.state == 'open'
+    assert breaker.opens == 2
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker('test', failure_threshold=2, slow_call=1.0, clock=clock)
+    breaker.record(True, 1.5)
+    breaker.record(True, 0.5)
+    assert breaker.state == 'closed'
+    breaker.record(True, 2.0)
+    breaker.record(True, 2.0)
+    assert breaker.state == 'open'
+    assert breaker.slow_calls == 3
+
+def test_spent_budget_serves_stale_or_default_weather_without_upstream_calls(client, server, upstream, breaker,
+                                                                             monkeypatch):
+    # Kenya's weather is cached (and, with a zero TTL, immediately expired)
+    live = client.post('/api/predict', json={'country': 'Kenya', 'crop': 'Wheat'}).get_json()
+    assert not live['weather'].get('stale')
+
+    monkeypatch.setattr(server, 'REQUEST_BUDGET', 1e-9)
+    weather_before, search_before = weather_calls(upstream), upstream.requests.get('search', 0)
+    stale = client.post('/api/predict', json={'country': 'Kenya', 'crop': 'Wheat'})
+    assert stale.status_code == 200
+    assert stale.get_json()['weather']['stale'] is True
+    assert stale.get_json()['weather']['temperature'] == live['weather']['temperature']
+
+    default = client.post('/api/predict', json={'country': 'Peru', 'crop': 'Wheat'})
+    assert default.status_code == 200
+    assert default.get_json()['weather']['description'] == 'default'
+
+    # Unknown places cannot be geocoded without budget either
+    assert client.post('/api/predict', json={'country': 'Atlantis', 'crop': 'Wheat'}).status_code == 400
+    assert weather_calls(upstream) == weather_before
+    assert upstream.requests.get('search', 0) == search_before
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+from dataset_io import load_dataset, to_compact, write_dataset
+
+@pytest.fixture
+def many_countries():
+    """More countries than int8 codes can hold"""
+    countries = [f"Country {i:03d}" for i in range(300)]
+    encoders = {
+        'country_encoder': LabelEncoder().fit(countries),
+        'climate_encoder': LabelEncoder().fit(['arid', 'temperate']),
+        'crop_encoder': LabelEncoder().fit(['Maize', 'Wheat']),
+    }
+    df = pd.DataFrame({
+        'country': countries[-3:],
+        'climate_zone': ['arid', 'temperate', 'arid'],
+        'crop_type': ['Wheat', 'Maize', 'Wheat'],
+        'temperature': [20.5, 21.0, 22.5],
+        'country_encoded': encoders['country_encoder'].transform(countries[-3:]),
+        'climate_encoded': [0, 1, 0],
+        'crop_encoded': [1, 0, 1],
+    })
+    return df, encoders
+
+def test_country_codes_past_127_survive_compaction(many_countries):
+    df, encoders = many_countries
+    compact = to_compact(df, encoders)
+    assert compact['country_encoded'].tolist() == [297, 298, 299]
+    assert compact['country'].cat.codes.tolist() == [297, 298, 299]
+
+@pytest.mark.parametrize('name', ['data.feather', 'data.parquet', 'data.csv'])
+def test_round_trip(many_countries, tmp_path, name):
+    pytest.importorskip('pyarrow')
+    df, encoders = many_countries
+    path = tmp_path / name
+    assert write_dataset([df.iloc[:2], df.iloc[2:]], path, encoders) == 3
+    loaded = load_dataset(path)
+    assert loaded['country_encoded'].tolist() == [297, 298, 299]
+    assert loaded['country'].astype(str).tolist() == df['country'].tolist()
+    np.testing.assert_allclose(loaded['temperature'], df['temperature'])
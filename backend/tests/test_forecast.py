@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+import aphid_predict as ap
+from fake_upstreams import fake_forecast
+
+class ColumnModel:
+    """Scores each row with one feature column, scaled"""
+
+    def __init__(self, column, scale):
+        self.column = column
+        self.scale = scale
+
+    def predict(self, X):
+        return np.asarray(X[self.column], dtype=float) * self.scale
+
+def make_forecast(temperatures, start=1_700_006_400, step=3 * 3600, timezone_offset=0):
+    return {'timezone_offset': timezone_offset, 'steps': [
+        {'time': start + i * step, 'temperature': t, 'humidity': 60, 'rainfall': 0, 'wind_speed': 3,
+         'description': 'clear sky'}
+        for i, t in enumerate(temperatures)]}
+
+def test_parse_forecast_response():
+    payload = fake_forecast(-1.3, 36.8)
+    payload['list'][0]['rain'] = {'3h': 2.5}
+    payload['list'][1].pop('rain', None)
+    forecast = ap.parse_forecast_response(payload)
+    assert forecast['timezone_offset'] == payload['city']['timezone']
+    assert len(forecast['steps']) == 40
+    first = forecast['steps'][0]
+    assert first == {
+        'time': payload['list'][0]['dt'],
+        'temperature': payload['list'][0]['main']['temp'],
+        'humidity': payload['list'][0]['main']['humidity'],
+        'rainfall': 2.5,
+        'wind_speed': payload['list'][0]['wind']['speed'],
+        'description': 'scattered clouds',
+    }
+    assert forecast['steps'][1]['rainfall'] == 0
+
+def test_parse_forecast_without_city_uses_utc():
+    payload = fake_forecast(0.0, 0.0, steps=2)
+    del payload['city']
+    assert ap.parse_forecast_response(payload)['timezone_offset'] == 0
+
+def test_peak_window_is_the_highest_mean_run(encoders):
+    # 24 h windows are 8 steps; steps 5..12 are hot
+    temperatures = [10] * 5 + [80] * 8 + [10] * 7
+    forecast = make_forecast(temperatures)
+    series, peak = ap.predict_aphid_risk_forecast('India', 20.6, 78.9, 'Wheat', forecast,
+                                                  ColumnModel('temperature', 0.01), encoders, window_hours=24)
+    assert [point['risk'] for point in series] == pytest.approx([t / 100 for t in temperatures])
+    assert peak['start'] == series[5]['time']
+    # The window ends when its last 3 hour step does
+    assert peak['end'] == datetime.fromtimestamp(forecast['steps'][12]['time'] + 3 * 3600, timezone.utc).isoformat()
+    assert peak['mean_risk'] == pytest.approx(0.8)
+    assert peak['max_risk'] == pytest.approx(0.8)
+
+def test_window_longer_than_the_forecast_covers_every_step(encoders):
+    forecast = make_forecast([20, 40, 60])
+    _, peak = ap.predict_aphid_risk_forecast('India', 20.6, 78.9, 'Wheat', forecast,
+                                             ColumnModel('temperature', 0.01), encoders, window_hours=120)
+    assert peak['mean_risk'] == pytest.approx(0.4)
+    assert peak['max_risk'] == pytest.approx(0.6)
+
+def test_each_step_uses_the_local_month(encoders):
+    # 2024-01-31 22:00 UTC is already February at UTC+3
+    forecast = make_forecast([20, 20], start=int(datetime(2024, 1, 31, 22, tzinfo=timezone.utc).timestamp()),
+                             step=6 * 3600, timezone_offset=3 * 3600)
+    series, _ = ap.predict_aphid_risk_forecast('Kenya', 0.0, 37.9, 'Wheat', forecast,
+                                               ColumnModel('month', 0.01), encoders, window_hours=6)
+    assert [point['risk'] for point in series] == pytest.approx([0.02, 0.02])
@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+from forest_export import CompactForest, export_forest, load_compact_forest, save_compact_forest
+from train import FEATURE_COLUMNS, TARGET_COLUMN
+
+DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'synthetic_aphid_dataset_with_risk1.csv')
+
+@pytest.fixture(scope='module')
+def dataset():
+    df = pd.read_csv(DATASET)
+    return df[FEATURE_COLUMNS], df[TARGET_COLUMN]
+
+@pytest.fixture(scope='module')
+def forest(dataset):
+    X, y = dataset
+    return RandomForestRegressor(n_estimators=10, min_samples_leaf=2, random_state=0, n_jobs=1).fit(X[:5000], y[:5000])
+
+def test_random_forest_parity(forest, dataset):
+    X, _ = dataset
+    compact = CompactForest(export_forest(forest))
+    np.testing.assert_allclose(compact.predict(X.to_numpy()), forest.predict(X), rtol=0, atol=1e-9)
+
+def test_single_row_and_dataframe_inputs(forest, dataset):
+    X, _ = dataset
+    compact = CompactForest(export_forest(forest))
+    assert compact.predict(X.iloc[0].to_numpy()) == pytest.approx(forest.predict(X.iloc[[0]]), abs=1e-9)
+    # DataFrame columns are picked by name, in any order
+    shuffled = X[FEATURE_COLUMNS[::-1]].iloc[:100]
+    np.testing.assert_allclose(compact.predict(shuffled), forest.predict(X.iloc[:100]), rtol=0, atol=1e-9)
+
+@pytest.mark.parametrize('model', [
+    DecisionTreeRegressor(max_depth=12, random_state=0),
+    GradientBoostingRegressor(n_estimators=20, max_depth=3, random_state=0),
+])
+def test_other_tree_models_parity(model, dataset):
+    X, y = dataset
+    model.fit(X[:5000], y[:5000])
+    compact = CompactForest(export_forest(model))
+    np.testing.assert_allclose(compact.predict(X.to_numpy()), model.predict(X), rtol=0, atol=1e-9)
+
+def test_npz_round_trip(forest, dataset, tmp_path):
+    X, _ = dataset
+    arrays = export_forest(forest)
+    path = tmp_path / 'forest.npz'
+    save_compact_forest(arrays, path)
+    loaded = load_compact_forest(path)
+    assert loaded.feature_names == FEATURE_COLUMNS
+    assert loaded.max_depth == int(arrays['max_depth'])
+    np.testing.assert_array_equal(loaded.predict(X.to_numpy()), CompactForest(arrays).predict(X.to_numpy()))
@@ -0,0 +1,20 @@
+import sys
+import pytest
+import gends
+
+@pytest.mark.parametrize('argv', [['--rows', '0'], ['--rows', '-5'], ['--chunk-size', '0']])
+def test_empty_dataset_is_refused(argv, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['gends.py', '--output', 'out.csv'] + argv)
+    with pytest.raises(SystemExit) as exit_info:
+        gends.main()
+    assert exit_info.value.code == 2
+    assert not (tmp_path / 'out.csv').exists()
+    assert not (tmp_path / 'encoders.joblib').exists()
+
+def test_small_dataset(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['gends.py', '--rows', '3', '--chunk-size', '2', '--output', 'out.csv'])
+    gends.main()
+    assert (tmp_path / 'out.csv').read_text().count('\n') == 4
+    assert 'Dataset preview' in capsys.readouterr().out
@@ -0,0 +1,39 @@
+import numpy as np
+import aphid_predict as ap
+from feature_encoding import FeatureEncoder
+from risk_grid import RiskGrid
+
+class HistoricalModel:
+    """Scores a row with its historical infestation column"""
+
+    def predict(self, X):
+        return np.asarray(X)[:, 5]
+
+def make_encoder(encoders, value):
+    baseline = np.full(len(encoders['country_encoder'].classes_), value)
+    return FeatureEncoder(encoders, ap.country_climates, baseline, ap.find_nearest_countries)
+
+def make_grid(encoder):
+    return RiskGrid(encoder, ap.get_country_catalog(), ap.country_climates, ap.get_default_weather,
+                    ['Wheat'], lambda model, X: model.predict(X), resolution=10.0, dtype='float32')
+
+def test_recompute_follows_swapped_baseline(encoders):
+    model = HistoricalModel()
+    grid = make_grid(make_encoder(encoders, 0.2))
+    assert grid.recompute(model, month=5) == grid.valid.sum()
+    _, _, risks = grid.slice('Wheat')
+    assert np.allclose(risks[~np.isnan(risks)], 0.2)
+
+    # Same model object, new baseline: every cell is rescored with it
+    assert grid.recompute(model, month=5, encoder=make_encoder(encoders, 0.8)) == grid.valid.sum()
+    _, _, risks = grid.slice('Wheat')
+    assert np.allclose(risks[~np.isnan(risks)], 0.8)
+
+def test_unchanged_baseline_only_rescores_dirty_cells(encoders):
+    model = HistoricalModel()
+    encoder = make_encoder(encoders, 0.4)
+    grid = make_grid(encoder)
+    grid.recompute(model, month=5, encoder=encoder)
+    lat, lon = ap.countries_coords['India']
+    grid.update_weather(lat, lon, {'temperature': 20, 'humidity': 50, 'rainfall': 0, 'wind_speed': 3})
+    assert grid.recompute(model, month=5, encoder=encoder) == 1
@@ -0,0 +1,44 @@
+def test_predict_rejects_non_string_crop(client):
+    response = client.post('/api/predict', json={'country': 'India', 'crop': ['Wheat']})
+    assert response.status_code == 400
+    assert response.is_json
+    assert 'Crop' in response.get_json()['error']
+
+def test_predict_rejects_missing_crop(client):
+    response = client.get('/api/predict?country=India')
+    assert response.status_code == 400
+    assert response.is_json
+
+def test_predict(client):
+    response = client.post('/api/predict', json={'country': 'India', 'crop': 'Wheat'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert 0 <= body['risk'] <= 1
+    assert body['weather']['description'] == 'scattered clouds'
+
+def test_explicit_model_scoring_without_a_model_is_503(client, server):
+    # The test environment has encoders but no trained model, so the server fell back to analytic scores
+    assert server.model is None
+    assert client.post('/api/predict', json={'country': 'India', 'crop': 'Wheat'}).status_code == 200
+    for path, body in [
+        ('/api/predict', {'country': 'India', 'crop': 'Wheat', 'scoring': 'model'}),
+        ('/api/predict/batch', {'items': [{'country': 'India', 'crop': 'Wheat'}], 'scoring': 'model'}),
+        ('/api/sweep', {'countries': ['India'], 'scoring': 'model'}),
+        ('/api/forecast', {'country': 'India', 'crop': 'Wheat', 'scoring': 'model'}),
+    ]:
+        response = client.post(path, json=body)
+        assert response.status_code == 503, path
+        assert 'not loaded' in response.get_json()['error']
+
+def test_explicit_model_scoring_is_respected_in_analytic_mode(client, server, monkeypatch):
+    class ConstantModel:
+        def predict(self, X):
+            return [0.123] * len(X)
+
+    monkeypatch.setattr(server, 'SCORING_BACKEND', 'analytic')
+    monkeypatch.setattr(server, 'model', ConstantModel())
+    monkeypatch.setattr(server, 'with_specialists', lambda model: model)
+    assert server.get_model() is server.analytic_scorer
+    response = client.post('/api/predict', json={'country': 'France', 'crop': 'Wheat', 'scoring': 'model'})
+    assert response.status_code == 200
+    assert response.get_json()['risk'] == 0.12
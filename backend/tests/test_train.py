@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+from train import bundle_version, load_bundle, write_bundle
+
+def test_versions_within_one_second_differ():
+    first = datetime(2026, 5, 1, 12, 0, 0, 1, tzinfo=timezone.utc)
+    second = first.replace(microsecond=2)
+    assert bundle_version(first, 'abcdef0123') == '20260501-120000-000001-abcdef01'
+    assert bundle_version(first, 'abcdef0123') != bundle_version(second, 'abcdef0123')
+
+def test_existing_bundle_is_not_overwritten(tmp_path, encoders):
+    model = DecisionTreeRegressor().fit([[0.0], [1.0]], [0.0, 1.0])
+    manifest = {'version': '20260501-120000-000001-abcdef01'}
+    bundle_dir = write_bundle(tmp_path, model, encoders, np.zeros(3), dict(manifest))
+    assert (tmp_path / 'LATEST').read_text().strip() == manifest['version']
+    with pytest.raises(FileExistsError):
+        write_bundle(tmp_path, DecisionTreeRegressor().fit([[0.0]], [5.0]), encoders, np.ones(3), dict(manifest))
+    loaded, _, _ = load_bundle(bundle_dir)
+    assert loaded.predict([[1.0]])[0] == 1.0
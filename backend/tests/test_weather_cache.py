@@ -0,0 +1,63 @@
+import threading
+import time
+import aphid_predict as ap
+from circuit_breaker import CircuitBreaker, start_deadline, end_deadline
+from weather_cache import WeatherCache
+
+def test_least_recently_read_bucket_is_evicted():
+    cache = WeatherCache(lambda lat, lon: {'temperature': lat}, max_entries=2)
+    cache.get(1.0, 1.0)
+    cache.get(2.0, 2.0)
+    cache.get(1.0, 1.0)
+    cache.get(3.0, 3.0)
+    assert cache.stats()['size'] == 2
+    assert cache.stats()['evictions'] == 1
+    assert cache.peek(2.0, 2.0) is None
+    assert cache.peek(1.0, 1.0) == {'temperature': 1.0}
+    assert cache.stale(3.0, 3.0, 60) == {'temperature': 3.0}
+
+def test_concurrent_misses_share_one_fetch():
+    release = threading.Event()
+    calls = []
+
+    def fetch(lat, lon):
+        calls.append((lat, lon))
+        release.wait(5)
+        return {'temperature': 21.0}
+
+    cache = WeatherCache(fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(10.02, 20.04))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [(10.0, 20.0)]
+    assert results == [{'temperature': 21.0}] * 8
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['coalesced'] == 7
+
+def test_failed_fetch_is_not_cached_and_waiters_get_none():
+    cache = WeatherCache(lambda lat, lon: None)
+    assert cache.get(1.0, 1.0) is None
+    assert cache.stats()['size'] == 0
+    assert cache.stale(1.0, 1.0, 60) is None
+
+def test_stale_copy_served_while_upstream_fails(monkeypatch, upstream):
+    monkeypatch.setattr(ap, 'openweather_breaker', CircuitBreaker('openweathermap'))
+    token = start_deadline(5.0)
+    try:
+        live = ap.get_weather_data(-33.0, 151.0)
+        assert live is not None and 'stale' not in live
+        upstream.error_rate = 1.0
+        # The test environment uses a zero TTL, so this read misses and the fetch fails
+        assert ap.get_weather_data(-33.0, 151.0) == dict(live, stale=True)
+        # Older than the stale window: no weather at all
+        monkeypatch.setattr(ap, 'WEATHER_MAX_STALE', -1)
+        assert ap.get_weather_data(-33.0, 151.0) is None
+    finally:
+        end_deadline(token)
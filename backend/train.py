@@ -0,0 +1,185 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from dataset_io import load_dataset
+from forest_export import export_forest, save_compact_forest
+from model_store import ModelStore, encoder_classes
+from gends import build_encoders
+
+FEATURE_COLUMNS = [
+    'temperature', 'humidity', 'rainfall', 'wind_speed', 'month',
+    'historical_infestation', 'country_encoded', 'climate_encoded', 'crop_encoded'
+]
+TARGET_COLUMN = 'aphid_risk'
+
+def file_sha256(path):
+    """Hash a dataset file in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def evaluate(model, X, y):
+    prediction = model.predict(X)
+    return {
+        'r2': float(r2_score(y, prediction)),
+        'mae': float(mean_absolute_error(y, prediction)),
+        'rmse': float(np.sqrt(mean_squared_error(y, prediction))),
+    }
+
+def compute_historical_baseline(df, n_countries):
+    """Mean historical infestation per encoded country; countries absent from df get the overall mean"""
+    codes = df['country_encoded'].to_numpy().astype(np.int64)
+    values = df['historical_infestation'].to_numpy().astype(np.float64)
+    counts = np.bincount(codes, minlength=n_countries)
+    totals = np.bincount(codes, weights=values, minlength=n_countries)
+    baseline = np.full(n_countries, values.mean())
+    seen = counts > 0
+    baseline[seen] = totals[seen] / counts[seen]
+    return baseline.astype(np.float32)
+
+def train_model(X_train, y_train, n_estimators=100, n_jobs=-1, random_state=42, base_model=None, **params):
+    """Fit a new forest, or add n_estimators trees to base_model via warm_start"""
+    if base_model is not None:
+        model = base_model
+        model.set_params(warm_start=True, n_jobs=n_jobs,
+                         n_estimators=len(model.estimators_) + n_estimators)
+    else:
+        model = RandomForestRegressor(n_estimators=n_estimators, n_jobs=n_jobs,
+                                      random_state=random_state, **params)
+    model.fit(X_train, y_train)
+    return model
+
+def bundle_version(created_at, dataset_hash):
+    """Bundle name: UTC creation time down to the microsecond, then the dataset hash prefix"""
+    return f"{created_at:%Y%m%d-%H%M%S-%f}-{dataset_hash[:8]}"
+
+def write_bundle(artifacts_dir, model, encoders, historical_baseline, manifest):
+    """Write model, encoders, baseline and manifest to artifacts_dir/<version>/ and point LATEST at it
+
+    An existing bundle directory is never overwritten (FileExistsError).
+    """
+    bundle_dir = os.path.join(artifacts_dir, manifest['version'])
+    os.makedirs(artifacts_dir, exist_ok=True)
+    os.mkdir(bundle_dir)
+    model_path = os.path.join(bundle_dir, 'model.joblib')
+    joblib.dump(model, model_path)
+    joblib.dump(encoders, os.path.join(bundle_dir, 'encoders.joblib'))
+    np.save(os.path.join(bundle_dir, 'historical_baseline.npy'), historical_baseline)
+    manifest['model_size_bytes'] = os.path.getsize(model_path)
+    with open(os.path.join(bundle_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    _atomic_write_text(os.path.join(artifacts_dir, 'LATEST'), manifest['version'] + '\n')
+    return bundle_dir
+
+def load_bundle(bundle_dir):
+    """Load (model, encoders, manifest) from a bundle directory"""
+    with open(os.path.join(bundle_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    model = joblib.load(os.path.join(bundle_dir, 'model.joblib'))
+    encoders = joblib.load(os.path.join(bundle_dir, 'encoders.joblib'))
+    return model, encoders, manifest
+
+def publish_bundle(bundle_dir, serving_dir='.', model_store_dir='model_store'):
+    """Copy a bundle to the paths server.py loads from, replacing each file atomically
+
+    The forest is also published to the shared model store, which running
+    workers pick up without a restart.
+    """
+    model, encoders, manifest = load_bundle(bundle_dir)
+    _atomic_copy(os.path.join(bundle_dir, 'model.joblib'), os.path.join(serving_dir, 'aphid_risk_predictor.joblib'))
+    _atomic_copy(os.path.join(bundle_dir, 'encoders.joblib'), os.path.join(serving_dir, 'encoders.joblib'))
+    _atomic_copy(os.path.join(bundle_dir, 'historical_baseline.npy'), os.path.join(serving_dir, 'historical_baseline.npy'))
+    # Keep the array-backed forest in step, load_model() prefers it
+    arrays = export_forest(model, FEATURE_COLUMNS)
+    compact_path = os.path.join(serving_dir, 'aphid_risk_predictor.npz')
+    tmp_path = compact_path + '.tmp.npz'
+    save_compact_forest(arrays, tmp_path)
+    os.replace(tmp_path, compact_path)
+    if model_store_dir:
+        # Workers swap the baseline with the forest and refuse forests trained with other encoders
+        baseline = np.load(os.path.join(bundle_dir, 'historical_baseline.npy'))
+        ModelStore(os.path.join(serving_dir, model_store_dir)).publish(
+            arrays, manifest['version'], historical_baseline=baseline, classes=encoder_classes(encoders))
+
+def _atomic_copy(source, target):
+    tmp_path = target + '.tmp'
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+def _atomic_write_text(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the aphid risk model on a generated dataset")
+    parser.add_argument('--data', default="synthetic_aphid_dataset_with_risk1.csv",
+                        help="dataset path (.csv, .feather/.arrow or .parquet)")
+    parser.add_argument('--n-estimators', type=int, default=100, help="trees to train (or to add with --warm-start-from)")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="parallel jobs, -1 uses all cores")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--warm-start-from', help="bundle directory whose forest gets the new trees")
+    parser.add_argument('--artifacts-dir', default="artifacts")
+    parser.add_argument('--publish', action='store_true', help="also install the bundle as the served model")
+    args = parser.parse_args()
+
+    print(f"📂 Loading {args.data}...")
+    dataset_hash = file_sha256(args.data)
+    df = load_dataset(args.data, columns=FEATURE_COLUMNS + [TARGET_COLUMN])
+    X = df[FEATURE_COLUMNS]
+    y = df[TARGET_COLUMN]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=args.random_state)
+
+    base_model, encoders, parent = None, build_encoders(), None
+    if args.warm_start_from:
+        base_model, encoders, parent_manifest = load_bundle(args.warm_start_from)
+        parent = parent_manifest['version']
+        print(f"🌲 Adding {args.n_estimators} trees to {parent} ({len(base_model.estimators_)} trees)")
+
+    print(f"🏋️  Training on {len(X_train)} rows with n_jobs={args.n_jobs}...")
+    start = time.perf_counter()
+    model = train_model(X_train, y_train, args.n_estimators, args.n_jobs, args.random_state, base_model)
+    training_seconds = time.perf_counter() - start
+
+    metrics = {'train': evaluate(model, X_train, y_train), 'test': evaluate(model, X_test, y_test)}
+    country_classes = encoders['country_encoder'].classes_.tolist()
+    historical_baseline = compute_historical_baseline(df, len(country_classes))
+    created_at = datetime.now(timezone.utc)
+    manifest = {
+        'version': bundle_version(created_at, dataset_hash),
+        'created_at': created_at.isoformat(),
+        'parent': parent,
+        'dataset': {'path': os.path.abspath(args.data), 'sha256': dataset_hash, 'rows': len(df)},
+        'features': FEATURE_COLUMNS,
+        'target': TARGET_COLUMN,
+        'params': {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        'n_trees': len(model.estimators_),
+        'training_seconds': training_seconds,
+        'metrics': metrics,
+        'historical_baseline': {c: round(float(v), 4) for c, v in zip(country_classes, historical_baseline)},
+    }
+    bundle_dir = write_bundle(args.artifacts_dir, model, encoders, historical_baseline, manifest)
+
+    print(f"Model R² score - Train: {metrics['train']['r2']:.4f}, Test: {metrics['test']['r2']:.4f}")
+    print(f"⏱️  Training time: {training_seconds:.1f}s for {manifest['n_trees']} trees")
+    print(f"💾 Model size: {manifest['model_size_bytes'] / 1e6:.1f} MB")
+    print(f"✅ Bundle written to {bundle_dir}")
+    if args.publish:
+        publish_bundle(bundle_dir)
+        print("✅ Published as aphid_risk_predictor.joblib / encoders.joblib / historical_baseline.npy and to model_store/")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Train per-crop and/or per-climate specialist forests next to the global model
+
+Usage: python train_specialists.py [--data synthetic_aphid_dataset_with_risk1.csv] [--by crop,climate]
+                                   [--bundle artifacts/<version>] [--workers 4] [--out specialists]
+
+The dataset gets the same train/test split as train.py, then each partition
+(one crop, one climate zone, or one crop in one climate zone) trains its own
+forest in a separate process. A specialist is kept only when it beats the
+global model on that partition's test rows. Kept forests are exported to
+<out>/<version>/<key>.npz and <out>/index.json is replaced atomically, so a
+running server switches to the new set on its next lookup.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+import joblib
+import numpy as np
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+from dataset_io import load_dataset
+from forest_export import export_forest, save_compact_forest
+from gends import build_encoders
+from train import FEATURE_COLUMNS, TARGET_COLUMN, _atomic_write_text, load_bundle, train_model
+
+PARTITIONS = {'crop': ('crop',), 'climate': ('climate',), 'crop,climate': ('crop', 'climate')}
+
+def partition_keys(df, by, crop_classes, climate_classes):
+    """Map each (crop, climate) key of the requested partitioning to its row mask"""
+    crop_codes = df['crop_encoded'].to_numpy().astype(np.intp)
+    climate_codes = df['climate_encoded'].to_numpy().astype(np.intp)
+    keys = {}
+    if by == ('crop',):
+        for code in np.unique(crop_codes):
+            keys[(crop_classes[code], None)] = crop_codes == code
+    elif by == ('climate',):
+        for code in np.unique(climate_codes):
+            keys[(None, climate_classes[code])] = climate_codes == code
+    else:
+        pairs = np.unique(np.column_stack([crop_codes, climate_codes]), axis=0)
+        for crop, climate in pairs:
+            keys[(crop_classes[crop], climate_classes[climate])] = (crop_codes == crop) & (climate_codes == climate)
+    return keys
+
+def key_name(key):
+    return '__'.join(part.replace(' ', '_') if part else 'any' for part in key)
+
+def fit_specialist(key, X_train, y_train, X_test, y_test, path, params):
+    """Train one specialist with a single job and export it to path (runs in a worker process)"""
+    start = time.perf_counter()
+    model = train_model(X_train, y_train, n_jobs=1, **params)
+    mae = float(mean_absolute_error(y_test, model.predict(X_test)))
+    save_compact_forest(export_forest(model, FEATURE_COLUMNS), path)
+    return key, mae, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Train per-crop / per-climate specialist models")
+    parser.add_argument('--data', default="synthetic_aphid_dataset_with_risk1.csv",
+                        help="dataset path (.csv, .feather/.arrow or .parquet)")
+    parser.add_argument('--by', choices=list(PARTITIONS), default='crop,climate', help="how to partition the dataset")
+    parser.add_argument('--bundle', help="bundle directory of the global model to compare against, default is the served joblib")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="specialists trained in parallel")
+    parser.add_argument('--n-estimators', type=int, default=50)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--min-samples-leaf', type=int, default=1)
+    parser.add_argument('--min-rows', type=int, default=1000, help="skip partitions with fewer training rows")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--out', default="specialists")
+    args = parser.parse_args()
+
+    if args.bundle:
+        global_model, encoders, _ = load_bundle(args.bundle)
+    else:
+        global_model, encoders = joblib.load('aphid_risk_predictor.joblib'), build_encoders()
+    if hasattr(global_model, 'n_jobs'):
+        global_model.set_params(n_jobs=1)
+    crop_classes = encoders['crop_encoder'].classes_.tolist()
+    climate_classes = encoders['climate_encoder'].classes_.tolist()
+
+    print(f"📂 Loading {args.data}...")
+    df = load_dataset(args.data, columns=FEATURE_COLUMNS + [TARGET_COLUMN])
+    train_df, test_df = train_test_split(df, test_size=args.test_size, random_state=args.random_state)
+    by = PARTITIONS[args.by]
+    train_keys = partition_keys(train_df, by, crop_classes, climate_classes)
+    test_keys = partition_keys(test_df, by, crop_classes, climate_classes)
+
+    version = f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S-%f}-{args.by.replace(',', '-')}"
+    version_dir = os.path.join(args.out, version)
+    # Never write into a published set; index.json may point at it
+    os.makedirs(args.out, exist_ok=True)
+    os.mkdir(version_dir)
+    params = {'n_estimators': args.n_estimators, 'random_state': args.random_state,
+              'max_depth': args.max_depth, 'min_samples_leaf': args.min_samples_leaf}
+
+    candidates = {}
+    for key, train_mask in train_keys.items():
+        rows = int(train_mask.sum())
+        if rows < args.min_rows or key not in test_keys:
+            print(f"⏭️  {key_name(key)}: {rows} training rows, skipped")
+            continue
+        test_part = test_df[test_keys[key]]
+        X_test, y_test = test_part[FEATURE_COLUMNS], test_part[TARGET_COLUMN]
+        global_mae = float(mean_absolute_error(y_test, global_model.predict(X_test)))
+        candidates[key] = {'rows': rows, 'test_rows': len(test_part), 'global_test_mae': global_mae,
+                           'file': f"{version}/{key_name(key)}.npz", 'X_test': X_test, 'y_test': y_test}
+
+    print(f"🏋️  Training {len(candidates)} specialists by {args.by} with {args.workers} workers...")
+    start = time.perf_counter()
+    kept = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = []
+        for key, candidate in candidates.items():
+            train_part = train_df[train_keys[key]]
+            futures.append(pool.submit(fit_specialist, key, train_part[FEATURE_COLUMNS], train_part[TARGET_COLUMN],
+                                       candidate['X_test'], candidate['y_test'],
+                                       os.path.join(args.out, candidate['file']), params))
+        for future in as_completed(futures):
+            key, mae, seconds = future.result()
+            candidate = candidates[key]
+            better = mae < candidate['global_test_mae']
+            print(f"{'✅' if better else '➖'} {key_name(key)}: MAE {mae:.4f} vs global {candidate['global_test_mae']:.4f} "
+                  f"on {candidate['test_rows']} test rows ({seconds:.1f}s)")
+            if not better:
+                os.remove(os.path.join(args.out, candidate['file']))
+                continue
+            kept.append({'crop': key[0], 'climate': key[1], 'file': candidate['file'], 'rows': candidate['rows'],
+                         'test_mae': mae, 'global_test_mae': candidate['global_test_mae'],
+                         'bytes': os.path.getsize(os.path.join(args.out, candidate['file']))})
+    training_seconds = time.perf_counter() - start
+
+    index = {
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'by': args.by,
+        'features': FEATURE_COLUMNS,
+        'crop_classes': crop_classes,
+        'climate_classes': climate_classes,
+        'params': params,
+        'models': sorted(kept, key=lambda entry: key_name((entry['crop'], entry['climate']))),
+    }
+    _atomic_write_text(os.path.join(args.out, 'index.json'), json.dumps(index, indent=2))
+    print(f"⏱️  Training time: {training_seconds:.1f}s")
+    print(f"✅ {len(kept)} of {len(candidates)} specialists beat the global model, index written to {args.out}/index.json")
+
+if __name__ == "__main__":
+    main()
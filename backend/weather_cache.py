@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Weather is considered fresh for 10 minutes, bucketed to 0.1° (~11 km)
+DEFAULT_TTL = 600
+DEFAULT_PRECISION = 1
+# Least recently read buckets are dropped beyond this many entries
+DEFAULT_MAX_ENTRIES = 16384
+
+def make_session(retries=2, backoff_factor=0.3, pool_maxsize=20):
+    """Create a pooled HTTP session that retries transient upstream failures"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class _InFlight:
+    """A fetch in progress that concurrent callers for the same key wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+class WeatherCache:
+    """Weather cache keyed on rounded coordinates with single-flight misses
+
+    ``fetch(lat, lon)`` is called with the bucketed coordinates and should
+    return a weather dict or None. Failed fetches are not cached. Concurrent
+    misses for the same bucket share one upstream call. Callbacks added with
+    ``subscribe`` are called with (lat, lon, weather) for every stored value.
+    Expired entries are kept (for ``stale``) until evicted as least recently
+    used once more than ``max_entries`` buckets are cached.
+    """
+
+    def __init__(self, fetch, ttl=DEFAULT_TTL, precision=DEFAULT_PRECISION, max_entries=DEFAULT_MAX_ENTRIES):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.precision = precision
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._listeners = []
+        self._accessed = {}
+
+    def key(self, lat, lon):
+        """Return the cache bucket for a coordinate pair"""
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    def get(self, lat, lon):
+        """Return cached weather for the bucket, fetching it once if stale"""
+        key = self.key(lat, lon)
+        now = time.monotonic()
+        with self._lock:
+            self._accessed[key] = now
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+            call = self._inflight.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                call = self._inflight[key] = _InFlight()
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            return dict(call.result) if call.result is not None else None
+
+        try:
+            call.result = self.fetch(*key)
+        finally:
+            with self._lock:
+                if call.result is not None:
+                    self._store(key, call.result)
+                del self._inflight[key]
+            call.event.set()
+        if call.result is not None:
+            self._notify(key, call.result)
+        return dict(call.result) if call.result is not None else None
+
+    def peek(self, lat, lon):
+        """Return fresh cached weather for the bucket without fetching, or None"""
+        key = self.key(lat, lon)
+        now = time.monotonic()
+        with self._lock:
+            self._accessed[key] = now
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+        return None
+
+    def stale(self, lat, lon, max_age):
+        """Return the bucket's last weather if it was stored within max_age seconds, even when expired"""
+        with self._lock:
+            entry = self._entries.get(self.key(lat, lon))
+        if entry is None or time.monotonic() - (entry[1] - self.ttl) > max_age:
+            return None
+        return dict(entry[0])
+
+    def put(self, lat, lon, weather):
+        """Store weather fetched outside ``get`` (e.g. by an async client)"""
+        key = self.key(lat, lon)
+        with self._lock:
+            self._store(key, weather)
+        self._notify(key, weather)
+
+    def _store(self, key, weather):
+        # Called with the lock held
+        self._entries[key] = (weather, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def expires_in(self, lat, lon):
+        """Seconds until the bucket's entry expires (negative once stale), None if never cached"""
+        with self._lock:
+            entry = self._entries.get(self.key(lat, lon))
+        return entry[1] - time.monotonic() if entry is not None else None
+
+    def refresh(self, lat, lon):
+        """Fetch the bucket again regardless of freshness; a failed fetch keeps the old entry"""
+        key = self.key(lat, lon)
+        weather = self.fetch(*key)
+        if weather is not None:
+            self.put(*key, weather)
+        return weather
+
+    def recent_keys(self, window):
+        """Buckets read within the last `window` seconds, most recent first"""
+        cutoff = time.monotonic() - window
+        with self._lock:
+            # Drop cold buckets so the access log stays bounded
+            self._accessed = {k: t for k, t in self._accessed.items() if t >= cutoff}
+            recent = sorted(self._accessed.items(), key=lambda item: item[1], reverse=True)
+        return [key for key, _ in recent]
+
+    def subscribe(self, callback):
+        """Call callback(lat, lon, weather) whenever fresh weather is stored"""
+        self._listeners.append(callback)
+
+    def _notify(self, key, weather):
+        for callback in self._listeners:
+            callback(key[0], key[1], weather)
+
+    def stats(self):
+        """Return hit/miss/coalesce/eviction counters and the number of cached buckets"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
@@ -0,0 +1,164 @@
+"""Background weather refresh ahead of cache expiry
+
+Every built-in region, plus every coordinate bucket read from the weather
+cache recently, is refreshed shortly before its entry expires, so the
+request path nearly always finds fresh weather. Upstream calls go through
+a token bucket sized to the API quota and a bounded worker pool. Each
+bucket gets a fixed random lead time, so entries cached at the same moment
+are not all refreshed in the same second. A bucket whose refresh fails is
+retried with exponential backoff instead of on every scheduler pass.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop=None):
+        """Take one token, sleeping until one is available; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            if stop is not None:
+                if stop.wait(delay):
+                    return waited
+            else:
+                time.sleep(delay)
+            waited += delay
+
+class WeatherPrefetcher:
+    """Keeps weather cache entries for known regions and hot coordinates fresh"""
+
+    def __init__(self, weather_cache, regions, requests_per_minute=50, workers=4,
+                 lead=0.15, jitter=0.1, hot_window=3600, max_hot=500, interval=5.0, seed=None):
+        self.weather_cache = weather_cache
+        self.regions = list(regions)
+        self.bucket = TokenBucket(requests_per_minute / 60, capacity=max(1, workers))
+        self.workers = workers
+        # Refresh when less than (lead + a per-bucket share of jitter) of the TTL remains
+        self.lead = lead
+        self.jitter = jitter
+        self.hot_window = hot_window
+        self.max_hot = max_hot
+        self.interval = interval
+        self.refreshed = 0
+        self.failed = 0
+        self.throttled_seconds = 0.0
+        self._rng = random.Random(seed)
+        self._offsets = {}
+        self._failures = {}
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(workers)
+        self._stop = threading.Event()
+        self._executor = None
+
+    def targets(self):
+        """Cache buckets to keep warm: all known regions, then the most recently used hot buckets"""
+        keys = {self.weather_cache.key(lat, lon) for lat, lon in self.regions}
+        hot = self.weather_cache.recent_keys(self.hot_window)
+        for key in hot[:self.max_hot]:
+            keys.add(key)
+        return keys
+
+    def due(self, key, now=None):
+        """True when the bucket is missing or inside its refresh window, and not backing off"""
+        failure = self._failures.get(key)
+        if failure is not None and failure[1] > (now or time.monotonic()):
+            return False
+        remaining = self.weather_cache.expires_in(*key)
+        if remaining is None:
+            return True
+        offset = self._offsets.get(key)
+        if offset is None:
+            offset = self._offsets[key] = self._rng.uniform(0, self.jitter)
+        return remaining < (self.lead + offset) * self.weather_cache.ttl
+
+    def run_once(self):
+        """Schedule refreshes for every due bucket; returns how many were submitted"""
+        targets = self.targets()
+        # Forget buckets that went cold
+        self._offsets = {k: v for k, v in self._offsets.items() if k in targets}
+        now = time.monotonic()
+        # Most urgent (already expired or closest to expiry) first
+        due = sorted((k for k in targets if k not in self._inflight and self.due(k, now)),
+                     key=lambda k: self.weather_cache.expires_in(*k) or 0)
+        submitted = 0
+        for key in due:
+            if self._stop.is_set():
+                break
+            self._slots.acquire()
+            self.throttled_seconds += self.bucket.acquire(self._stop)
+            if self._stop.is_set():
+                self._slots.release()
+                break
+            with self._lock:
+                self._inflight.add(key)
+            self._executor.submit(self._refresh, key)
+            submitted += 1
+        return submitted
+
+    def _refresh(self, key):
+        try:
+            ok = self.weather_cache.refresh(*key) is not None
+        except Exception:
+            ok = False
+        try:
+            with self._lock:
+                if ok:
+                    self.refreshed += 1
+                    self._failures.pop(key, None)
+                else:
+                    self.failed += 1
+                    attempts = self._failures.get(key, (0, 0))[0] + 1
+                    backoff = min(self.weather_cache.ttl / 2, self.interval * 2 ** attempts)
+                    self._failures[key] = (attempts, time.monotonic() + backoff)
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+            self._slots.release()
+
+    def start(self):
+        """Run the scheduler on a daemon thread"""
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='weather-prefetch')
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    print(f"Weather prefetch error: {e}")
+                self._stop.wait(self.interval)
+        threading.Thread(target=loop, name='weather-prefetch', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self):
+        """Return refresh counters and the number of buckets being kept warm"""
+        return {
+            'refreshed': self.refreshed,
+            'failed': self.failed,
+            'inflight': len(self._inflight),
+            'throttled_seconds': round(self.throttled_seconds, 3),
+            'tracked': len(self._offsets),
+        }
@@ -480,11 +480,9 @@ function calculateRisk() {
     country = countrySelect.value;
   }
   const crop = document.getElementById('crop-input').value;
-  fetch('http://localhost:5000/api/predict', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ country, crop })
-  })
+  // GET so the browser cache can reuse the answer and revalidate it with ETag / 304
+  const params = new URLSearchParams({ country, crop });
+  fetch(`http://localhost:5000/api/predict?${params}`)
     .then(res => res.json())
     .then(data => {
       // Update sliders with real-time weather data